@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark ResponseCache get/set at different sizes.
+
+Per-operation time should stay flat as the cache grows, for every strategy:
+
+    python benchmarks/cache_benchmark.py
+    python benchmarks/cache_benchmark.py --sizes 1000 100000 --ops 50000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add library to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ollama_agents.caching import ResponseCache, CacheStrategy
+
+
+def bench(strategy: CacheStrategy, size: int, ops: int) -> dict:
+    """Fill a cache to capacity, then time sets (each one evicts) and gets"""
+    cache = ResponseCache(max_size=size, strategy=strategy, default_ttl=3600)
+    for i in range(size):
+        cache.set_by_key(f"key-{i}", i)
+
+    start = time.perf_counter()
+    for i in range(size, size + ops):
+        cache.set_by_key(f"key-{i}", i)
+    set_time = time.perf_counter() - start
+
+    keys = [f"key-{random.randrange(ops, size + ops)}" for _ in range(ops)]
+    start = time.perf_counter()
+    for key in keys:
+        cache.get_by_key(key)
+    get_time = time.perf_counter() - start
+
+    return {"set_us": set_time / ops * 1e6, "get_us": get_time / ops * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ResponseCache benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--ops", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"{'strategy':<8} {'entries':>10} {'set (us/op)':>12} {'get (us/op)':>12}")
+    for strategy in CacheStrategy:
+        for size in args.sizes:
+            result = bench(strategy, size, args.ops)
+            print(f"{strategy.value:<8} {size:>10} {result['set_us']:>12.2f} {result['get_us']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ Examples of using performance optimization features.
 from ollama_agents import Agent, tool
 from ollama_agents.performance import (
     enable_response_caching, get_response_cache,
-    LRUCache, RequestBatcher
+    LRUCache, RequestBatcher, EmbeddingBatcher
 )
 
 # Example 1: Response caching
@@ -67,9 +67,11 @@ print("=" * 80)
 print("Example 3: Request Batching")
 print("=" * 80)
 
+import asyncio
+
 batcher = RequestBatcher(batch_size=5, max_wait_ms=100)
 
-# Define a batch processor
+# Define a batch processor (may also be an async function)
 def process_batch(items):
     """Process a batch of items"""
     print(f"Processing batch of {len(items)} items")
@@ -77,21 +79,19 @@ def process_batch(items):
 
 batcher.set_processor(process_batch)
 
-# Simulate adding requests
-import threading
-
-def add_request(req_id, data):
-    result = batcher.add_request(req_id, data)
-    print(f"Request {req_id}: {result}")
+async def run_batching():
+    # 12 concurrent submissions are processed as batches of 5, 5 and 2
+    results = await asyncio.gather(*(batcher.submit(f"data_{i}") for i in range(12)))
+    for i, result in enumerate(results):
+        print(f"Request {i}: {result}")
+    print(f"Batcher stats: {batcher.get_stats()}")
 
-threads = []
-for i in range(12):
-    t = threading.Thread(target=add_request, args=(f"req_{i}", f"data_{i}"))
-    t.start()
-    threads.append(t)
+    # Embeddings: one call to the embed endpoint per batch instead of per text
+    embedder = EmbeddingBatcher(model="nomic-embed-text", batch_size=32, max_wait_ms=10)
+    vectors = await asyncio.gather(*(embedder.embed(f"document {i}") for i in range(100)))
+    print(f"Embedded {len(vectors)} texts in {embedder.get_stats()['batches']} requests")
 
-for t in threads:
-    t.join()
+asyncio.run(run_batching())
 
 print("\n✅ Batching example complete\n")
 
@@ -124,6 +124,23 @@ for i in range(1, 4):
     value = cache.get(f"large_{i}")
     print(f"large_{i}: {'Found' if value else 'Evicted'}")
 
+# Example 5: Batch requests through an agent
+print("=" * 80)
+print("Example 5: Batch Requests (generate_many / chat_many)")
+print("=" * 80)
+
+questions = [f"Give one fact about the number {i}." for i in range(20)]
+
+# At most 4 requests in flight; results come back in input order
+results = agent.generate_many(questions, concurrency=4)
+for outcome in results[:3]:
+    print(f"{outcome.index}: {outcome.result['content'][:60] if outcome.ok else outcome.error}")
+print(f"Failed items: {sum(not outcome.ok for outcome in results)}")
+
+# Or handle results as they complete
+for outcome in agent.chat_many(questions[:5], concurrency=4, as_completed=True):
+    print(f"Completed #{outcome.index}")
+
 print("\n" + "=" * 80)
 print("✅ Performance optimization examples complete!")
 print("=" * 80)
@@ -13,7 +13,25 @@ from .logger import RichLogger as Logger, get_logger, set_global_log_level, LogL
 from .mcp import MCPContext, MCPContextManager, MCPResource, MCPResourceType, MCPToolAdapter
 from .context_manager import ContextManager, TruncationStrategy
 from .caching import ResponseCache, CacheStrategy, enable_caching, disable_caching, get_cache
-from .retry import RetryConfig, with_retry, async_with_retry, set_global_retry_config, get_retry_config, disable_retry
+from .cache_backends import CacheBackend, SQLiteCacheBackend, RedisCacheBackend
+from .coalescing import SingleFlight, get_single_flight
+from .hosts import HostPool, HostState, RoutingStrategy
+from .deadline import Deadline, DeadlineExceeded, deadline_scope, current_deadline
+from .admission import (
+    AdmissionController, OverloadedError, Priority, TokenBucket, admission_context,
+    get_admission_controller, enable_admission_control, disable_admission_control
+)
+from .scheduling import ModelScheduler, get_model_scheduler, enable_model_scheduling, disable_model_scheduling
+from .residency import (
+    ModelResidencyManager, get_residency_manager, enable_residency_management, disable_residency_management
+)
+from .batch import BatchResult
+from .semantic_cache import SemanticCache, OllamaEmbedder, HashingEmbedder, normalize_query
+from .retry import (
+    RetryConfig, with_retry, async_with_retry, set_global_retry_config, get_retry_config, disable_retry,
+    RetryBudget, CircuitBreaker, CircuitBreakers, CircuitOpenError, CircuitState,
+    get_circuit_breakers, enable_circuit_breakers, disable_circuit_breakers
+)
 from .web_search import WebSearchTool, SearchProvider, SearchConfig, enable_web_search, create_web_search_agent
 from .memory import (
     MemoryManager, MemoryStore, SQLiteMemoryStore, RedisMemoryStore, 
@@ -24,7 +42,7 @@ from .orchestration import (
     AgentOrchestrator, OrchestrationPattern, OrchestrationResult, orchestrate
 )
 from .performance import (
-    LRUCache, RequestBatcher, ConnectionPool, ResponseCache as PerfResponseCache,
+    LRUCache, RequestBatcher, EmbeddingBatcher, ConnectionPool, ResponseCache as PerfResponseCache,
     enable_response_caching, get_response_cache, enable_connection_pooling, get_connection_pool
 )
 from .builtin_tools import (
@@ -32,6 +50,14 @@ from .builtin_tools import (
     ALL_BUILTIN_TOOLS, get_tool_collection
 )
 from .web_ui import AgentManager, create_web_ui
+from .streaming import StreamMetrics, StreamAccumulator
+from .turn import (TurnEngine, TurnPhase, native_tool_call_parser, json_content_tool_call_parser,
+                   IncrementalJSONScanner, StreamingToolCallParser)
+from .conversation import ConversationLog, ConversationSnapshot, MessageRecord
+from .clients import (
+    ClientSettings, ClientRegistry, get_client_registry, get_client, get_async_client,
+    configure_clients, close_clients
+)
 
 # Create AgentConfig alias for backward compatibility
 AgentConfig = Agent
@@ -49,14 +75,32 @@ __all__ = [
     "MCPContext", "MCPContextManager", "MCPResource", "MCPResourceType", "MCPToolAdapter",
     "ContextManager", "TruncationStrategy",
     "ResponseCache", "CacheStrategy", "enable_caching", "disable_caching", "get_cache",
+    "CacheBackend", "SQLiteCacheBackend", "RedisCacheBackend",
+    "SingleFlight", "get_single_flight", "BatchResult",
+    "HostPool", "HostState", "RoutingStrategy",
+    "ModelResidencyManager", "get_residency_manager", "enable_residency_management",
+    "disable_residency_management",
+    "Deadline", "DeadlineExceeded", "deadline_scope", "current_deadline",
+    "AdmissionController", "OverloadedError", "Priority", "TokenBucket", "admission_context",
+    "get_admission_controller", "enable_admission_control", "disable_admission_control",
+    "ModelScheduler", "get_model_scheduler", "enable_model_scheduling", "disable_model_scheduling",
+    "SemanticCache", "OllamaEmbedder", "HashingEmbedder", "normalize_query",
     "RetryConfig", "with_retry", "async_with_retry", "set_global_retry_config", "get_retry_config", "disable_retry",
+    "RetryBudget", "CircuitBreaker", "CircuitBreakers", "CircuitOpenError", "CircuitState",
+    "get_circuit_breakers", "enable_circuit_breakers", "disable_circuit_breakers",
     "WebSearchTool", "SearchProvider", "SearchConfig", "enable_web_search", "create_web_search_agent",
     "MemoryManager", "MemoryStore", "SQLiteMemoryStore", "RedisMemoryStore", "PostgresMemoryStore", 
     "InMemoryStore", "JSONFileMemoryStore", "get_memory_manager", "set_memory_manager",
     "AgentOrchestrator", "OrchestrationPattern", "OrchestrationResult", "orchestrate",
-    "LRUCache", "RequestBatcher", "ConnectionPool", "PerfResponseCache",
+    "LRUCache", "RequestBatcher", "EmbeddingBatcher", "ConnectionPool", "PerfResponseCache",
     "enable_response_caching", "get_response_cache", "enable_connection_pooling", "get_connection_pool",
     "FILE_TOOLS", "WEB_TOOLS", "SYSTEM_TOOLS", "DATA_TOOLS", "TEXT_TOOLS", 
     "ALL_BUILTIN_TOOLS", "get_tool_collection",
-    "AgentManager", "create_web_ui"
+    "AgentManager", "create_web_ui",
+    "StreamMetrics", "StreamAccumulator",
+    "TurnEngine", "TurnPhase", "native_tool_call_parser", "json_content_tool_call_parser",
+    "IncrementalJSONScanner", "StreamingToolCallParser",
+    "ClientSettings", "ClientRegistry", "get_client_registry", "get_client", "get_async_client",
+    "configure_clients", "close_clients",
+    "ConversationLog", "ConversationSnapshot", "MessageRecord"
 ]
\ No newline at end of file
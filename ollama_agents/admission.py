@@ -0,0 +1,314 @@
+"""
+Admission control for Ollama Agents SDK
+Limits concurrent requests per host, rate limits tenants and rejects excess load fast
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger()
+
+
+class Priority(IntEnum):
+    """Priority class of a request (lower is served first)"""
+    INTERACTIVE = 0  # A user is waiting (web UI, chat)
+    BATCH = 1        # Background work (orchestrations, bulk jobs)
+
+
+class OverloadedError(Exception):
+    """Raised when a request is rejected instead of being queued"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_request_priority: contextvars.ContextVar = contextvars.ContextVar("ollama_agents_priority", default=None)
+_request_tenant: contextvars.ContextVar = contextvars.ContextVar("ollama_agents_tenant", default=None)
+
+
+@contextmanager
+def admission_context(priority: Optional[Priority] = None, tenant: Optional[str] = None) -> Iterator[None]:
+    """
+    Set the priority and/or tenant of every request made inside the block
+    (including in tasks started from it), overriding the agents' own settings.
+    """
+    tokens = []
+    if priority is not None:
+        tokens.append((_request_priority, _request_priority.set(priority)))
+    if tenant is not None:
+        tokens.append((_request_tenant, _request_tenant.set(tenant)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_priority() -> Optional[Priority]:
+    return _request_priority.get()
+
+
+def current_tenant() -> Optional[str]:
+    return _request_tenant.get()
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second, holding at most ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, tokens: float = 1.0) -> float:
+        """Take tokens; returns 0 on success, otherwise seconds until they are available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class _Ticket:
+    """A queued request, admitted or rejected by resolving its future"""
+    __slots__ = ("priority", "future", "admitted")
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.admitted = False
+
+
+class _HostLane:
+    def __init__(self):
+        self.in_flight = 0
+        self.queues: Dict[Priority, Deque[_Ticket]] = {priority: deque() for priority in Priority}
+        self.admitted = 0
+        self.rejected = 0
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+
+class AdmissionController:
+    """
+    Decides whether a request may go to an Ollama host now, later or not at all.
+
+    - Each host runs at most ``max_concurrent`` requests; the rest wait in a
+      queue of at most ``max_queue``, interactive requests ahead of batch ones.
+      ``reserved_interactive`` slots are only used by interactive requests.
+    - Each tenant (by default the agent name) has a token bucket of
+      ``rate`` requests per second with ``burst`` capacity.
+    - Instead of piling up on the server until the client timeout, excess
+      load gets an OverloadedError at once (full queue, empty bucket) or
+      after ``queue_timeout`` seconds in the queue. A full queue sheds its
+      newest batch request to make room for an interactive one.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue: int = 32,
+        queue_timeout: float = 10.0,
+        reserved_interactive: int = 0,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        tenant_limits: Optional[Dict[str, Tuple[float, float]]] = None
+    ):
+        """
+        Initialize the admission controller
+
+        Args:
+            max_concurrent: Requests in flight per host
+            max_queue: Requests waiting per host before new ones are rejected
+            queue_timeout: Seconds a request may wait for a slot
+            reserved_interactive: Slots per host batch requests may not use
+            rate: Requests per second per tenant (None = no rate limit)
+            burst: Bucket capacity per tenant (default: max(1, rate))
+            tenant_limits: Per-tenant (rate, burst) overriding rate/burst
+        """
+        if reserved_interactive >= max_concurrent:
+            raise ValueError("reserved_interactive must be below max_concurrent")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.reserved_interactive = reserved_interactive
+        self.rate = rate
+        self.burst = burst
+        self.tenant_limits = dict(tenant_limits or {})
+        self._lanes: Dict[Optional[str], _HostLane] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.rate_limited = 0
+
+    # Rate limits
+
+    def _check_rate(self, tenant: Optional[str]):
+        if tenant is None:
+            return
+        limits = self.tenant_limits.get(tenant)
+        if limits is None:
+            if self.rate is None:
+                return
+            limits = (self.rate, self.burst if self.burst is not None else max(1.0, self.rate))
+        with self._lock:
+            bucket = self._buckets.get(tenant)
+            if bucket is None:
+                bucket = self._buckets[tenant] = TokenBucket(*limits)
+            wait = bucket.take()
+            if wait:
+                self.rate_limited += 1
+        if wait:
+            raise OverloadedError(f"Rate limit exceeded for {tenant}", retry_after=wait)
+
+    # Host slots (lane methods are called with the lock held)
+
+    def _capacity(self, priority: Priority) -> int:
+        if priority == Priority.INTERACTIVE:
+            return self.max_concurrent
+        return self.max_concurrent - self.reserved_interactive
+
+    def _admit(self, lane: _HostLane, ticket: _Ticket):
+        ticket.admitted = True
+        lane.in_flight += 1
+        lane.admitted += 1
+        ticket.future.set_result(None)
+
+    def _dispatch(self, lane: _HostLane):
+        for priority in Priority:
+            queue = lane.queues[priority]
+            while queue and lane.in_flight < self._capacity(priority):
+                self._admit(lane, queue.popleft())
+            if queue:
+                break  # Lower priorities wait behind this one
+
+    def _enqueue(self, host: Optional[str], priority: Priority) -> _Ticket:
+        ticket = _Ticket(priority)
+        with self._lock:
+            lane = self._lanes.get(host)
+            if lane is None:
+                lane = self._lanes[host] = _HostLane()
+            if lane.queued() >= self.max_queue:
+                shed = lane.queues[Priority.BATCH]
+                if priority == Priority.INTERACTIVE and shed:
+                    lane.rejected += 1
+                    shed.pop().future.set_exception(
+                        OverloadedError(f"Host {host} overloaded: shed for interactive traffic"))
+                else:
+                    lane.rejected += 1
+                    raise OverloadedError(f"Host {host} overloaded: {lane.in_flight} in flight, "
+                                          f"{lane.queued()} queued")
+            lane.queues[priority].append(ticket)
+            self._dispatch(lane)
+        return ticket
+
+    def _abandon(self, host: Optional[str], ticket: _Ticket) -> bool:
+        """Withdraw a waiting ticket; returns True if it was admitted meanwhile"""
+        with self._lock:
+            if ticket.admitted:
+                return True
+            lane = self._lanes[host]
+            queue = lane.queues[ticket.priority]
+            if ticket in queue:
+                queue.remove(ticket)
+                lane.rejected += 1
+            return False
+
+    def _release(self, host: Optional[str]):
+        with self._lock:
+            lane = self._lanes[host]
+            lane.in_flight -= 1
+            self._dispatch(lane)
+
+    def _timed_out(self, host: Optional[str]) -> OverloadedError:
+        return OverloadedError(f"Host {host} overloaded: no slot within {self.queue_timeout}s",
+                               retry_after=self.queue_timeout)
+
+    @contextmanager
+    def admit(self, host: Optional[str] = None, tenant: Optional[str] = None,
+              priority: Priority = Priority.INTERACTIVE) -> Iterator[None]:
+        """Hold a slot on ``host`` for one request, or raise OverloadedError"""
+        self._check_rate(tenant)
+        ticket = self._enqueue(host, priority)
+        try:
+            ticket.future.result(timeout=self.queue_timeout)
+        except concurrent.futures.TimeoutError:
+            if not self._abandon(host, ticket):
+                raise self._timed_out(host) from None
+        try:
+            yield
+        finally:
+            self._release(host)
+
+    @asynccontextmanager
+    async def aadmit(self, host: Optional[str] = None, tenant: Optional[str] = None,
+                     priority: Priority = Priority.INTERACTIVE) -> AsyncIterator[None]:
+        """Async variant of admit"""
+        self._check_rate(tenant)
+        ticket = self._enqueue(host, priority)
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(ticket.future)), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(host, ticket):
+                raise self._timed_out(host) from None
+        except asyncio.CancelledError:
+            if self._abandon(host, ticket):
+                self._release(host)
+            raise
+        try:
+            yield
+        finally:
+            self._release(host)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """In-flight, queued, admitted and rejected requests per host"""
+        with self._lock:
+            return {
+                "hosts": {
+                    host or "default": {
+                        "in_flight": lane.in_flight,
+                        "queued": {priority.name.lower(): len(queue) for priority, queue in lane.queues.items()},
+                        "admitted": lane.admitted,
+                        "rejected": lane.rejected
+                    }
+                    for host, lane in self._lanes.items()
+                },
+                "rate_limited": self.rate_limited
+            }
+
+
+# Global admission controller
+_global_admission: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Get the global admission controller"""
+    return _global_admission
+
+
+def enable_admission_control(**kwargs) -> AdmissionController:
+    """
+    Enable the global admission controller used by agents without their own.
+    Arguments are passed to AdmissionController.
+    """
+    global _global_admission
+    _global_admission = AdmissionController(**kwargs)
+    return _global_admission
+
+
+def disable_admission_control():
+    """Disable the global admission controller"""
+    global _global_admission
+    _global_admission = None
@@ -3,24 +3,55 @@ Core Agent class implementation with thinking modes, tool calling, and handoff c
 """
 from __future__ import annotations
 import asyncio
+import contextvars
+import hashlib
+import json
 import time
-from typing import Any, Dict, List, Optional, Union, Callable, TYPE_CHECKING
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, Iterator, List, Optional, Union, Callable, TYPE_CHECKING
 from dataclasses import dataclass, field
 import ollama
-from .tools import ToolRegistry
+from .tools import ToolRegistry, ToolCallResult
+from .clients import get_client, get_async_client, get_client_registry
+from .hosts import HostPool
+from .residency import ModelResidencyManager, get_residency_manager
+from .scheduling import ModelScheduler, get_model_scheduler
+from .deadline import (Deadline, deadline_scope, run_with_deadline, arun_with_deadline,
+                       iter_with_deadline, aiter_with_deadline)
+from .admission import AdmissionController, Priority, get_admission_controller, current_priority, current_tenant
 from .thinking import ThinkingMode, ThinkingManager
 from .tracing import get_tracer, TraceLevel
 from .model_settings import ModelSettings, DEFAULT_SETTINGS
 from .stats import get_stats_tracker, StatType, TokenUsage
-from .context_manager import TruncationStrategy
+from .streaming import StreamAccumulator, StreamMetrics
+from .conversation import ConversationLog
+from .turn import TurnEngine, ToolCallParser, PhaseHook, EarlyToolDispatcher, AsyncEarlyToolDispatcher
+from .context_manager import (
+    ContextManager, TruncationStrategy, RollingSummary, BackgroundSummarizer, SUMMARY_OPTIONS
+)
 from .caching import get_cache
-from .retry import RetryConfig, with_retry, async_with_retry
+from .coalescing import get_single_flight
+from .batch import BatchResult, bounded_as_completed, bounded_gather, iterate_in_thread
+from .retry import (
+    RetryConfig, with_retry, async_with_retry, get_retry_config, CircuitBreakers, get_circuit_breakers,
+    LatencyTracker, hedged_call, async_hedged_call
+)
 from .memory import MemoryManager, get_memory_manager, MemoryStore, InMemoryStore
 
 if TYPE_CHECKING:
     from .handoff import AgentHandoff
     from .caching import ResponseCache
 
+# Request fields that determine a response and therefore go into cache keys
+_CACHE_KEY_PARAMS = ('messages', 'prompt', 'system', 'tools', 'options', 'think', 'format')
+
+
+@asynccontextmanager
+async def _async_nullcontext() -> AsyncIterator[None]:
+    """nullcontext for ``async with`` (contextlib.nullcontext supports it only from Python 3.10)"""
+    yield
+
 
 @dataclass
 class Agent:
@@ -41,7 +72,7 @@ class Agent:
     thinking_mode: Optional[ThinkingMode] = None  # None by default - not all models support thinking
     
     # Ollama-specific parameters
-    host: Optional[str] = None
+    host: Union[str, List[str], HostPool, None] = None  # One host, a list of hosts, or a shared HostPool
     stream: bool = False
     keep_alive: Union[float, str, None] = None
     timeout: int = 30
@@ -57,31 +88,65 @@ class Agent:
     # Advanced features
     max_context_length: int = 20000
     context_truncation_strategy: TruncationStrategy = TruncationStrategy.SUMMARIZE_MIDDLE
+    background_summarization: bool = False  # Precompute summaries off the request path
+    background_summary_ratio: float = 0.6  # Fraction of max_context_length that starts background summaries
     enable_cache: bool = False
     cache: Optional[Any] = None
+    semantic_cache: Optional[Any] = None  # SemanticCache answering paraphrased queries (namespace: agent name)
+    residency_manager: Optional[ModelResidencyManager] = None  # Chooses keep_alive from traffic (default: global manager)
+    admission: Optional[AdmissionController] = None  # Admission control (default: global controller)
+    priority: Priority = Priority.INTERACTIVE  # Priority class of this agent's requests
+    tenant: Optional[str] = None  # Rate-limit bucket (default: agent name)
+    scheduler: Optional[ModelScheduler] = None  # Model-affinity scheduler (default: global scheduler)
+    coalesce_requests: bool = True  # Identical concurrent cached requests share one server call
     enable_retry: bool = False
     retry_config: Optional[Any] = None
+    circuit_breakers: Optional[CircuitBreakers] = None  # Per host/model circuit breakers (default: global)
+    tool_timeout: Optional[float] = None  # Per-call timeout for tool execution (seconds)
+    max_tool_workers: int = 8  # Sync tools run concurrently in a pool of this size
+    tool_executor: Optional[Executor] = None  # Executor for blocking sync tools (default: private thread pool)
+    max_tool_iterations: int = 5  # Maximum tool-call rounds per turn
+    tool_call_parsers: Optional[List[ToolCallParser]] = None  # Defaults to native tool_calls, then JSON content
+    early_tool_dispatch: bool = True  # When streaming, start each tool call as soon as it is complete
+    phase_hooks: List[PhaseHook] = field(default_factory=list)  # Called with (phase, seconds, agent name)
 
     # Memory features
     enable_memory: bool = False
     memory_store: Optional[MemoryStore] = None
 
     # Initialized in __post_init__
-    client: ollama.Client = field(init=False, repr=False)
-    async_client: ollama.AsyncClient = field(init=False, repr=False)
+    _client: Optional[ollama.Client] = field(init=False, default=None, repr=False)
+    _async_client: Optional[ollama.AsyncClient] = field(init=False, default=None, repr=False)
+    host_pool: Optional[HostPool] = field(init=False, default=None, repr=False)
     tool_registry: ToolRegistry = field(init=False, repr=False)
+    turn_engine: TurnEngine = field(init=False, repr=False)
     thinking_manager: ThinkingManager = field(init=False, repr=False)
     tracer: Any = field(init=False, repr=False)
     stats_tracker: Any = field(init=False, repr=False)
     token_usage: TokenUsage = field(init=False, repr=False)
-    messages: List[Dict[str, str]] = field(init=False, repr=False)
+    messages: ConversationLog = field(init=False, repr=False)
+    context_manager: ContextManager = field(init=False, repr=False)
+    conversation_summary: RollingSummary = field(init=False, repr=False)
+    summary_worker: Optional[BackgroundSummarizer] = field(init=False, default=None, repr=False)
     handoff_manager: Optional[AgentHandoff] = field(init=False, default=None, repr=False)
     summary_threshold: int = field(init=False, repr=False)
     memory_manager: MemoryManager = field(init=False, repr=False)
+    _request_template: Optional[Dict[str, Any]] = field(init=False, default=None, repr=False)
+    _template_settings: Optional[ModelSettings] = field(init=False, default=None, repr=False)
+    _template_revision: Any = field(init=False, default=None, repr=False)
+    _call_tools_cache: Dict[tuple, List[Dict[str, Any]]] = field(init=False, default_factory=dict, repr=False)
+    _tools_digest_memo: Dict[int, tuple] = field(init=False, default_factory=dict, repr=False)
+    _latency: LatencyTracker = field(init=False, default_factory=LatencyTracker, repr=False)
 
     def __post_init__(self):
         from .handoff import AgentHandoff
 
+        # Several hosts are load balanced through a HostPool
+        if isinstance(self.host, HostPool):
+            self.host_pool = self.host
+        elif isinstance(self.host, (list, tuple)):
+            self.host_pool = HostPool(list(self.host))
+
         # Merge direct parameters with settings (direct params take precedence)
         # Build effective settings from direct parameters or legacy settings
         if self.settings is None:
@@ -107,12 +172,12 @@ class Agent:
         if self.settings is None:
             self.settings = DEFAULT_SETTINGS
 
-        # Initialize clients
-        self.client = ollama.Client(host=self.host, timeout=self.timeout)
-        self.async_client = ollama.AsyncClient(host=self.host, timeout=self.timeout)
-
         # Initialize managers
-        self.tool_registry = ToolRegistry()
+        self.tool_registry = ToolRegistry(max_workers=self.max_tool_workers,
+                                          tool_timeout=self.tool_timeout,
+                                          executor=self.tool_executor)
+        self.turn_engine = TurnEngine(self, max_tool_iterations=self.max_tool_iterations,
+                                      parsers=self.tool_call_parsers, phase_hooks=self.phase_hooks)
         self.thinking_manager = ThinkingManager()
 
         # Initialize tracing
@@ -129,9 +194,17 @@ class Agent:
             self.tool_registry.register_tool(tool_func)
 
         # Initialize conversation history
-        self.messages = []
+        self.messages = ConversationLog()
         if self.instructions:
-            self.messages.append({"role": "system", "content": self.instructions})
+            self.messages.add("system", self.instructions)
+        self.context_manager = ContextManager(
+            self.max_context_length, self.context_truncation_strategy, messages=self.messages,
+            background_summary_ratio=self.background_summary_ratio if self.background_summarization else None,
+            summarizer=self._generate_summary
+        )
+        self.conversation_summary = RollingSummary()
+        if self.background_summarization:
+            self.summary_worker = BackgroundSummarizer(self.conversation_summary)
 
         # Initialize handoff manager
         if self.handoffs:
@@ -152,7 +225,7 @@ class Agent:
 
         # Initialize retry config if enabled
         if self.enable_retry and self.retry_config is None:
-            self.retry_config = RetryConfig()
+            self.retry_config = get_retry_config() or RetryConfig()
 
         # Initialize memory manager if enabled
         if self.enable_memory:
@@ -170,36 +243,54 @@ class Agent:
 
     def should_summarize_context(self) -> bool:
         """Check if the current context should be summarized"""
-        current_length = sum(len(msg.get("content", "")) for msg in self.messages)
-        return current_length > self.summary_threshold
+        return self.messages.total_chars > self.summary_threshold
 
     def summarize_context(self) -> str:
         """Summarize the current conversation context"""
         if not self.messages:
             return ""
 
-        # Create a summary prompt for the LLM to summarize the conversation
-        conversation_text = "\n".join([
-            f"{msg['role']}: {msg['content']}"
-            for msg in self.messages
-            if msg['role'] in ['user', 'assistant']
-        ])
+        conversation = self._summarizable_messages()
 
-        if len(conversation_text) < 100:  # If conversation is too short, no need to summarize
-            return conversation_text
+        def conversation_text(messages=conversation) -> str:
+            return "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
 
-        # Use the model to generate a summary
+        text_length = sum(len(msg['role']) + 2 + len(msg['content']) + 1 for msg in conversation)
+        if text_length <= 100:  # If conversation is too short, no need to summarize
+            return conversation_text()
+
+        # Swap in a background summary if one is ready, appending what it does not cover yet
+        if self.summary_worker is not None:
+            summary, covered = self.summary_worker.cached(conversation)
+            self.summary_worker.schedule(conversation, self._generate_summary)
+            if summary is not None:
+                tail = conversation[covered:]
+                return f"{summary}\n{conversation_text(tail)}" if tail else summary
+
+        # Use the model to summarize only what was added since the last summary
         try:
-            summary_prompt = f"Please provide a concise summary of the following conversation:\n\n{conversation_text}\n\nSummary:"
-            summary_response = self.client.generate(
-                model=self.model,
-                prompt=summary_prompt,
-                options={"num_predict": 200, "temperature": 0.3}
-            )
-            return summary_response.response
+            return self.conversation_summary.summarize(conversation, self._generate_summary)
         except Exception:
             # If summarization fails, return a simple truncation
-            return conversation_text[:1000] + "... [truncated]"
+            return conversation_text()[:1000] + "... [truncated]"
+
+    def _summarizable_messages(self) -> List[Dict[str, Any]]:
+        """User and assistant messages, the part of the conversation that gets summarized"""
+        return [msg for msg in self.messages if msg['role'] in ('user', 'assistant')]
+
+    def _generate_summary(self, prompt: str) -> str:
+        """Run a summarization prompt against the agent's model, like any other request of the agent"""
+        return self._request(
+            lambda client: client.generate(model=self.model, prompt=prompt, options=SUMMARY_OPTIONS)
+        ).response
+
+    def _schedule_background_summaries(self):
+        """Precompute summaries once the context passes background_summary_ratio"""
+        if self.messages.total_chars < self.max_context_length * self.background_summary_ratio:
+            return
+        self._sync_context_manager().maybe_precompute_summary(self.client, self.model)
+        if self.summary_worker is not None and not self.summary_worker.busy:
+            self.summary_worker.schedule(self._summarizable_messages(), self._generate_summary)
 
     def get_context_summary_message(self) -> Dict[str, str]:
         """Get a message containing the context summary"""
@@ -219,7 +310,7 @@ class Agent:
 
     def add_message(self, role: str, content: str):
         """Add a message to the conversation history"""
-        self.messages.append({"role": role, "content": content})
+        self.messages.add(role, content)
 
     def _prepare_tools(self):
         """Prepare tools for Ollama API call"""
@@ -252,10 +343,563 @@ class Agent:
             final_options = options
         return final_options
 
-    def chat(self, message: str, tools: Optional[List[Callable]] = None) -> Dict[str, Any]:
+    def _record_usage(self, response):
+        """Record token usage reported on a chat or generate response"""
+        if hasattr(response, 'prompt_eval_count') and response.prompt_eval_count:
+            self.token_usage.add_usage(prompt_tokens=response.prompt_eval_count)
+            self.stats_tracker.increment(StatType.TOKENS_INPUT, response.prompt_eval_count, agent_id=self.name)
+        if hasattr(response, 'eval_count') and response.eval_count:
+            self.token_usage.add_usage(completion_tokens=response.eval_count)
+            self.stats_tracker.increment(StatType.TOKENS_OUTPUT, response.eval_count, agent_id=self.name)
+
+    def _record_stream_metrics(self, metrics: StreamMetrics):
+        """Record time-to-first-token and throughput of a streamed response"""
+        if metrics.time_to_first_token is not None:
+            self.stats_tracker.increment(StatType.TIME_TO_FIRST_TOKEN, metrics.time_to_first_token, agent_id=self.name)
+        if metrics.tokens_per_second is not None:
+            self.stats_tracker.increment(StatType.TOKENS_PER_SECOND, metrics.tokens_per_second, agent_id=self.name)
+        self.tracer.log_event("stream.completed", agent_id=self.name,
+                              data={"chunks": metrics.chunk_count},
+                              performance=metrics.to_performance_metrics())
+
+    @property
+    def client(self) -> ollama.Client:
+        """Sync Ollama client, shared with every agent using the same host and timeout"""
+        if self._client is not None:
+            return self._client
+        if self.host_pool is not None:
+            return get_client(self.host_pool.select(self.model), self.timeout)
+        return get_client(self.host, self.timeout)
+
+    @client.setter
+    def client(self, client: ollama.Client):
+        self._client = client
+
+    @property
+    def async_client(self) -> ollama.AsyncClient:
+        """Async Ollama client for the running event loop, shared per host and timeout"""
+        if self._async_client is not None:
+            return self._async_client
+        if self.host_pool is not None:
+            return get_async_client(self.host_pool.select(self.model), self.timeout)
+        return get_async_client(self.host, self.timeout)
+
+    @async_client.setter
+    def async_client(self, client: ollama.AsyncClient):
+        self._async_client = client
+
+    @contextmanager
+    def _checkout_client(self, exclude: Optional[str] = None,
+                         route: Optional[Dict[str, Any]] = None) -> Iterator[ollama.Client]:
+        """
+        Borrow a sync client for one request, from the host's pool when pooling is
+        enabled and on the host chosen by the HostPool when there are several hosts.
+        With a model scheduler the request then waits for its model's turn on that host.
+
+        Args:
+            exclude: Host the HostPool should avoid (e.g. the one a hedged request is stuck on)
+            route: Dict that receives the chosen host under "host"
+        """
+        with self._model_in_use(), self._checkout_host_client(exclude, route) as client:
+            yield client
+
+    def _schedule(self, host: Optional[str]):
+        scheduler = self.scheduler or get_model_scheduler()
+        if scheduler is None or self.model is None:
+            return nullcontext()
+        return scheduler.slot(self.model, host)
+
+    def _aschedule(self, host: Optional[str]):
+        scheduler = self.scheduler or get_model_scheduler()
+        if scheduler is None or self.model is None:
+            return _async_nullcontext()
+        return scheduler.aslot(self.model, host)
+
+    def _model_in_use(self):
+        """Keep the residency manager from unloading the model while a request uses it"""
+        manager = self.residency_manager or get_residency_manager()
+        if manager is None or self.model is None:
+            return nullcontext()
+        return manager.in_use(self.model)
+
+    def _admission_args(self) -> Dict[str, Any]:
+        """Tenant and priority of a request; an admission_context() block overrides the agent's own"""
+        priority = current_priority()
+        return {"tenant": current_tenant() or self.tenant or self.name,
+                "priority": self.priority if priority is None else priority}
+
+    def _admit(self, host: Optional[str]):
+        controller = self.admission or get_admission_controller()
+        if controller is None:
+            return nullcontext()
+        return controller.admit(host, **self._admission_args())
+
+    def _aadmit(self, host: Optional[str]):
+        controller = self.admission or get_admission_controller()
+        if controller is None:
+            return _async_nullcontext()
+        return controller.aadmit(host, **self._admission_args())
+
+    def _circuit(self, host: Optional[str]):
+        breakers = self.circuit_breakers or get_circuit_breakers()
+        if breakers is None:
+            return nullcontext()
+        return breakers.guard(host, self.model)
+
+    @contextmanager
+    def _checkout_host_client(self, exclude: Optional[str] = None,
+                              route: Optional[Dict[str, Any]] = None) -> Iterator[ollama.Client]:
+        if self._client is not None or self.host_pool is None:
+            host = None if self.host_pool else self.host
+            if route is not None:
+                route["host"] = host
+            with self._schedule(host), self._admit(host), self._circuit(host):
+                if self._client is not None:
+                    yield self._client
+                    return
+                with get_client_registry().checkout(self.host, self.timeout) as client:
+                    yield client
+            return
+        with self.host_pool.acquire(self.model, exclude) as host:
+            if route is not None:
+                route["host"] = host
+            with self._schedule(host), self._admit(host), self._circuit(host), \
+                    get_client_registry().checkout(host, self.timeout) as client:
+                yield client
+
+    @asynccontextmanager
+    async def _acheckout_client(self, exclude: Optional[str] = None,
+                                route: Optional[Dict[str, Any]] = None) -> AsyncIterator[ollama.AsyncClient]:
+        """Async client for one request, on the host chosen by the HostPool when there are several hosts"""
+        with self._model_in_use():
+            async with self._acheckout_host_client(exclude, route) as client:
+                yield client
+
+    @asynccontextmanager
+    async def _acheckout_host_client(self, exclude: Optional[str] = None,
+                                     route: Optional[Dict[str, Any]] = None) -> AsyncIterator[ollama.AsyncClient]:
+        if self._async_client is not None or self.host_pool is None:
+            host = None if self.host_pool else self.host
+            if route is not None:
+                route["host"] = host
+            async with self._aschedule(host), self._aadmit(host):
+                with self._circuit(host):
+                    yield self.async_client
+            return
+        async with self.host_pool.aacquire(self.model, exclude) as host:
+            if route is not None:
+                route["host"] = host
+            async with self._aschedule(host), self._aadmit(host):
+                with self._circuit(host):
+                    yield get_async_client(host, self.timeout)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds before a request is duplicated to a second host, or None when not hedging"""
+        config = self.retry_config
+        if (config is None or config.hedge_percentile is None or self.host_pool is None
+                or len(self.host_pool.hosts) < 2 or len(self._latency) < config.hedge_min_samples):
+            return None
+        return self._latency.percentile(config.hedge_percentile)
+
+    def _on_retry(self, error: Exception, attempt: int):
+        from .logger import get_logger
+        get_logger().warning(f"🔁 Agent {self.name} retrying request (attempt {attempt}): {error}")
+        self.tracer.log_event("request.retry", agent_id=self.name, data={"attempt": attempt, "error": str(error)})
+
+    def _request(self, request: Callable[[ollama.Client], Any]) -> Any:
+        """
+        Run ``request`` on a checked-out client, hedged to a second host after the
+        p95 latency, retried per retry_config when enable_retry is set and bounded
+        by the current deadline
+        """
+        def on_client(exclude: Optional[str] = None, route: Optional[Dict[str, Any]] = None):
+            with self._checkout_client(exclude, route) as client:
+                started = time.time()
+                response = request(client)
+            self._latency.record(time.time() - started)
+            return response
+
+        def attempt():
+            delay = self._hedge_delay()
+            if delay is None:
+                return on_client()
+            route = {}
+            return hedged_call(lambda: on_client(route=route),
+                               lambda: on_client(exclude=route.get("host")), delay)
+
+        if self.enable_retry and self.retry_config is not None:
+            return run_with_deadline(with_retry(self.retry_config, self._on_retry)(attempt))
+        return run_with_deadline(attempt)
+
+    async def _arequest(self, request: Callable[[ollama.AsyncClient], Awaitable[Any]]) -> Any:
+        """Async variant of _request; the losing hedged request is cancelled"""
+        async def on_client(exclude: Optional[str] = None, route: Optional[Dict[str, Any]] = None):
+            async with self._acheckout_client(exclude, route) as client:
+                started = time.time()
+                response = await request(client)
+            self._latency.record(time.time() - started)
+            return response
+
+        async def attempt():
+            delay = self._hedge_delay()
+            if delay is None:
+                return await on_client()
+            route = {}
+            return await async_hedged_call(lambda: on_client(route=route),
+                                           lambda: on_client(exclude=route.get("host")), delay)
+
+        if self.enable_retry and self.retry_config is not None:
+            return await arun_with_deadline(lambda: async_with_retry(attempt, self.retry_config, self._on_retry))
+        return await arun_with_deadline(attempt)
+
+    def _chat_once(self, chat_params: Dict[str, Any], dispatcher: Optional[EarlyToolDispatcher] = None):
+        """
+        Make a single chat request, aggregating the stream when streaming is enabled.
+        A dispatcher starts the tool calls it sees in the stream before it ends.
+        """
+        if not chat_params.get('stream'):
+            return self._request(lambda client: client.chat(**chat_params))
+
+        def stream(client: ollama.Client):
+            accumulator = StreamAccumulator()
+            metrics = StreamMetrics()
+            on_chunk = dispatcher.watch() if dispatcher is not None else None
+            # Stops at the next chunk once the deadline passes, even after run_with_deadline gave up
+            for chunk in iter_with_deadline(client.chat(**chat_params)):
+                metrics.record_chunk(accumulator.feed(chunk))
+                if on_chunk is not None:
+                    on_chunk(chunk)
+            metrics.finish(accumulator.last_chunk)
+            self._record_stream_metrics(metrics)
+            return accumulator.build_response()
+
+        return self._request(stream)
+
+    async def _achat_once(self, chat_params: Dict[str, Any],
+                          dispatcher: Optional[AsyncEarlyToolDispatcher] = None):
+        """Asynchronously make a single chat request, aggregating the stream when streaming is enabled"""
+        if not chat_params.get('stream'):
+            return await self._arequest(lambda client: client.chat(**chat_params))
+
+        async def stream(client: ollama.AsyncClient):
+            accumulator = StreamAccumulator()
+            metrics = StreamMetrics()
+            on_chunk = dispatcher.watch() if dispatcher is not None else None
+            async for chunk in aiter_with_deadline(await client.chat(**chat_params)):
+                metrics.record_chunk(accumulator.feed(chunk))
+                if on_chunk is not None:
+                    on_chunk(chunk)
+            metrics.finish(accumulator.last_chunk)
+            self._record_stream_metrics(metrics)
+            return accumulator.build_response()
+
+        return await self._arequest(stream)
+
+    def _record_tool_results(self, results: List[ToolCallResult]):
+        """Append tool results to the conversation in call order and trace them"""
+        from .logger import get_logger
+        logger = get_logger()
+
+        for result in results:
+            if result.success:
+                logger.info(f"✅ Tool {result.name} completed successfully")
+                self.stats_tracker.increment(StatType.TOOLS_SUCCESS, 1, agent_id=self.name)
+                logger.debug(f"   Result length: {len(result.content)} chars")
+                self.tracer.log_event("tool.success", agent_id=self.name,
+                                      data={"tool": result.name, "result_length": len(result.content),
+                                            "execution_time": result.execution_time})
+            else:
+                logger.error(f"❌ Tool {result.name} failed: {str(result.error)}")
+                self.stats_tracker.increment(StatType.TOOLS_FAILED, 1, agent_id=self.name)
+                self.tracer.log_event("tool.error", agent_id=self.name,
+                                      data={"tool": result.name, "error": str(result.error),
+                                            "execution_time": result.execution_time})
+
+            # Add tool result to conversation
+            self.messages.add("tool", result.content)
+
+    def _log_tool_calls(self, tool_calls: List[Any]):
+        """Trace the tool calls about to be dispatched"""
+        for tool_call in tool_calls:
+            self.tracer.log_event("tool.executing", agent_id=self.name,
+                                  data={"tool": tool_call.function.name, "args": tool_call.function.arguments})
+
+    def _execute_tool_calls(self, tool_calls: List[Any], dispatcher: Optional[EarlyToolDispatcher] = None):
+        """Execute tool calls concurrently (reusing early-dispatched ones) and append their results"""
+        self._log_tool_calls(tool_calls)
+        pairs = [(tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+        if dispatcher is not None:
+            results = dispatcher.collect(pairs)
+        else:
+            results = self.tool_registry.execute_tool_calls(pairs)
+        self._record_tool_results(results)
+
+    async def _aexecute_tool_calls(self, tool_calls: List[Any],
+                                   dispatcher: Optional[AsyncEarlyToolDispatcher] = None):
+        """Asynchronously execute tool calls concurrently and append their results to the conversation"""
+        self._log_tool_calls(tool_calls)
+        pairs = [(tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+        if dispatcher is not None:
+            results = await dispatcher.acollect(pairs)
+        else:
+            results = await self.tool_registry.aexecute_tool_calls(pairs)
+        self._record_tool_results(results)
+
+    def _keep_alive(self) -> Union[float, str, None]:
+        """
+        keep_alive for a request: an explicit setting wins, otherwise the residency
+        manager chooses it when one is active. The manager sees the traffic either way.
+        """
+        manager = self.residency_manager or get_residency_manager()
+        if manager is None or self.model is None:
+            return self.keep_alive
+        manager.record_request(self.model)
+        return self.keep_alive if self.keep_alive is not None else manager.keep_alive_for(self.model)
+
+    def _get_request_template(self) -> Dict[str, Any]:
+        """
+        Get the tools, options and think parameter shared by every request.
+        They are compiled once and rebuilt only when tools or settings change.
+        """
+        revision = (self.settings.revision, self.tool_registry.revision)
+        if (self._request_template is None or self._template_settings is not self.settings
+                or self._template_revision != revision):
+            options = self._get_options()
+            self._request_template = {
+                'tools': self._prepare_tools() or None,
+                'options': options if options else None,
+                'think': self._get_think_param()
+            }
+            self._template_settings = self.settings
+            self._template_revision = revision
+            self._call_tools_cache.clear()
+        return self._request_template
+
+    def invalidate_request_template(self):
+        """Force the request template to be rebuilt, e.g. after mutating settings.extra_args in place"""
+        self._request_template = None
+
+    def _tools_for_call(self, template: Dict[str, Any], tools: Optional[List[Callable]]) -> Optional[List[Dict[str, Any]]]:
+        """Combine agent tools with per-call tools, memoising the per-call schemas"""
+        if not tools:
+            return template['tools']
+
+        key = tuple(tools)
+        combined = self._call_tools_cache.get(key)
+        if combined is None:
+            temp_registry = ToolRegistry()
+            for tool_func in tools:
+                temp_registry.register_tool(tool_func)
+            combined = (template['tools'] or []) + temp_registry.get_ollama_tools()
+            if len(self._call_tools_cache) >= 32:
+                self._call_tools_cache.clear()
+            self._call_tools_cache[key] = combined
+        return combined
+
+    def _build_chat_params(self, tools: Optional[List[Callable]] = None,
+                           stream: Optional[bool] = None) -> Dict[str, Any]:
+        """Build chat parameters for the current conversation from the request template"""
+        template = self._get_request_template()
+        all_tools = self._tools_for_call(template, tools)
+        self.stats_tracker.increment(StatType.TOOLS_CALLED, len(all_tools or ()), agent_id=self.name)
+
+        chat_params = {
+            'model': self.model,
+            'messages': self.messages,
+            'tools': all_tools,
+            'stream': self.stream if stream is None else stream,
+            'options': template['options'],
+            'keep_alive': self._keep_alive()
+        }
+
+        # Only include think parameter if explicitly set
+        if template['think'] is not None:
+            chat_params['think'] = template['think']
+        return chat_params
+
+    def _sync_context_manager(self) -> ContextManager:
+        """The context manager, updated with the agent's current history and limits"""
+        manager = self.context_manager
+        manager.messages = self.messages
+        manager.max_context_length = self.max_context_length
+        manager.strategy = self.context_truncation_strategy
+        return manager
+
+    def _context_messages(self) -> List[Dict[str, Any]]:
+        """Conversation to send, truncated to max_context_length with the configured strategy"""
+        if self.background_summarization:
+            self._schedule_background_summaries()
+        if self.messages.total_chars <= self.max_context_length:
+            return self.messages
+
+        manager = self._sync_context_manager()
+        messages = manager.truncate_context(self.client, self.model)
+        self.tracer.log_event("context.truncated", agent_id=self.name,
+                              data={"strategy": manager.strategy.value,
+                                    "messages_kept": len(messages),
+                                    "messages_total": len(self.messages)})
+        return messages
+
+    def _with_context(self, chat_params: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat parameters with context management applied to the messages"""
+        messages = self._context_messages()
+        if messages is chat_params['messages']:
+            return chat_params
+        return {**chat_params, 'messages': messages}
+
+    async def _awith_context(self, chat_params: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of _with_context; summarization runs off the event loop"""
+        if self.context_truncation_strategy == TruncationStrategy.SUMMARIZE_MIDDLE and \
+                self.messages.total_chars > self.max_context_length:
+            # Like asyncio.to_thread (3.9+): the summary request must see the caller's deadline
+            return await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, self._with_context, chat_params)
+        return self._with_context(chat_params)
+
+    def _cache_key(self, params: Dict[str, Any]) -> Optional[str]:
+        """Response cache key for a chat or generate request, or None when caching is off"""
+        if not self.enable_cache or self.cache is None:
+            return None
+        request = {name: params.get(name) for name in _CACHE_KEY_PARAMS}
+        if request['tools']:
+            request['tools'] = self._tools_digest(request['tools'])
+        return self.cache.request_key(params['model'], **request)
+
+    def _tools_digest(self, tools: List[Dict[str, Any]]) -> bytes:
+        """Digest of a tool schema list, memoised per list (schemas come from the request template)"""
+        memo = self._tools_digest_memo.get(id(tools))
+        if memo is not None and memo[0] is tools:
+            return memo[1]
+        digest = hashlib.sha256(json.dumps(tools, sort_keys=True, default=str).encode()).digest()
+        if len(self._tools_digest_memo) >= 32:
+            self._tools_digest_memo.clear()
+        self._tools_digest_memo[id(tools)] = (tools, digest)
+        return digest
+
+    def _cache_get(self, key: Optional[str]) -> Any:
+        """Look up a cached response and report the hit or miss"""
+        if key is None:
+            return None
+        return self._count_cache_lookup(key, self.cache.get_by_key(key))
+
+    async def _acache_get(self, key: Optional[str]) -> Any:
+        """Async variant of _cache_get (backend I/O runs off the event loop)"""
+        if key is None:
+            return None
+        return self._count_cache_lookup(key, await self.cache.aget_by_key(key))
+
+    def _count_cache_lookup(self, key: str, response: Any) -> Any:
+        if response is None:
+            self.stats_tracker.increment(StatType.CACHE_MISSES, 1, agent_id=self.name)
+        else:
+            self.stats_tracker.increment(StatType.CACHE_HITS, 1, agent_id=self.name)
+            self.tracer.log_event("cache.hit", agent_id=self.name, data={"key": key})
+        return response
+
+    def _cache_set(self, key: Optional[str], response: Any):
+        if key is not None:
+            self.cache.set_by_key(key, response)
+
+    async def _acache_set(self, key: Optional[str], response: Any):
+        if key is not None:
+            await self.cache.aset_by_key(key, response)
+
+    def _semantic_get(self, message: str) -> Optional[Dict[str, Any]]:
+        """Answer a message from the semantic cache, recording the exchange on a hit"""
+        if self.semantic_cache is None:
+            return None
+        match = self.semantic_cache.lookup(message, namespace=self.name)
+        if match is None:
+            return None
+        result, similarity = match
+        self.add_message("user", message)
+        self.add_message("assistant", result["content"])
+        self.stats_tracker.increment(StatType.CACHE_HITS, 1, agent_id=self.name)
+        self.tracer.log_event("semantic_cache.hit", agent_id=self.name, data={"similarity": similarity})
+        return dict(result)
+
+    def _semantic_set(self, message: str, result: Dict[str, Any]):
+        """Store tool-free answers only: one built from tool results (time, files...) may be stale"""
+        if self.semantic_cache is None or result.get("deadline_exceeded"):
+            return
+        if result.get("tool_calls") or result.get("used_tools"):
+            return
+        self.semantic_cache.set(message, result, namespace=self.name)
+
+    def _coalesced(self, key: Optional[str], fetch: Callable[[], Any]) -> Any:
+        """Run fetch, sharing one call between identical concurrent requests (keyed by cache key)"""
+        if key is None or not self.coalesce_requests:
+            return fetch()
+        response, shared = get_single_flight().do(key, fetch)
+        if shared:
+            self.tracer.log_event("request.coalesced", agent_id=self.name, data={"key": key})
+        return response
+
+    async def _acoalesced(self, key: Optional[str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of _coalesced"""
+        if key is None or not self.coalesce_requests:
+            return await fetch()
+        response, shared = await get_single_flight().ado(key, fetch)
+        if shared:
+            self.tracer.log_event("request.coalesced", agent_id=self.name, data={"key": key})
+        return response
+
+    def _send_chat(self, chat_params: Dict[str, Any], dispatcher: Optional[EarlyToolDispatcher] = None):
+        """Send one chat request of a turn and record its usage"""
+        from .logger import get_logger
+        logger = get_logger()
+
+        chat_params = self._with_context(chat_params)
+        cache_key = self._cache_key(chat_params)
+        response = self._cache_get(cache_key)
+        if response is not None:
+            return response
+
+        def fetch():
+            self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
+            logger.debug(f"   Calling model with {len(chat_params['messages'])} messages...")
+            response = self._chat_once(chat_params, dispatcher)
+            logger.info(f"📥 Received response from model")
+            self._record_usage(response)
+            self._cache_set(cache_key, response)
+            return response
+
+        return self._coalesced(cache_key, fetch)
+
+    async def _asend_chat(self, chat_params: Dict[str, Any],
+                          dispatcher: Optional[AsyncEarlyToolDispatcher] = None):
+        """Asynchronously send one chat request of a turn and record its usage"""
+        return await self._arequest_chat(await self._awith_context(chat_params), dispatcher)
+
+    async def _arequest_chat(self, chat_params: Dict[str, Any],
+                             dispatcher: Optional[AsyncEarlyToolDispatcher] = None):
+        """Asynchronously make a chat request through the cache and request coalescing"""
+        cache_key = self._cache_key(chat_params)
+        response = await self._acache_get(cache_key)
+        if response is not None:
+            return response
+
+        async def fetch():
+            self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
+            response = await self._achat_once(chat_params, dispatcher)
+            self._record_usage(response)
+            await self._acache_set(cache_key, response)
+            return response
+
+        return await self._acoalesced(cache_key, fetch)
+
+    def chat(self, message: str, tools: Optional[List[Callable]] = None,
+             deadline: Union[float, Deadline, None] = None) -> Dict[str, Any]:
         """
         Send a message to the agent and get a response.
-        Supports caching and retry.
+        Tool calls are executed until the model answers or max_tool_iterations is reached.
+
+        Args:
+            message: User message
+            tools: Extra tools for this call
+            deadline: Seconds (or a Deadline) for the whole turn, tool calls included.
+                When it runs out the in-flight request is abandoned and the partial
+                result is returned with ``"deadline_exceeded": True``.
         """
         from .logger import get_logger
         logger = get_logger()
@@ -273,380 +917,162 @@ class Agent:
             
             if target_agent_id and target_agent_id != self.name:
                 logger.info(f"🔀 Handing off to agent: {target_agent_id}")
-                return self.handoff_manager.handoff_to(target_agent_id, context={"trigger_message": message})
+                return self.handoff_manager.handoff_to(target_agent_id, context={"trigger_message": message},
+                                                       deadline=deadline)
 
         start_time = time.time()
 
-        with self.tracer.span("agent.chat", agent_id=self.name,
-                             data={"message": message, "has_tools": bool(tools)}) as span:
-            self.add_message("user", message)
-
-            all_tools = self._prepare_tools()
-            if tools:
-                temp_registry = ToolRegistry()
-                for tool_func in tools:
-                    temp_registry.register_tool(tool_func)
-                all_tools.extend(temp_registry.get_ollama_tools())
-
-            self.stats_tracker.increment(StatType.TOOLS_CALLED, len(all_tools), agent_id=self.name)
-
-            think_param = self._get_think_param()
-            options = self._get_options()
-
-            # # Check cache if enabled
-            # if self.enable_cache and self.cache:
-            #     cached_response = self.cache.get(
-            #         message=message,
-            #         model=self.model,
-            #         options=options,
-            #         tools=all_tools
-            #     )
-            #     if cached_response:
-            #         self.stats_tracker.increment(StatType.CACHE_HITS, 1, agent_id=self.name)
-            #         return cached_response
-
-            self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
-
-            # # Make API call with retry if enabled
-            # if self.enable_retry and self.retry_config:
-            #     def on_retry_callback(exception, attempt):
-            #         self.tracer.log(f"Retry attempt {attempt} after error: {exception}", agent_id=self.name)
-                
-            #     @with_retry(self.retry_config, on_retry=on_retry_callback)
-            #     def make_request():
-            #         return self.client.chat(
-            #             model=self.model,
-            #             messages=self.messages,
-            #             tools=all_tools if all_tools else None,
-            #             options=options,
-            #             keep_alive=self.keep_alive,
-            #             stream=self.stream,
-            #             think=think_param
-            #         )
-                
-            #     response = make_request()
-            # else:
-            # Build chat parameters
-            logger.info(f"📤 Preparing API call to model: {self.model}")
-            logger.debug(f"   Messages in history: {len(self.messages)}")
-            logger.debug(f"   Tools available: {len(all_tools) if all_tools else 0}")
-            logger.debug(f"   Think param: {think_param}")
-            
-            chat_params = {
-                'model': self.model,
-                'messages': self.messages,
-                'tools': all_tools if all_tools else None,
-                'stream': self.stream,
-                'options': options if options else None,
-                'keep_alive': self.keep_alive
-            }
-            
-            # Only include think parameter if explicitly set
-            if think_param is not None:
-                chat_params['think'] = think_param
-            
-            logger.debug(f"   Calling ollama.chat...")
-            response = self.client.chat(**chat_params)
-            logger.info(f"📥 Received response from model")
-            logger.debug(f"   Response content length: {len(response.message.content)} chars")
-            logger.debug(f"   Response content preview: {response.message.content[:200]}...")
-
-            response_time = time.time() - start_time
-            self.stats_tracker.increment(StatType.RESPONSE_TIME, response_time, agent_id=self.name)
-
-            if hasattr(response, 'prompt_eval_count') and response.prompt_eval_count:
-                self.token_usage.add_usage(prompt_tokens=response.prompt_eval_count)
-                self.stats_tracker.increment(StatType.TOKENS_INPUT, response.prompt_eval_count, agent_id=self.name)
-
-            if hasattr(response, 'eval_count') and response.eval_count:
-                self.token_usage.add_usage(completion_tokens=response.eval_count)
-                self.stats_tracker.increment(StatType.TOKENS_OUTPUT, response.eval_count, agent_id=self.name)
-
-            # Execute tool calls if present - loop until no more tool calls
-            from .logger import get_logger
-            import json
-            import re
-            logger = get_logger()
-            
-            max_iterations = 5  # Prevent infinite loops
-            iteration = 0
-            
-            while iteration < max_iterations:
-                iteration += 1
-                logger.debug(f"🔄 Tool execution iteration {iteration}/{max_iterations}")
-                
-                logger.info(f"🔍 Checking for tool calls in response from {self.name}")
-                logger.debug(f"   Has tool_calls attr: {hasattr(response.message, 'tool_calls')}")
-                
-                if hasattr(response.message, 'tool_calls'):
-                    logger.debug(f"   tool_calls value: {response.message.tool_calls}")
-                    logger.debug(f"   tool_calls is truthy: {bool(response.message.tool_calls)}")
-                
-                # Check for proper tool_calls first
-                has_tool_calls = hasattr(response.message, 'tool_calls') and response.message.tool_calls
-                
-                # If no proper tool_calls, try to parse from content (fallback for models that don't support it)
-                parsed_tool_calls = []
-                if not has_tool_calls and response.message.content:
-                    logger.debug(f"   No proper tool_calls, checking content for JSON tool calls...")
-                    # Try to extract JSON from markdown code blocks or plain text
-                    content = response.message.content.strip()
-                    
-                    # Remove markdown code blocks if present
-                    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
-                    if json_match:
-                        content = json_match.group(1)
-                        logger.debug(f"   Found JSON in markdown block")
-                    
-                    # Try to parse as JSON
-                    try:
-                        parsed = json.loads(content)
-                        if isinstance(parsed, dict) and 'name' in parsed and 'arguments' in parsed:
-                            logger.info(f"✅ Parsed tool call from content: {parsed['name']}")
-                            # Create a fake tool_call object
-                            class FakeToolCall:
-                                class FakeFunction:
-                                    def __init__(self, name, arguments):
-                                        self.name = name
-                                        self.arguments = arguments
-                                def __init__(self, name, arguments):
-                                    self.function = self.FakeFunction(name, arguments)
-                            
-                            parsed_tool_calls = [FakeToolCall(parsed['name'], parsed['arguments'])]
-                            has_tool_calls = True
-                            logger.info(f"✅ Created tool call from parsed content")
-                    except json.JSONDecodeError:
-                        logger.debug(f"   Content is not valid JSON")
-                    except Exception as e:
-                        logger.debug(f"   Error parsing content: {e}")
-                
-                if not has_tool_calls:
-                    logger.info(f"ℹ️  No tool calls found in response from {self.name}")
-                    break  # Exit loop - no more tool calls
-                
-                # Use parsed_tool_calls if we had to parse from content, otherwise use response.message.tool_calls
-                tool_calls_to_execute = parsed_tool_calls if parsed_tool_calls else response.message.tool_calls
-                
-                logger.info(f"✅ Found {len(tool_calls_to_execute)} tool call(s) to execute")
-                self.stats_tracker.increment(StatType.TOOLS_SUCCESS, len(tool_calls_to_execute), agent_id=self.name)
-                
-                # Add assistant's message with tool calls to history
-                logger.debug(f"Adding assistant message to history: {response.message.content[:100]}...")
-                self.add_message("assistant", response.message.content)
-                
-                # Execute each tool call
-                for i, tool_call in enumerate(tool_calls_to_execute, 1):
-                    tool_name = tool_call.function.name
-                    tool_args = tool_call.function.arguments
-                    
-                    logger.info(f"🔧 Executing tool {i}/{len(tool_calls_to_execute)}: {tool_name}")
-                    logger.debug(f"   Arguments: {tool_args}")
-                    
-                    self.tracer.log_event("tool.executing", agent_id=self.name, 
-                                        data={"tool": tool_name, "args": tool_args})
-                    
-                    try:
-                        # Execute the tool
-                        logger.debug(f"   Calling {tool_name} from registry...")
-                        tool_result = self.tool_registry.tools[tool_name](**tool_args)
-                        logger.info(f"✅ Tool {tool_name} completed successfully")
-                        logger.debug(f"   Result length: {len(str(tool_result))} chars")
-                        logger.debug(f"   Result preview: {str(tool_result)[:200]}...")
-                        
-                        # Add tool result to conversation
-                        self.messages.append({
-                            "role": "tool",
-                            "content": str(tool_result)
-                        })
-                        
-                        logger.debug(f"   Added tool result to messages (role: tool)")
-                        
-                        self.tracer.log_event("tool.success", agent_id=self.name,
-                                            data={"tool": tool_name, "result_length": len(str(tool_result))})
-                    except Exception as e:
-                        logger.error(f"❌ Tool {tool_name} failed: {str(e)}")
-                        logger.error(f"   Exception type: {type(e).__name__}")
-                        import traceback
-                        logger.debug(f"   Traceback:\n{traceback.format_exc()}")
-                        
-                        error_msg = f"Tool {tool_name} failed: {str(e)}"
-                        self.messages.append({
-                            "role": "tool",
-                            "content": error_msg
-                        })
-                        self.tracer.log_event("tool.error", agent_id=self.name,
-                                            data={"tool": tool_name, "error": str(e)})
-                
-                # Make another call to get the final response with tool results
-                logger.info(f"🔄 Making follow-up call to process tool results...")
-                logger.debug(f"   Message history length: {len(self.messages)}")
-                logger.debug(f"   Last message role: {self.messages[-1]['role']}")
-                
-                chat_params = {
-                    'model': self.model,
-                    'messages': self.messages,
-                    'stream': self.stream,
-                    'options': options if options else None,
-                    'keep_alive': self.keep_alive
-                }
-                
-                if think_param is not None:
-                    chat_params['think'] = think_param
-                
-                logger.debug(f"   Calling model again with {len(self.messages)} messages...")
-                final_response = self.client.chat(**chat_params)
-                logger.info(f"✅ Received final response from model")
-                logger.debug(f"   Final response content length: {len(final_response.message.content)} chars")
-                logger.debug(f"   Final response content: {final_response.message.content}")
-                
-                # Update response to the final one for next iteration
-                response = final_response
-                
-                # Track final response
-                if hasattr(response, 'eval_count') and response.eval_count:
-                    self.token_usage.add_usage(completion_tokens=response.eval_count)
-                    self.stats_tracker.increment(StatType.TOKENS_OUTPUT, response.eval_count, agent_id=self.name)
-            
-            # Loop ends - add final message and return
-            logger.info(f"✅ No more tool calls - finalizing response")
-
-            self.add_message("assistant", response.message.content)
-            self.stats_tracker.increment(StatType.CONVERSATION_TURNS, 1, agent_id=self.name)
-
-            result = {
-                "content": response.message.content,
-                "tool_calls": getattr(response.message, 'tool_calls', None),
-                "raw_response": response
-            }
-            
-            # # Cache the response if caching is enabled
-            # if self.enable_cache and self.cache:
-            #     self.cache.set(
-            #         message=message,
-            #         model=self.model,
-            #         response=result,
-            #         options=options,
-            #         tools=all_tools
-            #     )
-            
+        with deadline_scope(deadline), self.tracer.span("agent.chat", agent_id=self.name,
+                                                        data={"message": message, "has_tools": bool(tools)}) as span:
+            result = self._semantic_get(message)
+            if result is None:
+                result = self.turn_engine.run(message, tools, span=span)
+                self._semantic_set(message, result)
+            self.stats_tracker.increment(StatType.RESPONSE_TIME, time.time() - start_time, agent_id=self.name)
             return result
 
-    async def achat(self, message: str, tools: Optional[List[Callable]] = None) -> Dict[str, Any]:
+    async def achat(self, message: str, tools: Optional[List[Callable]] = None,
+                    deadline: Union[float, Deadline, None] = None) -> Dict[str, Any]:
         """
-        Asynchronously send a message to the agent and get a response
+        Asynchronously send a message to the agent and get a response.
+        Runs the same turn engine as chat(); an expired deadline cancels the in-flight request.
         """
         if self.handoff_manager:
             target_agent_id = self.handoff_manager.check_handoff_rules(message)
             if target_agent_id and target_agent_id != self.name:
-                return self.handoff_manager.handoff_to(target_agent_id, context={"trigger_message": message})
+                return self.handoff_manager.handoff_to(target_agent_id, context={"trigger_message": message},
+                                                       deadline=deadline)
 
         start_time = time.time()
-        with self.tracer.span("agent.achat", agent_id=self.name,
+        with deadline_scope(deadline), self.tracer.span("agent.achat", agent_id=self.name,
+                                                        data={"message": message, "has_tools": bool(tools)}) as span:
+            # Embedding calls block, so they run off the event loop
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, self._semantic_get, message) if self.semantic_cache else None
+            if result is None:
+                result = await self.turn_engine.arun(message, tools, span=span)
+                if self.semantic_cache is not None:
+                    await loop.run_in_executor(None, self._semantic_set, message, result)
+            self.stats_tracker.increment(StatType.RESPONSE_TIME, time.time() - start_time, agent_id=self.name)
+            return result
+
+    def chat_stream(self, message: str, tools: Optional[List[Callable]] = None) -> Iterator[str]:
+        """
+        Send a message to the agent and yield content deltas as they arrive.
+        Tool calls are executed between streamed turns until the model answers.
+        """
+        with self.tracer.span("agent.chat_stream", agent_id=self.name,
                              data={"message": message, "has_tools": bool(tools)}) as span:
             self.add_message("user", message)
-            all_tools = self._prepare_tools()
-            if tools:
-                temp_registry = ToolRegistry()
-                for tool_func in tools:
-                    temp_registry.register_tool(tool_func)
-                all_tools.extend(temp_registry.get_ollama_tools())
-            self.stats_tracker.increment(StatType.TOOLS_CALLED, len(all_tools), agent_id=self.name)
-            think_param = self._get_think_param()
-            options = self._get_options()
-            self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
+            chat_params = self._build_chat_params(tools, stream=True)
+
+            dispatcher = None
+            try:
+                for iteration in range(self.turn_engine.max_tool_iterations + 1):
+                    self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
+                    accumulator = StreamAccumulator()
+                    metrics = StreamMetrics()
+                    dispatcher = self.turn_engine.early_dispatcher(chat_params)
+                    on_chunk = dispatcher.watch() if dispatcher is not None else None
+                    # Before checkout: a summary request needs a slot of its own
+                    request_params = self._with_context(chat_params)
+                    with self._checkout_client() as client:
+                        for chunk in iter_with_deadline(client.chat(**request_params)):
+                            delta = accumulator.feed(chunk)
+                            metrics.record_chunk(delta)
+                            if on_chunk is not None:
+                                on_chunk(chunk)
+                            if delta:
+                                yield delta
+                    metrics.finish(accumulator.last_chunk)
+
+                    response = accumulator.build_response()
+                    self._record_usage(response)
+                    self._record_stream_metrics(metrics)
+                    if span is not None:
+                        span.performance = metrics.to_performance_metrics()
+
+                    tool_calls = self.turn_engine.parse_tool_calls(response.message)
+                    if not tool_calls or iteration == self.turn_engine.max_tool_iterations:
+                        break
+
+                    self.add_message("assistant", response.message.content)
+                    self._execute_tool_calls(tool_calls, dispatcher)
+            finally:
+                # Also on errors, deadlines and early close: drop tool calls started but not collected
+                if dispatcher is not None:
+                    dispatcher.discard()
 
-            # Build chat parameters
-            chat_params = {
-                'model': self.model,
-                'messages': self.messages,
-                'tools': all_tools if all_tools else None,
-                'stream': self.stream,
-                'options': options if options else None,
-                'keep_alive': self.keep_alive
-            }
-            
-            # Only include think parameter if explicitly set
-            if think_param is not None:
-                chat_params['think'] = think_param
-            
-            response = await self.async_client.chat(**chat_params)
+            self.add_message("assistant", response.message.content)
+            self.stats_tracker.increment(StatType.CONVERSATION_TURNS, 1, agent_id=self.name)
+
+    async def achat_stream(self, message: str, tools: Optional[List[Callable]] = None) -> AsyncIterator[str]:
+        """
+        Asynchronously send a message to the agent and yield content deltas as they arrive.
+        Tool calls are executed between streamed turns until the model answers.
+        """
+        with self.tracer.span("agent.achat_stream", agent_id=self.name,
+                             data={"message": message, "has_tools": bool(tools)}) as span:
+            self.add_message("user", message)
+            chat_params = self._build_chat_params(tools, stream=True)
+
+            dispatcher = None
+            try:
+                for iteration in range(self.turn_engine.max_tool_iterations + 1):
+                    self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
+                    accumulator = StreamAccumulator()
+                    metrics = StreamMetrics()
+                    dispatcher = self.turn_engine.early_dispatcher(chat_params, asynchronous=True)
+                    on_chunk = dispatcher.watch() if dispatcher is not None else None
+                    # Before checkout: a summary request needs a slot of its own
+                    request_params = await self._awith_context(chat_params)
+                    async with self._acheckout_client() as client:
+                        async for chunk in aiter_with_deadline(await client.chat(**request_params)):
+                            delta = accumulator.feed(chunk)
+                            metrics.record_chunk(delta)
+                            if on_chunk is not None:
+                                on_chunk(chunk)
+                            if delta:
+                                yield delta
+                    metrics.finish(accumulator.last_chunk)
+
+                    response = accumulator.build_response()
+                    self._record_usage(response)
+                    self._record_stream_metrics(metrics)
+                    if span is not None:
+                        span.performance = metrics.to_performance_metrics()
+
+                    tool_calls = self.turn_engine.parse_tool_calls(response.message)
+                    if not tool_calls or iteration == self.turn_engine.max_tool_iterations:
+                        break
+
+                    self.add_message("assistant", response.message.content)
+                    await self._aexecute_tool_calls(tool_calls, dispatcher)
+            finally:
+                # Also on errors, deadlines and early close: drop tool calls started but not collected
+                if dispatcher is not None:
+                    dispatcher.discard()
 
-            response_time = time.time() - start_time
-            self.stats_tracker.increment(StatType.RESPONSE_TIME, response_time, agent_id=self.name)
-            if hasattr(response, 'prompt_eval_count') and response.prompt_eval_count:
-                self.token_usage.add_usage(prompt_tokens=response.prompt_eval_count)
-                self.stats_tracker.increment(StatType.TOKENS_INPUT, response.prompt_eval_count, agent_id=self.name)
-            if hasattr(response, 'eval_count') and response.eval_count:
-                self.token_usage.add_usage(completion_tokens=response.eval_count)
-                self.stats_tracker.increment(StatType.TOKENS_OUTPUT, response.eval_count, agent_id=self.name)
-            
-            # Execute tool calls if present
-            if hasattr(response.message, 'tool_calls') and response.message.tool_calls:
-                self.stats_tracker.increment(StatType.TOOLS_SUCCESS, len(response.message.tool_calls), agent_id=self.name)
-                
-                # Add assistant's message with tool calls to history
-                self.add_message("assistant", response.message.content)
-                
-                # Execute each tool call
-                for tool_call in response.message.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = tool_call.function.arguments
-                    
-                    self.tracer.log_event("tool.executing", agent_id=self.name, 
-                                        data={"tool": tool_name, "args": tool_args})
-                    
-                    try:
-                        # Execute the tool
-                        tool_result = self.tool_registry.tools[tool_name](**tool_args)
-                        
-                        # Add tool result to conversation
-                        self.messages.append({
-                            "role": "tool",
-                            "content": str(tool_result)
-                        })
-                        
-                        self.tracer.log_event("tool.success", agent_id=self.name,
-                                            data={"tool": tool_name, "result_length": len(str(tool_result))})
-                    except Exception as e:
-                        error_msg = f"Tool {tool_name} failed: {str(e)}"
-                        self.messages.append({
-                            "role": "tool",
-                            "content": error_msg
-                        })
-                        self.tracer.log_event("tool.error", agent_id=self.name,
-                                            data={"tool": tool_name, "error": str(e)})
-                
-                # Make another call to get the final response with tool results
-                chat_params = {
-                    'model': self.model,
-                    'messages': self.messages,
-                    'stream': self.stream,
-                    'options': options if options else None,
-                    'keep_alive': self.keep_alive
-                }
-                
-                if think_param is not None:
-                    chat_params['think'] = think_param
-                
-                final_response = await self.async_client.chat(**chat_params)
-                
-                # Update response to the final one
-                response = final_response
-                
-                # Track final response
-                if hasattr(response, 'eval_count') and response.eval_count:
-                    self.token_usage.add_usage(completion_tokens=response.eval_count)
-                    self.stats_tracker.increment(StatType.TOKENS_OUTPUT, response.eval_count, agent_id=self.name)
-            
             self.add_message("assistant", response.message.content)
             self.stats_tracker.increment(StatType.CONVERSATION_TURNS, 1, agent_id=self.name)
-            result = {
-                "content": response.message.content,
-                "tool_calls": getattr(response.message, 'tool_calls', None),
-                "raw_response": response
-            }
-            return result
-    
+
+    def _build_generate_params(self, prompt: str) -> Dict[str, Any]:
+        """Build generate parameters from the request template"""
+        template = self._get_request_template()
+        gen_params = {
+            'model': self.model,
+            'prompt': prompt,
+            'system': self.instructions,
+            'stream': False,
+            'options': template['options'],
+            'keep_alive': self._keep_alive()
+        }
+
+        # Only include think parameter if explicitly set
+        if template['think'] is not None:
+            gen_params['think'] = template['think']
+        return gen_params
+
     def generate(self, prompt: str) -> Dict[str, Any]:
         """
         Generate content using the agent
@@ -654,33 +1080,21 @@ class Agent:
         start_time = time.time()
         with self.tracer.span("agent.generate", agent_id=self.name,
                              data={"prompt_length": len(prompt)}) as span:
-            think_param = self._get_think_param()
-            options = self._get_options()
-            self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
-            
-            # Build generate parameters
-            gen_params = {
-                'model': self.model,
-                'prompt': prompt,
-                'system': self.instructions,
-                'stream': self.stream,
-                'options': options if options else None,
-                'keep_alive': self.keep_alive
-            }
-            
-            # Only include think parameter if explicitly set
-            if think_param is not None:
-                gen_params['think'] = think_param
+            gen_params = self._build_generate_params(prompt)
+            cache_key = self._cache_key(gen_params)
+            response = self._cache_get(cache_key)
             
-            response = self.client.generate(**gen_params)
+            if response is None:
+                def fetch():
+                    self.stats_tracker.increment(StatType.REQUESTS_MADE, 1, agent_id=self.name)
+                    response = self._request(lambda client: client.generate(**gen_params))
+                    self._record_usage(response)
+                    self._cache_set(cache_key, response)
+                    return response
+
+                response = self._coalesced(cache_key, fetch)
             response_time = time.time() - start_time
             self.stats_tracker.increment(StatType.RESPONSE_TIME, response_time, agent_id=self.name)
-            if hasattr(response, 'prompt_eval_count') and response.prompt_eval_count:
-                self.token_usage.add_usage(prompt_tokens=response.prompt_eval_count)
-                self.stats_tracker.increment(StatType.TOKENS_INPUT, response.prompt_eval_count, agent_id=self.name)
-            if hasattr(response, 'eval_count') and response.eval_count:
-                self.token_usage.add_usage(completion_tokens=response.eval_count)
-                self.stats_tracker.increment(StatType.TOKENS_OUTPUT, response.eval_count, agent_id=self.name)
             result = {
                 "content": response.response,
                 "raw_response": response
@@ -693,35 +1107,119 @@ class Agent:
         """
         with self.tracer.span("agent.agenerate", agent_id=self.name,
                              data={"prompt_length": len(prompt)}) as span:
-            think_param = self._get_think_param()
-            options = self._get_options()
-            
-            # Build generate parameters
-            gen_params = {
-                'model': self.model,
-                'prompt': prompt,
-                'system': self.instructions,
-                'stream': self.stream,
-                'options': options if options else None,
-                'keep_alive': self.keep_alive
-            }
-            
-            # Only include think parameter if explicitly set
-            if think_param is not None:
-                gen_params['think'] = think_param
+            gen_params = self._build_generate_params(prompt)
+            cache_key = self._cache_key(gen_params)
+            response = await self._acache_get(cache_key)
             
-            response = await self.async_client.generate(**gen_params)
+            if response is None:
+                async def fetch():
+                    response = await self._arequest(lambda client: client.generate(**gen_params))
+                    await self._acache_set(cache_key, response)
+                    return response
+
+                response = await self._acoalesced(cache_key, fetch)
             result = {
                 "content": response.response,
                 "raw_response": response
             }
             return result
 
+    def _chat_many_params(self, conversation: Union[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Chat parameters answering one independent conversation of chat_many"""
+        messages = ConversationLog()
+        if self.instructions:
+            messages.add("system", self.instructions)
+        if isinstance(conversation, str):
+            messages.add("user", conversation)
+        else:
+            messages.extend(conversation)
+        template = self._get_request_template()
+        chat_params = {
+            'model': self.model,
+            'messages': messages,
+            'stream': False,
+            'options': template['options'],
+            'keep_alive': self._keep_alive()
+        }
+        if template['think'] is not None:
+            chat_params['think'] = template['think']
+        return chat_params
+
+    async def _achat_item(self, conversation: Union[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        response = await self._arequest_chat(self._chat_many_params(conversation))
+        return {
+            "content": response.message.content,
+            "raw_response": response
+        }
+
+    def agenerate_as_completed(self, prompts: Iterable[str], concurrency: int = 8) -> AsyncIterator[BatchResult]:
+        """
+        Generate a response for each prompt with at most ``concurrency`` requests
+        in flight, yielding a BatchResult per prompt as it completes
+        """
+        return bounded_as_completed(prompts, self.agenerate, concurrency)
+
+    def achat_as_completed(self, conversations: Iterable[Union[str, List[Dict[str, Any]]]],
+                           concurrency: int = 8) -> AsyncIterator[BatchResult]:
+        """
+        Answer independent conversations (a user message or a list of messages)
+        with at most ``concurrency`` requests in flight, yielding a BatchResult
+        per conversation as it completes.
+
+        Each conversation gets the agent's instructions and one request; the
+        agent's own history is not used or changed, and tools are not offered.
+        """
+        return bounded_as_completed(conversations, self._achat_item, concurrency)
+
+    async def agenerate_many(self, prompts: Iterable[str], concurrency: int = 8) -> List[BatchResult]:
+        """Generate a response for each prompt with bounded concurrency; results are in input order"""
+        return await bounded_gather(prompts, self.agenerate, concurrency)
+
+    async def achat_many(self, conversations: Iterable[Union[str, List[Dict[str, Any]]]],
+                         concurrency: int = 8) -> List[BatchResult]:
+        """Answer independent conversations with bounded concurrency; results are in input order"""
+        return await bounded_gather(conversations, self._achat_item, concurrency)
+
+    def generate_many(self, prompts: Iterable[str], concurrency: int = 8,
+                      as_completed: bool = False) -> Union[List[BatchResult], Iterator[BatchResult]]:
+        """
+        Generate a response for each prompt on the async client with at most
+        ``concurrency`` requests in flight.
+
+        Args:
+            prompts: Prompts to generate for (any iterable; consumed lazily)
+            concurrency: Maximum number of requests in flight
+            as_completed: Return an iterator yielding results as they complete
+
+        Returns:
+            BatchResults in input order (or in completion order with as_completed);
+            failed items carry their exception in ``error``
+        """
+        results = iterate_in_thread(lambda: self.agenerate_as_completed(prompts, concurrency))
+        if as_completed:
+            return results
+        return sorted(results, key=lambda outcome: outcome.index)
+
+    def chat_many(self, conversations: Iterable[Union[str, List[Dict[str, Any]]]], concurrency: int = 8,
+                  as_completed: bool = False) -> Union[List[BatchResult], Iterator[BatchResult]]:
+        """
+        Answer independent conversations on the async client with at most
+        ``concurrency`` requests in flight (see achat_as_completed).
+
+        Returns:
+            BatchResults in input order (or in completion order with as_completed);
+            failed items carry their exception in ``error``
+        """
+        results = iterate_in_thread(lambda: self.achat_as_completed(conversations, concurrency))
+        if as_completed:
+            return results
+        return sorted(results, key=lambda outcome: outcome.index)
+
     def reset_conversation(self):
         """Reset the conversation history"""
-        self.messages = []
+        self.messages.clear()
         if self.instructions:
-            self.messages.append({"role": "system", "content": self.instructions})
+            self.messages.add("system", self.instructions)
 
     # Memory-related methods
     def remember(self, key: str, value: Any, expires_in: Optional[int] = None, metadata: Optional[Dict[str, Any]] = None) -> bool:
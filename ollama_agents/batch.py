@@ -0,0 +1,136 @@
+"""
+Bounded-concurrency batch execution for Ollama Agents SDK
+Runs many independent requests through an agent with at most N in flight at once
+"""
+import asyncio
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one item of a batch"""
+    index: int  # Position of the item in the input
+    input: Any
+    result: Optional[Any] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def bounded_as_completed(
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int = 8
+) -> AsyncIterator[BatchResult]:
+    """
+    Run ``worker`` over ``items`` with at most ``concurrency`` calls in flight,
+    yielding results as they complete.
+
+    Items are pulled lazily by ``concurrency`` worker tasks, so a batch of any
+    size holds only ``concurrency`` pending calls. An exception from one item
+    is reported on its BatchResult and does not stop the batch.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    source = enumerate(items)
+    results: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def run():
+        for index, item in source:
+            try:
+                result = await worker(item)
+            except Exception as e:
+                await results.put(BatchResult(index, item, error=e))
+            else:
+                await results.put(BatchResult(index, item, result=result))
+        await results.put(done)
+
+    tasks = [asyncio.ensure_future(run()) for _ in range(concurrency)]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            outcome = await results.get()
+            if outcome is done:
+                remaining -= 1
+            else:
+                yield outcome
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def bounded_gather(
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int = 8
+) -> List[BatchResult]:
+    """Run ``worker`` over ``items`` with bounded concurrency, returning results in input order"""
+    outcomes = [outcome async for outcome in bounded_as_completed(items, worker, concurrency)]
+    outcomes.sort(key=lambda outcome: outcome.index)
+    return outcomes
+
+
+def iterate_in_thread(factory: Callable[[], AsyncIterator[Any]]) -> Iterator[Any]:
+    """
+    Drive an async iterator on a private event loop thread and yield its items.
+
+    Lets sync callers (including code already running inside an event loop)
+    consume async batches. Closing the returned iterator stops the batch.
+    """
+    items: queue.Queue = queue.Queue(maxsize=256)
+    done = object()
+    running = {}
+
+    async def pump():
+        running["loop"] = asyncio.get_running_loop()
+        running["task"] = asyncio.current_task()
+        iterator = factory()
+        try:
+            async for item in iterator:
+                items.put(item)
+        finally:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def run():
+        try:
+            asyncio.run(pump())
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            items.put(e)
+        finally:
+            items.put(done)
+
+    thread = threading.Thread(target=run, name="ollama-agents-batch", daemon=True)
+    thread.start()
+    finished = False
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                finished = True
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if not finished:
+            # Stopped early: cancel the batch and drain so the pump is never blocked
+            task = running.get("task")
+            if task is not None:
+                running["loop"].call_soon_threadsafe(task.cancel)
+            while thread.is_alive() or not items.empty():
+                try:
+                    if items.get(timeout=0.05) is done:
+                        break
+                except queue.Empty:
+                    pass
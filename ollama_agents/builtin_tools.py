@@ -94,13 +94,13 @@ def execute_command(command: str, timeout: int = 30) -> str:
         return f"Error executing command: {str(e)}"
 
 
-@tool("Get current time")
+@tool("Get current time", blocking=False)
 def get_current_time() -> str:
     """Get the current date and time"""
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-@tool("Get environment variable")
+@tool("Get environment variable", blocking=False)
 def get_env_var(var_name: str) -> str:
     """Get an environment variable value"""
     value = os.environ.get(var_name)
@@ -110,7 +110,7 @@ def get_env_var(var_name: str) -> str:
 
 
 # Data Tools
-@tool("Parse JSON")
+@tool("Parse JSON", blocking=False)
 def parse_json(json_str: str) -> str:
     """Parse a JSON string"""
     try:
@@ -120,7 +120,7 @@ def parse_json(json_str: str) -> str:
         return f"Error parsing JSON: {str(e)}"
 
 
-@tool("Format JSON")
+@tool("Format JSON", blocking=False)
 def format_json(data: Any) -> str:
     """Format data as JSON"""
     try:
@@ -129,7 +129,7 @@ def format_json(data: Any) -> str:
         return f"Error formatting JSON: {str(e)}"
 
 
-@tool("Calculate")
+@tool("Calculate", blocking=False)
 def calculate(expression: str) -> str:
     """Evaluate a mathematical expression (use with caution!)"""
     try:
@@ -144,27 +144,27 @@ def calculate(expression: str) -> str:
 
 
 # Text Tools
-@tool("Count words")
+@tool("Count words", blocking=False)
 def count_words(text: str) -> str:
     """Count words in text"""
     word_count = len(text.split())
     return f"Word count: {word_count}"
 
 
-@tool("Count characters")
+@tool("Count characters", blocking=False)
 def count_characters(text: str) -> str:
     """Count characters in text"""
     char_count = len(text)
     return f"Character count: {char_count}"
 
 
-@tool("Convert to uppercase")
+@tool("Convert to uppercase", blocking=False)
 def to_uppercase(text: str) -> str:
     """Convert text to uppercase"""
     return text.upper()
 
 
-@tool("Convert to lowercase")
+@tool("Convert to lowercase", blocking=False)
 def to_lowercase(text: str) -> str:
     """Convert text to lowercase"""
     return text.lower()
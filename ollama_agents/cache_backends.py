@@ -0,0 +1,276 @@
+"""
+Persistent and shared storage backends for the response caches.
+
+A backend sits behind the in-process cache as a second tier: entries written
+to it survive restarts (SQLite) or are shared between worker processes (Redis).
+Values are pickled, so only point a backend at storage you trust.
+"""
+from __future__ import annotations
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class CacheBackend(ABC):
+    """Abstract base class for cache storage backends"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Return (value, expires_at) for a live entry, or None"""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None):
+        """Store a value; expires_at is a Unix timestamp (None = no expiration)"""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Delete an entry, returning whether it existed"""
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """Delete all entries"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get backend statistics"""
+        return {"type": type(self).__name__, "size": len(self)}
+
+    def close(self):
+        """Release connections held by the backend"""
+        pass
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    On-disk cache in a SQLite database (WAL mode).
+
+    Several processes can open the same file; WAL lets readers run alongside a
+    writer. Entry count and total value size are kept in a meta row by triggers,
+    so bounds are checked in O(1); when a bound is exceeded, expired entries and
+    then the least recently used ones are deleted.
+    """
+
+    def __init__(self, db_path: str = "ollama_cache.db", max_entries: Optional[int] = 10000,
+                 max_bytes: Optional[int] = 256 * 1024 * 1024):
+        """
+        Initialize the SQLite backend
+
+        Args:
+            db_path: Database file (":memory:" for a private in-memory database)
+            max_entries: Maximum number of entries (None = unbounded)
+            max_bytes: Maximum total size of the pickled values (None = unbounded)
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._init_db()
+
+    def _init_db(self):
+        """Create the cache tables, size triggers and indexes"""
+        with self._lock:
+            conn = self._conn
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache(last_access);
+                CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache(expires_at);
+
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    entries INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO cache_meta (id, entries, bytes)
+                    SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM cache;
+
+                CREATE TRIGGER IF NOT EXISTS cache_after_insert AFTER INSERT ON cache BEGIN
+                    UPDATE cache_meta SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 0;
+                END;
+                CREATE TRIGGER IF NOT EXISTS cache_after_delete AFTER DELETE ON cache BEGIN
+                    UPDATE cache_meta SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 0;
+                END;
+                CREATE TRIGGER IF NOT EXISTS cache_after_update AFTER UPDATE OF size ON cache BEGIN
+                    UPDATE cache_meta SET bytes = bytes - OLD.size + NEW.size WHERE id = 0;
+                END;
+            ''')
+
+    def get(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Return (value, expires_at) and mark the entry as recently used"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                return None
+            self._conn.execute('UPDATE cache SET last_access = ? WHERE key = ?', (now, key))
+        return pickle.loads(value), expires_at
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None):
+        """Store a value and evict entries while a size bound is exceeded"""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('''
+                    INSERT INTO cache (key, value, size, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        value = excluded.value, size = excluded.size,
+                        expires_at = excluded.expires_at, last_access = excluded.last_access
+                ''', (key, data, len(data), expires_at, time.time()))
+                self._evict(conn)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _usage(conn: sqlite3.Connection) -> Tuple[int, int]:
+        return conn.execute('SELECT entries, bytes FROM cache_meta WHERE id = 0').fetchone()
+
+    def _over_limit(self, entries: int, total_bytes: int) -> bool:
+        return ((self.max_entries is not None and entries > self.max_entries) or
+                (self.max_bytes is not None and total_bytes > self.max_bytes))
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete expired, then least recently used entries until within bounds"""
+        if not self._over_limit(*self._usage(conn)):
+            return
+        conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        entries, total_bytes = self._usage(conn)
+        while entries and self._over_limit(entries, total_bytes):
+            excess = entries - self.max_entries if self.max_entries is not None else 0
+            conn.execute('''
+                DELETE FROM cache WHERE key IN (
+                    SELECT key FROM cache ORDER BY last_access LIMIT ?
+                )
+            ''', (max(excess, 1),))
+            entries, total_bytes = self._usage(conn)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache')
+
+    def cleanup_expired(self) -> int:
+        """Delete expired entries, returning how many were removed"""
+        with self._lock:
+            return self._conn.execute(
+                'DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+            ).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT entries FROM cache_meta WHERE id = 0').fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                'SELECT entries, bytes FROM cache_meta WHERE id = 0'
+            ).fetchone()
+        return {
+            "type": type(self).__name__,
+            "size": entries,
+            "bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "path": self.db_path
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache shared between worker processes through Redis.
+
+    Expiry uses Redis key expiration. Size bounds are left to the server: run it
+    with ``maxmemory`` and an eviction policy such as ``allkeys-lru``.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, prefix: str = "ollama:cache:",
+                 client: Optional[Any] = None):
+        """
+        Initialize the Redis backend
+
+        Args:
+            host, port, db, password: Redis connection settings
+            prefix: Key prefix, so several caches can share one database
+            client: An existing redis.Redis client (overrides the connection settings)
+        """
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise ImportError("redis package is required for RedisCacheBackend")
+            client = redis.Redis(host=host, port=port, db=db, password=password, decode_responses=False)
+        self.redis_client = client
+        self.prefix = prefix
+
+    def _get_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def get(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        data = self.redis_client.get(self._get_key(key))
+        if data is None:
+            return None
+        return pickle.loads(data)
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None):
+        data = pickle.dumps((value, expires_at), protocol=pickle.HIGHEST_PROTOCOL)
+        if expires_at is None:
+            self.redis_client.set(self._get_key(key), data)
+        else:
+            self.redis_client.set(self._get_key(key), data, pxat=int(expires_at * 1000))
+
+    def delete(self, key: str) -> bool:
+        return self.redis_client.delete(self._get_key(key)) > 0
+
+    def clear(self):
+        keys = list(self.redis_client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.redis_client.delete(*keys)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.redis_client.scan_iter(match=f"{self.prefix}*"))
+
+    def close(self):
+        self.redis_client.close()
@@ -2,13 +2,23 @@
 Caching functionality for Ollama Agents SDK
 Provides response caching to improve performance and reduce API calls
 """
+import asyncio
+import functools
 import hashlib
+import heapq
+import itertools
 import json
+import threading
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+from .cache_backends import CacheBackend
+from .conversation import MessageRecord, chain_messages
+
 
 class CacheStrategy(Enum):
     """Cache eviction strategies"""
@@ -39,16 +49,50 @@ class CacheEntry:
         self.last_access = time.time()
 
 
+def _json_default(value: Any) -> Any:
+    """JSON fallback for message records and pydantic models in requests"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    if hasattr(value, 'model_dump'):
+        return value.model_dump(exclude_none=True)
+    return str(value)
+
+
+def digest_request_value(value: Any) -> bytes:
+    """
+    Bytes identifying one request field. Conversations carry a chained hash
+    (ConversationLog.digest), so keying them costs O(1) instead of serializing
+    the whole history; lists of message records chain their per-message hashes.
+    """
+    if isinstance(value, bytes):
+        return value
+    digest = getattr(value, 'digest', None)
+    if isinstance(digest, bytes):
+        return digest
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], MessageRecord):
+        return chain_messages(value)
+    return json.dumps(value, sort_keys=True, default=_json_default).encode()
+
+
 class ResponseCache:
     """
     Cache for agent responses with configurable strategies
+
+    All operations are O(1) (TTL: O(log n)) and thread-safe:
+    - LRU keeps entries in recency order (OrderedDict)
+    - LFU keeps per-frequency buckets and the current minimum frequency
+    - TTL keeps a heap of expiry times and evicts the entry expiring first
+
+    With a backend, the in-process entries act as a first tier in front of it:
+    writes go to both, and misses are looked up in the backend and promoted.
     """
 
     def __init__(
         self,
         max_size: int = 1000,
         strategy: CacheStrategy = CacheStrategy.LRU,
-        default_ttl: Optional[float] = None
+        default_ttl: Optional[float] = None,
+        backend: Optional[CacheBackend] = None
     ):
         """
         Initialize response cache
@@ -57,13 +101,23 @@ class ResponseCache:
             max_size: Maximum number of entries in cache
             strategy: Cache eviction strategy
             default_ttl: Default time-to-live in seconds (None = no expiration)
+            backend: Persistent or shared storage, e.g. SQLiteCacheBackend
         """
         self.max_size = max_size
         self.strategy = strategy
         self.default_ttl = default_ttl
-        self.cache: Dict[str, CacheEntry] = {}
+        self.backend = backend
+        self.cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
         self.hits = 0
         self.misses = 0
+        self._lock = threading.RLock()
+        # LFU: access count -> keys with that count (oldest first)
+        self._frequencies: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_frequency = 0
+        # TTL: (expires_at, sequence, key); stale items are skipped lazily
+        self._expiry_heap: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._entry_sequence: Dict[str, int] = {}
 
     def _generate_key(
         self,
@@ -96,6 +150,126 @@ class ResponseCache:
         cache_str = json.dumps(cache_data, sort_keys=True)
         return hashlib.sha256(cache_str.encode()).hexdigest()
 
+    def request_key(self, model: str, **request: Any) -> str:
+        """
+        Generate a cache key from a full request
+        
+        Args:
+            model: Model name
+            **request: Request fields that affect the response, e.g. messages
+                (the complete history), prompt, system, options, tools, think
+            
+        Returns:
+            str: Cache key (SHA256 hash)
+        """
+        hasher = hashlib.sha256(model.encode())
+        for name in sorted(request):
+            value = request[name]
+            if value is None:
+                continue
+            hasher.update(b"\0" + name.encode() + b"\0")
+            hasher.update(digest_request_value(value))
+        return hasher.hexdigest()
+
+    def get_by_key(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value by key
+        
+        Returns:
+            Cached value or None if not found/expired
+        """
+        value = self._get_local(key)
+        return value if value is not None else self._load(key)
+
+    async def aget_by_key(self, key: str) -> Optional[Any]:
+        """Async variant of get_by_key: the in-process tier is read inline, the backend off the event loop"""
+        value = self._get_local(key)
+        if value is not None or self.backend is None:
+            return value if value is not None else self._load(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self._load, key)
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        """Look a key up in the in-process tier (a miss is not counted yet)"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                # Check expiration
+                if entry.is_expired():
+                    self._remove(key)
+                else:
+                    # Record access
+                    self._touch(key, entry)
+                    self.hits += 1
+                    return entry.value
+        return None
+
+    def _load(self, key: str) -> Optional[Any]:
+        """Look a key up in the backend, promoting a hit to the in-process tier"""
+        stored = self.backend.get(key) if self.backend is not None else None
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            value, expires_at = stored
+            ttl = expires_at - time.time() if expires_at is not None else None
+            self._store(key, value, ttl)
+            self.hits += 1
+            return value
+
+    def set_by_key(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Cache a value by key
+        
+        Args:
+            key: Cache key, e.g. from request_key()
+            value: Value to cache
+            ttl: Time-to-live in seconds (overrides default)
+        """
+        expires_at = self._set_local(key, value, ttl)
+        if self.backend is not None:
+            self.backend.set(key, value, expires_at)
+
+    async def aset_by_key(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Async variant of set_by_key: the backend write runs off the event loop"""
+        expires_at = self._set_local(key, value, ttl)
+        if self.backend is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self.backend.set, key, value, expires_at))
+
+    def _set_local(self, key: str, value: Any, ttl: Optional[float]) -> Optional[float]:
+        """Store a value in the in-process tier; returns its expiry time for the backend"""
+        if ttl is None:
+            ttl = self.default_ttl
+        with self._lock:
+            self._store(key, value, ttl)
+        return time.time() + ttl if ttl is not None else None
+
+    def _store(self, key: str, value: Any, ttl: Optional[float]):
+        """Add an entry to the in-process tier (lock held)"""
+        if key in self.cache:
+            self._remove(key)
+        # Evict if necessary
+        elif len(self.cache) >= self.max_size:
+            self._evict()
+        
+        entry = CacheEntry(
+            key=key,
+            value=value,
+            timestamp=time.time(),
+            ttl=ttl
+        )
+        entry.access()
+        
+        self.cache[key] = entry
+        if self.strategy == CacheStrategy.LFU:
+            self._frequencies.setdefault(1, OrderedDict())[key] = None
+            self._min_frequency = 1
+        elif self.strategy == CacheStrategy.TTL:
+            sequence = next(self._sequence)
+            self._entry_sequence[key] = sequence
+            expires_at = entry.timestamp + entry.ttl if entry.ttl is not None else float('inf')
+            heapq.heappush(self._expiry_heap, (expires_at, sequence, key))
+
     def get(
         self,
         message: str,
@@ -109,25 +283,7 @@ class ResponseCache:
         Returns:
             Cached response or None if not found/expired
         """
-        key = self._generate_key(message, model, options, tools)
-        
-        if key not in self.cache:
-            self.misses += 1
-            return None
-        
-        entry = self.cache[key]
-        
-        # Check expiration
-        if entry.is_expired():
-            del self.cache[key]
-            self.misses += 1
-            return None
-        
-        # Record access
-        entry.access()
-        self.hits += 1
-        
-        return entry.value
+        return self.get_by_key(self._generate_key(message, model, options, tools))
 
     def set(
         self,
@@ -149,21 +305,41 @@ class ResponseCache:
             tools: Tools list
             ttl: Time-to-live in seconds (overrides default)
         """
-        # Evict if necessary
-        if len(self.cache) >= self.max_size:
-            self._evict()
-        
-        key = self._generate_key(message, model, options, tools)
-        
-        entry = CacheEntry(
-            key=key,
-            value=response,
-            timestamp=time.time(),
-            ttl=ttl if ttl is not None else self.default_ttl
-        )
+        self.set_by_key(self._generate_key(message, model, options, tools), response, ttl)
+
+    def _touch(self, key: str, entry: CacheEntry):
+        """Record an access in the strategy's bookkeeping"""
         entry.access()
-        
-        self.cache[key] = entry
+        if self.strategy == CacheStrategy.LRU:
+            self.cache.move_to_end(key)
+        elif self.strategy == CacheStrategy.LFU:
+            frequency = entry.access_count - 1
+            bucket = self._frequencies[frequency]
+            del bucket[key]
+            if not bucket:
+                del self._frequencies[frequency]
+                if self._min_frequency == frequency:
+                    self._min_frequency = frequency + 1
+            self._frequencies.setdefault(frequency + 1, OrderedDict())[key] = None
+
+    def _remove(self, key: str):
+        """Remove an entry and its bookkeeping"""
+        entry = self.cache.pop(key)
+        if self.strategy == CacheStrategy.LFU:
+            bucket = self._frequencies[entry.access_count]
+            del bucket[key]
+            if not bucket:
+                del self._frequencies[entry.access_count]
+        elif self.strategy == CacheStrategy.TTL:
+            # The heap item goes stale and is skipped on pop
+            del self._entry_sequence[key]
+            if len(self._expiry_heap) > 2 * len(self.cache) + 64:
+                self._compact_heap()
+
+    def _compact_heap(self):
+        self._expiry_heap = [item for item in self._expiry_heap
+                             if self._entry_sequence.get(item[2]) == item[1]]
+        heapq.heapify(self._expiry_heap)
 
     def _evict(self):
         """Evict entries based on strategy"""
@@ -172,47 +348,54 @@ class ResponseCache:
         
         if self.strategy == CacheStrategy.LRU:
             # Remove least recently used
-            oldest_key = min(
-                self.cache.keys(),
-                key=lambda k: self.cache[k].last_access
-            )
-            del self.cache[oldest_key]
+            self.cache.popitem(last=False)
         
         elif self.strategy == CacheStrategy.LFU:
-            # Remove least frequently used
-            least_used_key = min(
-                self.cache.keys(),
-                key=lambda k: self.cache[k].access_count
-            )
-            del self.cache[least_used_key]
+            # Remove least frequently used (oldest among equals)
+            if self._min_frequency not in self._frequencies:
+                self._min_frequency = min(self._frequencies)
+            key = next(iter(self._frequencies[self._min_frequency]))
+            self._remove(key)
         
         elif self.strategy == CacheStrategy.TTL:
-            # Remove oldest entry
-            oldest_key = min(
-                self.cache.keys(),
-                key=lambda k: self.cache[k].timestamp
-            )
-            del self.cache[oldest_key]
+            # Remove the entry that expires first
+            while self._expiry_heap:
+                _, sequence, key = heapq.heappop(self._expiry_heap)
+                if self._entry_sequence.get(key) == sequence:
+                    self._remove(key)
+                    return
 
     def clear(self):
         """Clear all cache entries"""
-        self.cache.clear()
-        self.hits = 0
-        self.misses = 0
+        with self._lock:
+            self.cache.clear()
+            self._frequencies.clear()
+            self._min_frequency = 0
+            self._expiry_heap.clear()
+            self._entry_sequence.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.backend is not None:
+            self.backend.clear()
 
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        total = self.hits + self.misses
-        hit_rate = (self.hits / total * 100) if total > 0 else 0
+        with self._lock:
+            total = self.hits + self.misses
+            hit_rate = (self.hits / total * 100) if total > 0 else 0
+            size = len(self.cache)
         
-        return {
-            "size": len(self.cache),
+        stats = {
+            "size": size,
             "max_size": self.max_size,
             "hits": self.hits,
             "misses": self.misses,
             "hit_rate": round(hit_rate, 2),
             "strategy": self.strategy.value
         }
+        if self.backend is not None:
+            stats["backend"] = self.backend.get_stats()
+        return stats
 
     def invalidate(
         self,
@@ -223,8 +406,11 @@ class ResponseCache:
     ):
         """Invalidate a specific cache entry"""
         key = self._generate_key(message, model, options, tools)
-        if key in self.cache:
-            del self.cache[key]
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
+        if self.backend is not None:
+            self.backend.delete(key)
 
 
 # Global cache instance
@@ -239,7 +425,8 @@ def get_cache() -> Optional[ResponseCache]:
 def enable_caching(
     max_size: int = 1000,
     strategy: CacheStrategy = CacheStrategy.LRU,
-    default_ttl: Optional[float] = None
+    default_ttl: Optional[float] = None,
+    backend: Optional[CacheBackend] = None
 ) -> ResponseCache:
     """
     Enable global caching
@@ -248,12 +435,13 @@ def enable_caching(
         max_size: Maximum cache size
         strategy: Cache eviction strategy
         default_ttl: Default TTL in seconds
+        backend: Persistent or shared storage behind the in-process cache
         
     Returns:
         ResponseCache instance
     """
     global _global_cache
-    _global_cache = ResponseCache(max_size, strategy, default_ttl)
+    _global_cache = ResponseCache(max_size, strategy, default_ttl, backend)
     return _global_cache
 
 
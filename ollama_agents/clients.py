@@ -0,0 +1,193 @@
+"""
+Shared Ollama clients for Ollama Agents SDK
+Agents pointing at the same host reuse one lazily created client (and its
+httpx connection pool) instead of each building their own.
+"""
+import asyncio
+import threading
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+import ollama
+
+from .performance import ConnectionPool
+
+
+@dataclass
+class ClientSettings:
+    """Connection settings applied to every client created by the registry"""
+    max_connections: Optional[int] = 100
+    max_keepalive_connections: Optional[int] = 20
+    keepalive_expiry: Optional[float] = 5.0
+    pool_size: Optional[int] = None  # When set, sync requests check out dedicated clients from a ConnectionPool
+
+    def to_httpx_limits(self) -> httpx.Limits:
+        """Convert to httpx connection limits"""
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+
+ClientKey = Tuple[Optional[str], Optional[float]]
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of Ollama clients keyed by (host, timeout).
+
+    Sync clients are shared by all threads. Async clients are bound to the
+    event loop they were created on, so one is kept per (loop, host, timeout).
+    """
+
+    def __init__(self, settings: Optional[ClientSettings] = None):
+        self.settings = settings or ClientSettings()
+        self._clients: Dict[ClientKey, ollama.Client] = {}
+        self._async_clients: "weakref.WeakKeyDictionary[Any, Dict[ClientKey, ollama.AsyncClient]]" = \
+            weakref.WeakKeyDictionary()
+        self._loopless_async_clients: Dict[ClientKey, ollama.AsyncClient] = {}
+        self._pools: Dict[ClientKey, ConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, host: Optional[str] = None, timeout: Optional[float] = None) -> ollama.Client:
+        """Get the shared sync client for a host, creating it on first use"""
+        key = (host, timeout)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = ollama.Client(host=host, timeout=timeout,
+                                           limits=self.settings.to_httpx_limits())
+                    self._clients[key] = client
+        return client
+
+    def get_async_client(self, host: Optional[str] = None, timeout: Optional[float] = None) -> ollama.AsyncClient:
+        """Get the shared async client for a host on the running event loop, creating it on first use"""
+        key = (host, timeout)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        with self._lock:
+            if loop is None:
+                clients = self._loopless_async_clients
+            else:
+                clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = ollama.AsyncClient(host=host, timeout=timeout,
+                                            limits=self.settings.to_httpx_limits())
+                clients[key] = client
+        return client
+
+    def get_pool(self, host: Optional[str] = None, timeout: Optional[float] = None) -> Optional[ConnectionPool]:
+        """Get the client pool for a host, or None when pooling is disabled"""
+        if not self.settings.pool_size:
+            return None
+        key = (host, timeout)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = ConnectionPool(factory=self.client_factory(host, timeout),
+                                          max_connections=self.settings.pool_size)
+                    self._pools[key] = pool
+        return pool
+
+    @contextmanager
+    def checkout(self, host: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[ollama.Client]:
+        """
+        Borrow a sync client for one request. With pooling enabled the client comes
+        from the host's ConnectionPool (bounding concurrent requests); otherwise the
+        shared client is used.
+        """
+        pool = self.get_pool(host, timeout)
+        if pool is None:
+            yield self.get_client(host, timeout)
+            return
+        with pool.connection(timeout=timeout) as client:
+            yield client
+
+    def configure(self, max_connections: Optional[int] = None,
+                  max_keepalive_connections: Optional[int] = None,
+                  keepalive_expiry: Optional[float] = None,
+                  pool_size: Optional[int] = None):
+        """
+        Update connection settings. Only clients created afterwards are affected,
+        so call this before the first request (or after close()).
+        """
+        if pool_size is not None:
+            self.settings.pool_size = pool_size
+        if max_connections is not None:
+            self.settings.max_connections = max_connections
+        if max_keepalive_connections is not None:
+            self.settings.max_keepalive_connections = max_keepalive_connections
+        if keepalive_expiry is not None:
+            self.settings.keepalive_expiry = keepalive_expiry
+
+    def client_factory(self, host: Optional[str] = None, timeout: Optional[float] = None) -> Callable[[], ollama.Client]:
+        """Factory producing dedicated sync clients, e.g. for performance.ConnectionPool"""
+        def factory() -> ollama.Client:
+            return ollama.Client(host=host, timeout=timeout, limits=self.settings.to_httpx_limits())
+        return factory
+
+    def get_stats(self) -> Dict[str, int]:
+        """Number of live clients"""
+        with self._lock:
+            async_count = sum(len(clients) for clients in self._async_clients.values())
+            return {
+                "sync_clients": len(self._clients),
+                "async_clients": async_count + len(self._loopless_async_clients),
+                "pools": len(self._pools)
+            }
+
+    def close(self):
+        """Close all sync clients and forget all clients"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            for pool in self._pools.values():
+                pool.close_all()
+            self._pools.clear()
+            self._async_clients = weakref.WeakKeyDictionary()
+            self._loopless_async_clients.clear()
+
+
+# Global client registry
+_client_registry = ClientRegistry()
+
+
+def get_client_registry() -> ClientRegistry:
+    """Get the global client registry"""
+    return _client_registry
+
+
+def get_client(host: Optional[str] = None, timeout: Optional[float] = None) -> ollama.Client:
+    """Get the shared sync client for a host"""
+    return _client_registry.get_client(host, timeout)
+
+
+def get_async_client(host: Optional[str] = None, timeout: Optional[float] = None) -> ollama.AsyncClient:
+    """Get the shared async client for a host on the running event loop"""
+    return _client_registry.get_async_client(host, timeout)
+
+
+def configure_clients(max_connections: Optional[int] = None,
+                      max_keepalive_connections: Optional[int] = None,
+                      keepalive_expiry: Optional[float] = None,
+                      pool_size: Optional[int] = None):
+    """Set connection limits, keep-alive and client pooling for shared clients"""
+    _client_registry.configure(max_connections, max_keepalive_connections, keepalive_expiry, pool_size)
+
+
+def close_clients():
+    """Close all shared clients"""
+    _client_registry.close()
@@ -0,0 +1,140 @@
+"""
+Request coalescing ("single flight") for Ollama Agents SDK
+Concurrent identical requests share one call to the server instead of each making their own
+"""
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class _Call:
+    """An in-flight call that later callers can attach to"""
+    __slots__ = ("future", "loop", "waiters")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.future: Future = Future()
+        self.loop = loop  # Event loop of an async leader
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is in flight wait for it and receive the same result or
+    exception. Sync (thread) and async callers share calls. If the leader is
+    cancelled, waiting callers retry and one of them becomes the new leader.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0  # Calls served by another caller's request
+
+    def _join(self, key: str, loop: Optional[asyncio.AbstractEventLoop]) -> Tuple[_Call, bool]:
+        """Return (call, is_leader) for a key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call(loop)
+                return call, True
+            call.waiters += 1
+            self.coalesced += 1
+            return call, False
+
+    def _finish(self, key: str, call: _Call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` unless an identical call is in flight
+
+        Returns:
+            (result, shared) where shared is True if another caller's result was reused
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                blocked = call is not None and call.loop is not None and call.loop is _running_loop()
+            if blocked:
+                # Waiting would block the event loop the leader runs on
+                return fn(), False
+
+            call, leader = self._join(key, None)
+            if leader:
+                try:
+                    result = fn()
+                except Exception as e:
+                    call.future.set_exception(e)
+                    raise
+                except BaseException:
+                    call.future.cancel()
+                    raise
+                else:
+                    call.future.set_result(result)
+                    return result, False
+                finally:
+                    self._finish(key, call)
+
+            try:
+                return call.future.result(), True
+            except CancelledError:
+                if not call.future.cancelled():
+                    raise
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await ``fn()`` unless an identical call is in flight
+
+        Returns:
+            (result, shared) where shared is True if another caller's result was reused
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            call, leader = self._join(key, loop)
+            if leader:
+                try:
+                    result = await fn()
+                except Exception as e:
+                    call.future.set_exception(e)
+                    raise
+                except BaseException:
+                    call.future.cancel()
+                    raise
+                else:
+                    call.future.set_result(result)
+                    return result, False
+                finally:
+                    self._finish(key, call)
+
+            try:
+                # Shielded so a cancelled waiter does not cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(call.future)), True
+            except asyncio.CancelledError:
+                if not call.future.cancelled():
+                    raise
+
+    def in_flight(self) -> int:
+        """Number of calls currently in flight"""
+        with self._lock:
+            return len(self._calls)
+
+
+# Global single-flight group, shared by all agents
+_global_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get the global single-flight group"""
+    return _global_single_flight
@@ -1,10 +1,17 @@
 """
 Context management with truncation options for Ollama Agents SDK
 """
-from typing import List, Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Sequence, Tuple
 from enum import Enum
 import ollama
 
+from .conversation import ConversationLog, MessageRecord, EMPTY_CHAIN, chain_messages
+from .deadline import DeadlineExceeded
+
 
 class TruncationStrategy(Enum):
     """Different strategies for context truncation"""
@@ -14,19 +21,195 @@ class TruncationStrategy(Enum):
     CUSTOM = "custom"
 
 
+SUMMARY_OPTIONS = {"num_predict": 200, "temperature": 0.3}
+
+
+@dataclass
+class SummaryCheckpoint:
+    """A summary covering a contiguous run of messages"""
+    summary: str
+    covered: int      # Number of messages covered
+    first: Any        # First covered message record
+    last: Any         # Last covered message record
+    digest: bytes     # Chained hash of the covered messages
+
+
+class RollingSummary:
+    """
+    Incrementally maintained summary of a growing run of messages.
+
+    Each call only summarizes messages added since the last checkpoint, folding
+    them into the stored summary. Summaries are also cached by the hash of the
+    messages they cover, so a run that was summarized before costs no LLM call.
+    Safe to update from a background thread.
+    """
+
+    def __init__(self, max_cached: int = 128):
+        self.checkpoint: Optional[SummaryCheckpoint] = None
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def covers_prefix_of(self, messages: Sequence[Any], start: int = 0) -> bool:
+        """Whether the checkpoint covers the run of ``messages`` beginning at ``start``"""
+        checkpoint = self.checkpoint
+        return (checkpoint is not None and len(messages) - start >= checkpoint.covered
+                and messages[start] is checkpoint.first
+                and messages[start + checkpoint.covered - 1] is checkpoint.last)
+
+    def summarize(self, messages: Sequence[Any], generate: Callable[[str], str]) -> str:
+        """
+        Summarize ``messages``, calling ``generate(prompt)`` only for the part not
+        covered by the checkpoint. Raises whatever ``generate`` raises.
+        """
+        if not messages:
+            return ""
+
+        if self.covers_prefix_of(messages):
+            previous = self.checkpoint
+        else:
+            previous = None
+        covered = previous.covered if previous else 0
+        if covered == len(messages):
+            return previous.summary
+
+        new_messages = messages[covered:]
+        digest = chain_messages(new_messages, previous.digest if previous else EMPTY_CHAIN)
+        with self._lock:
+            summary = self._cache.get(digest)
+            if summary is not None:
+                self._cache.move_to_end(digest)
+        if summary is None:
+            text = " ".join(f"{msg['role']}: {msg['content']}" for msg in new_messages)
+            if previous:
+                prompt = (f"Here is a summary of the earlier conversation:\n\n{previous.summary}\n\n"
+                          f"Update it to also cover the following messages, keeping it concise:\n\n{text}\n\n"
+                          f"Updated summary:")
+            else:
+                prompt = f"Please provide a concise summary of the following conversation segment:\n\n{text}\n\nSummary:"
+            summary = generate(prompt)
+            with self._lock:
+                self._cache[digest] = summary
+                if len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            # Never replace a checkpoint that already covers more of the same run
+            if not (self.covers_prefix_of(messages) and self.checkpoint.covered > len(messages)):
+                self.checkpoint = SummaryCheckpoint(summary=summary, covered=len(messages),
+                                                    first=messages[0], last=messages[-1], digest=digest)
+        return summary
+
+    def cached(self, messages: Sequence[Any]) -> Tuple[Optional[str], int]:
+        """The checkpoint summary and how many leading ``messages`` it covers, if any"""
+        checkpoint = self.checkpoint
+        if checkpoint is not None and self.covers_prefix_of(messages):
+            return checkpoint.summary, checkpoint.covered
+        return None, 0
+
+    def reset(self):
+        """Drop the checkpoint (cached summaries are kept)"""
+        self.checkpoint = None
+
+
+# Shared worker pool for background summaries
+_summary_executor: Optional[ThreadPoolExecutor] = None
+_summary_executor_lock = threading.Lock()
+
+
+def _get_summary_executor() -> ThreadPoolExecutor:
+    global _summary_executor
+    if _summary_executor is None:
+        with _summary_executor_lock:
+            if _summary_executor is None:
+                _summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ollama-agents-summary")
+    return _summary_executor
+
+
+class BackgroundSummarizer:
+    """
+    Keeps a RollingSummary up to date off the request path.
+
+    At most one update per summarizer runs at a time; scheduling while one is in
+    flight is a no-op, the next schedule picks up whatever was added meanwhile.
+    """
+
+    def __init__(self, rolling_summary: Optional[RollingSummary] = None, executor: Optional[Executor] = None):
+        self.rolling_summary = rolling_summary or RollingSummary()
+        self.executor = executor
+        self.pending: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        """Whether an update is in flight"""
+        pending = self.pending
+        return pending is not None and not pending.done()
+
+    def schedule(self, messages: Sequence[Any], generate: Callable[[str], str]) -> bool:
+        """Start summarizing ``messages`` in the background. Returns False if already running or up to date."""
+        if not messages:
+            return False
+        _, covered = self.rolling_summary.cached(messages)
+        if covered == len(messages):
+            return False
+        with self._lock:
+            if self.busy:
+                return False
+            executor = self.executor or _get_summary_executor()
+            self.pending = executor.submit(self._run, list(messages), generate)
+        return True
+
+    def _run(self, messages: List[Any], generate: Callable[[str], str]):
+        try:
+            self.rolling_summary.summarize(messages, generate)
+        except Exception:
+            # A failed background summary just means the foreground path summarizes inline
+            pass
+
+    def cached(self, messages: Sequence[Any]) -> Tuple[Optional[str], int]:
+        """The precomputed summary and how many leading ``messages`` it covers"""
+        return self.rolling_summary.cached(messages)
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait for the in-flight update, if any"""
+        pending = self.pending
+        if pending is not None:
+            pending.result(timeout=timeout)
+
+
 class ContextManager:
-    """Manages conversation context with various truncation strategies"""
+    """
+    Manages conversation context with various truncation strategies.
+
+    Oldest-first and newest-first truncation are incremental: the manager
+    remembers how far it has read the log and where the kept window starts, so
+    each call only looks at messages appended since the previous one.
+    """
     
-    def __init__(self, max_context_length: int = 20000, strategy: TruncationStrategy = TruncationStrategy.OLDEST_FIRST):
+    def __init__(self, max_context_length: int = 20000, strategy: TruncationStrategy = TruncationStrategy.OLDEST_FIRST,
+                 messages: Optional[ConversationLog] = None, background_summary_ratio: Optional[float] = None,
+                 summarizer: Optional[Callable[[str], str]] = None):
         self.max_context_length = max_context_length
         self.strategy = strategy
-        self.messages: List[Dict[str, Any]] = []
+        self.messages = messages if messages is not None else ConversationLog()
         self.original_system_prompt: Optional[str] = None
+        self.rolling_summary = RollingSummary()
+        self._summary_start = 0  # Index in the non-system messages where the summarized run begins
+        # When set, summaries are precomputed in the background once the context
+        # passes this fraction of max_context_length
+        self.background_summary_ratio = background_summary_ratio
+        # Runs summarization prompts; an agent passes its own so they go through its
+        # request path (host pool, admission, breakers, deadline). Without one the
+        # client passed to truncate_context is called directly.
+        self.summarizer = summarizer
+        self.background_summarizer = BackgroundSummarizer(self.rolling_summary) \
+            if background_summary_ratio is not None else None
+        self._reset_window()
     
     def add_message(self, role: str, content: str):
         """Add a message to the context"""
-        message = {"role": role, "content": content}
-        self.messages.append(message)
+        self.messages.add(role, content)
         
         # Store the original system prompt separately to preserve it
         if role == "system" and len(self.messages) == 1:
@@ -34,7 +217,7 @@ class ContextManager:
     
     def get_context_length(self) -> int:
         """Get the current context length in characters"""
-        return sum(len(msg.get("content", "")) for msg in self.messages)
+        return self.messages.total_chars
     
     def needs_truncation(self) -> bool:
         """Check if the context needs to be truncated"""
@@ -54,32 +237,56 @@ class ContextManager:
         else:  # CUSTOM or fallback
             return self._truncate_oldest_first()  # Default to oldest first
     
+    def _reset_window(self):
+        """Forget the incremental truncation state"""
+        self._window_key = None
+        self._window_log: Optional[ConversationLog] = None
+        self._read_count = 0
+        self._system: List[MessageRecord] = []
+        self._others: List[MessageRecord] = []
+        self._system_chars = 0
+        self._window_start = 0   # Oldest-first: first kept non-system message
+        self._window_chars = 0   # Oldest-first: chars of others[_window_start:]
+        self._prefix_end = 0     # Newest-first: one past the last kept non-system message
+        self._prefix_chars = 0   # Newest-first: chars of others[:_prefix_end]
+    
+    def _sync_window(self):
+        """Read messages appended since the last call into the incremental state"""
+        log = self.messages
+        key = (log.generation, self.max_context_length)
+        if key != self._window_key or self._window_log is not log:
+            self._reset_window()
+            self._window_key = key
+            self._window_log = log
+        
+        for index in range(self._read_count, len(log)):
+            record = log[index]
+            if record.role == "system":
+                self._system.append(record)
+                self._system_chars += record.chars
+            else:
+                self._others.append(record)
+                self._window_chars += record.chars
+        self._read_count = len(log)
+    
     def _truncate_oldest_first(self) -> List[Dict[str, Any]]:
         """Remove oldest messages first until context is within limits"""
         if not self.needs_truncation():
             return self.messages[:]
         
-        # Keep the system prompt if it exists
-        system_messages = [msg for msg in self.messages if msg["role"] == "system"]
-        non_system_messages = [msg for msg in self.messages if msg["role"] != "system"]
+        self._sync_window()
         
-        # Start with system messages
-        truncated_messages = system_messages[:]
-        
-        # Add messages from the end (newest) until we reach the limit
-        current_length = sum(len(msg.get("content", "")) for msg in truncated_messages)
-        
-        for msg in reversed(non_system_messages):
-            msg_length = len(msg.get("content", ""))
-            if current_length + msg_length <= self.max_context_length:
-                truncated_messages.insert(len(system_messages), msg)
-                current_length += msg_length
-            else:
-                break
+        # The kept window is the longest suffix that fits next to the system
+        # messages; appends only ever move its start forward.
+        others = self._others
+        while self._window_start < len(others) and \
+                self._system_chars + self._window_chars > self.max_context_length:
+            self._window_chars -= others[self._window_start].chars
+            self._window_start += 1
         
-        # Reverse the order to maintain chronological sequence
-        result = truncated_messages[:len(system_messages)]  # System messages first
-        result.extend(reversed(truncated_messages[len(system_messages):]))
+        # System messages first, then the kept messages in chronological order
+        result = list(self._system)
+        result.extend(others[self._window_start:])
         
         return result
     
@@ -88,24 +295,22 @@ class ContextManager:
         if not self.needs_truncation():
             return self.messages[:]
         
-        # Keep the system prompt if it exists
-        system_messages = [msg for msg in self.messages if msg["role"] == "system"]
-        non_system_messages = [msg for msg in self.messages if msg["role"] != "system"]
+        self._sync_window()
         
-        # Start with system messages
-        truncated_messages = system_messages[:]
-        current_length = sum(len(msg.get("content", "")) for msg in system_messages)
+        # Keep the longest prefix that fits next to the system messages
+        others = self._others
+        while self._prefix_end > 0 and self._system_chars + self._prefix_chars > self.max_context_length:
+            self._prefix_end -= 1
+            self._prefix_chars -= others[self._prefix_end].chars
+        while self._prefix_end < len(others) and \
+                self._system_chars + self._prefix_chars + others[self._prefix_end].chars <= self.max_context_length:
+            self._prefix_chars += others[self._prefix_end].chars
+            self._prefix_end += 1
         
-        # Add messages from the beginning (oldest) until we reach the limit
-        for msg in non_system_messages:
-            msg_length = len(msg.get("content", ""))
-            if current_length + msg_length <= self.max_context_length:
-                truncated_messages.append(msg)
-                current_length += msg_length
-            else:
-                break
+        result = list(self._system)
+        result.extend(others[:self._prefix_end])
         
-        return truncated_messages
+        return result
     
     def _truncate_with_summarization(self, client: ollama.Client, model: str) -> List[Dict[str, Any]]:
         """Summarize the middle portion of the conversation to reduce context"""
@@ -113,38 +318,40 @@ class ContextManager:
             return self.messages[:]
         
         # Keep system messages and the most recent messages
-        system_messages = [msg for msg in self.messages if msg["role"] == "system"]
-        non_system_messages = [msg for msg in self.messages if msg["role"] != "system"]
+        self._sync_window()
+        system_messages, non_system_messages = self._system, self._others
         
         if len(non_system_messages) <= 2:  # Not enough messages to summarize
             return self.messages[:self.max_context_length//100]  # Just truncate to first few messages
         
-        # Keep first and last few messages, summarize the middle
-        keep_from_start = max(1, len(non_system_messages) // 4)  # Keep 25% from start
-        keep_from_end = max(1, len(non_system_messages) // 4)    # Keep 25% from end
+        start_messages, middle_messages, end_messages = self._summary_split()
         
-        start_messages = non_system_messages[:keep_from_start]
-        middle_messages = non_system_messages[keep_from_start:-keep_from_end if keep_from_end > 0 else len(non_system_messages)]
-        end_messages = non_system_messages[-keep_from_end:]
+        # A precomputed summary is swapped in as is; messages it does not cover
+        # yet stay verbatim and the background worker catches up.
+        summary, covered = (None, 0)
+        if self.background_summarizer is not None and middle_messages:
+            summary, covered = self.background_summarizer.cached(middle_messages)
+            self.background_summarizer.schedule(middle_messages, self._summary_generator(client, model))
         
         # Summarize the middle portion
-        if middle_messages:
-            middle_text = " ".join([f"{msg['role']}: {msg['content']}" for msg in middle_messages])
-            
+        if summary is not None:
+            summary_msg = {
+                "role": "system",
+                "content": f"Summary of previous conversation: {summary}"
+            }
+            end_messages = middle_messages[covered:] + end_messages
+        elif middle_messages:
             try:
-                # Use the model to generate a summary of the middle portion
-                summary_prompt = f"Please provide a concise summary of the following conversation segment:\n\n{middle_text}\n\nSummary:"
-                summary_response = client.generate(
-                    model=model,
-                    prompt=summary_prompt,
-                    options={"num_predict": 200, "temperature": 0.3}
-                )
+                # Use the model to summarize the messages added since the last checkpoint
+                summary = self.rolling_summary.summarize(middle_messages, self._summary_generator(client, model))
                 
                 # Create a summary message
                 summary_msg = {
                     "role": "system",
-                    "content": f"Summary of previous conversation: {summary_response.response}"
+                    "content": f"Summary of previous conversation: {summary}"
                 }
+            except DeadlineExceeded:
+                raise
             except Exception:
                 # If summarization fails, just truncate the middle
                 summary_msg = {
@@ -155,7 +362,7 @@ class ContextManager:
             summary_msg = None
         
         # Combine all parts
-        result = system_messages[:]
+        result = list(system_messages)
         result.extend(start_messages)
         
         if summary_msg:
@@ -164,15 +371,56 @@ class ContextManager:
         result.extend(end_messages)
         
         # If still too long, apply simple truncation
-        if sum(len(msg.get("content", "")) for msg in result) > self.max_context_length:
+        if sum(len(msg["content"]) for msg in result) > self.max_context_length:
             # Fall back to oldest-first truncation
             temp_manager = ContextManager(self.max_context_length, TruncationStrategy.OLDEST_FIRST)
-            for msg in result:
-                temp_manager.add_message(msg["role"], msg["content"])
+            temp_manager.messages.extend(result)
             return temp_manager.truncate_context(client, model)
         
         return result
     
+    def _summary_split(self) -> Tuple[List[MessageRecord], List[MessageRecord], List[MessageRecord]]:
+        """
+        Split the non-system messages into (start, middle, end) for summarization.
+        Keeps the first and last quarter; once a summary exists its start stays
+        put, so the middle only grows at its end and each update summarizes just
+        the newly added messages.
+        """
+        non_system_messages = self._others
+        keep_from_end = max(1, len(non_system_messages) // 4)    # Keep 25% from end
+        keep_from_start = max(1, len(non_system_messages) // 4)  # Keep 25% from start
+        if self.rolling_summary.covers_prefix_of(non_system_messages, self._summary_start):
+            keep_from_start = self._summary_start
+        middle_end = max(keep_from_start, len(non_system_messages) - keep_from_end)
+        self._summary_start = keep_from_start
+        
+        return (non_system_messages[:keep_from_start],
+                non_system_messages[keep_from_start:middle_end],
+                non_system_messages[middle_end:])
+    
+    def _summary_generator(self, client: ollama.Client, model: str) -> Callable[[str], str]:
+        if self.summarizer is not None:
+            return self.summarizer
+        return lambda prompt: client.generate(model=model, prompt=prompt, options=SUMMARY_OPTIONS).response
+    
+    def maybe_precompute_summary(self, client: ollama.Client, model: str) -> bool:
+        """
+        Start a background summary of the middle once the context passes
+        background_summary_ratio of max_context_length. Returns True if started.
+        """
+        if self.background_summarizer is None or self.strategy != TruncationStrategy.SUMMARIZE_MIDDLE:
+            return False
+        if self.background_summarizer.busy:
+            return False
+        if self.get_context_length() < self.max_context_length * self.background_summary_ratio:
+            return False
+        
+        self._sync_window()
+        if len(self._others) <= 2:
+            return False
+        _, middle_messages, _ = self._summary_split()
+        return self.background_summarizer.schedule(middle_messages, self._summary_generator(client, model))
+    
     def get_truncated_messages(self, client: ollama.Client, model: str) -> List[Dict[str, Any]]:
         """Get messages with truncation applied if needed"""
         if self.needs_truncation():
@@ -180,17 +428,17 @@ class ContextManager:
         return self.messages[:]
 
 
-# Update the Agent class to use the ContextManager
 def apply_context_management(agent, messages: List[Dict[str, Any]], client: ollama.Client, model: str) -> List[Dict[str, Any]]:
     """
-    Apply context management to a list of messages
+    Apply the agent's context management to a list of messages.
+    The agent's own history goes through its persistent ContextManager.
     """
+    if messages is agent.messages:
+        return agent.context_manager.get_truncated_messages(client, model)
+    
     context_manager = ContextManager(
         max_context_length=agent.max_context_length,
-        strategy=TruncationStrategy.SUMMARIZE_MIDDLE  # Default strategy
+        strategy=agent.context_truncation_strategy,
+        messages=ConversationLog(messages)
     )
-    
-    for msg in messages:
-        context_manager.add_message(msg["role"], msg["content"])
-    
     return context_manager.get_truncated_messages(client, model)
\ No newline at end of file
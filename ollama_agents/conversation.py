@@ -0,0 +1,300 @@
+"""
+Conversation history for Ollama Agents SDK
+A compact message log with running size totals, chained hashes and O(1) snapshots
+"""
+import hashlib
+import json
+import sys
+from collections.abc import Mapping, MutableSequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Rough characters-per-token ratio used for token estimates
+CHARS_PER_TOKEN = 4
+
+_CORE_KEYS = ("role", "content")
+
+# Chain value of an empty conversation
+EMPTY_CHAIN = hashlib.sha256(b"ollama-agents:conversation").digest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in ``text``"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def chain_link(previous: bytes, message_digest: bytes) -> bytes:
+    """Extend a message chain by one message: H(previous || H(message))"""
+    return hashlib.sha256(previous + message_digest).digest()
+
+
+def chain_messages(messages: Iterable[Union["MessageRecord", Mapping]], previous: bytes = EMPTY_CHAIN) -> bytes:
+    """Chained hash over ``messages``, continuing from ``previous``"""
+    for message in messages:
+        previous = chain_link(previous, MessageRecord.from_message(message).digest)
+    return previous
+
+
+class MessageRecord(Mapping):
+    """
+    An immutable conversation message.
+
+    Behaves like the ``{"role": ..., "content": ...}`` dicts used throughout the
+    SDK (and accepted by the Ollama client) while storing its size once.
+    Extra keys such as ``tool_name`` are kept in ``extra``. ``digest`` is a
+    SHA-256 of the message itself, computed once.
+    """
+    __slots__ = ("role", "content", "chars", "tokens", "extra", "digest")
+
+    def __init__(self, role: str, content: Optional[str], extra: Optional[Dict[str, Any]] = None):
+        content = content or ""
+        object.__setattr__(self, "role", sys.intern(role))
+        object.__setattr__(self, "content", content)
+        object.__setattr__(self, "chars", len(content))
+        object.__setattr__(self, "tokens", estimate_tokens(content))
+        object.__setattr__(self, "extra", extra or None)
+        hasher = hashlib.sha256(role.encode())
+        hasher.update(b"\0")
+        hasher.update(content.encode())
+        if extra:
+            hasher.update(b"\0")
+            hasher.update(json.dumps(extra, sort_keys=True, default=str).encode())
+        object.__setattr__(self, "digest", hasher.digest())
+
+    @classmethod
+    def from_message(cls, message: Union["MessageRecord", Mapping]) -> "MessageRecord":
+        """Convert a message mapping to a record (records are returned as is)"""
+        if isinstance(message, MessageRecord):
+            return message
+        extra = {key: value for key, value in message.items() if key not in _CORE_KEYS}
+        return cls(message["role"], message.get("content"), extra)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("MessageRecord is immutable")
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from _CORE_KEYS
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return len(_CORE_KEYS) + (len(self.extra) if self.extra is not None else 0)
+
+    def __repr__(self) -> str:
+        return f"MessageRecord({dict(self)!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict copy of the message"""
+        return dict(self)
+
+
+class ConversationSnapshot:
+    """
+    Read-only view of a ConversationLog at a point in time.
+
+    Taking a snapshot is O(1): it shares the log's storage and only records the
+    length. The log copies its storage before any change other than an append.
+    """
+    __slots__ = ("_records", "_length", "total_chars", "total_tokens", "digest")
+
+    def __init__(self, records: List[MessageRecord], length: int, total_chars: int, total_tokens: int,
+                 digest: bytes = EMPTY_CHAIN):
+        self._records = records
+        self._length = length
+        self.total_chars = total_chars
+        self.total_tokens = total_tokens
+        self.digest = digest  # Chained hash of the messages in the snapshot
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._records[:self._length][index]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("snapshot index out of range")
+        return self._records[index]
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        records = self._records
+        for i in range(self._length):
+            yield records[i]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Plain dict copies of the messages"""
+        return [record.to_dict() for record in self]
+
+
+class ConversationLog(MutableSequence):
+    """
+    Conversation history with running character/token totals.
+
+    Drop-in replacement for a list of message dicts: messages can be appended as
+    dicts and are stored as MessageRecord, so size checks are O(1) instead of a
+    sum over the whole history.
+
+    The log also keeps a Merkle-style chain: entry i is H(entry i-1 || H(message i)),
+    so ``digest`` identifies the whole history and is updated with one small
+    hash per appended message.
+    """
+
+    def __init__(self, messages: Optional[Iterable[Union[MessageRecord, Mapping]]] = None):
+        self._records: List[MessageRecord] = []
+        self._chain: List[bytes] = []
+        self._shared = False
+        self.total_chars = 0
+        self.total_tokens = 0
+        self.generation = 0  # Bumped on every change other than an append
+        if messages is not None:
+            self.extend(messages)
+
+    # Size bookkeeping
+
+    def _account(self, record: MessageRecord, sign: int = 1):
+        self.total_chars += sign * record.chars
+        self.total_tokens += sign * record.tokens
+
+    def _before_rewrite(self):
+        """Copy storage still referenced by snapshots before a non-append change"""
+        self.generation += 1
+        if self._shared:
+            self._records = list(self._records)
+            self._shared = False
+
+    def _rechain(self, start: int = 0):
+        """Recompute the hash chain from ``start`` after a non-append change"""
+        start = max(0, min(start, len(self._chain), len(self._records)))
+        del self._chain[start:]
+        previous = self._chain[-1] if self._chain else EMPTY_CHAIN
+        for record in self._records[start:]:
+            previous = chain_link(previous, record.digest)
+            self._chain.append(previous)
+
+    @staticmethod
+    def _start_of(index, length: int) -> int:
+        if isinstance(index, slice):
+            return index.indices(length)[0]
+        return index + length if index < 0 else index
+
+    # Sequence protocol
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        return iter(self._records)
+
+    def __setitem__(self, index, value):
+        self._before_rewrite()
+        start = self._start_of(index, len(self._records))
+        if isinstance(index, slice):
+            new_records = [MessageRecord.from_message(message) for message in value]
+            for record in self._records[index]:
+                self._account(record, -1)
+            self._records[index] = new_records
+            for record in new_records:
+                self._account(record)
+        else:
+            record = MessageRecord.from_message(value)
+            self._account(self._records[index], -1)
+            self._records[index] = record
+            self._account(record)
+        self._rechain(start)
+
+    def __delitem__(self, index):
+        self._before_rewrite()
+        start = self._start_of(index, len(self._records))
+        removed = self._records[index] if isinstance(index, slice) else [self._records[index]]
+        for record in removed:
+            self._account(record, -1)
+        del self._records[index]
+        self._rechain(start)
+
+    def insert(self, index: int, value: Union[MessageRecord, Mapping]):
+        self._before_rewrite()
+        record = MessageRecord.from_message(value)
+        self._records.insert(index, record)
+        self._account(record)
+        self._rechain(self._start_of(index, len(self._records)))
+
+    def _push(self, record: MessageRecord):
+        self._records.append(record)
+        self._account(record)
+        self._chain.append(chain_link(self._chain[-1] if self._chain else EMPTY_CHAIN, record.digest))
+
+    def append(self, value: Union[MessageRecord, Mapping]):
+        """Append a message (appends never disturb existing snapshots)"""
+        self._push(MessageRecord.from_message(value))
+
+    def extend(self, values: Iterable[Union[MessageRecord, Mapping]]):
+        for value in values:
+            self.append(value)
+
+    def clear(self):
+        self.generation += 1
+        if self._shared:
+            self._records = []
+            self._shared = False
+        else:
+            self._records.clear()
+        self._chain.clear()
+        self.total_chars = 0
+        self.total_tokens = 0
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (ConversationLog, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ConversationLog({len(self)} messages, {self.total_chars} chars)"
+
+    # Conversation helpers
+
+    def add(self, role: str, content: str, **extra: Any) -> MessageRecord:
+        """Append a message and return its record"""
+        record = MessageRecord(role, content, extra)
+        self._push(record)
+        return record
+
+    @property
+    def digest(self) -> bytes:
+        """Chained hash identifying the whole history"""
+        return self._chain[-1] if self._chain else EMPTY_CHAIN
+
+    def digest_at(self, length: int) -> bytes:
+        """Chained hash of the first ``length`` messages"""
+        return self._chain[length - 1] if length > 0 else EMPTY_CHAIN
+
+    def hexdigest(self) -> str:
+        return self.digest.hex()
+
+    def snapshot(self) -> ConversationSnapshot:
+        """O(1) read-only view of the current history"""
+        self._shared = True
+        return ConversationSnapshot(self._records, len(self._records), self.total_chars, self.total_tokens,
+                                    self.digest)
+
+    def split_system(self) -> Tuple[List[MessageRecord], List[MessageRecord]]:
+        """Split the history into (system messages, other messages)"""
+        system_messages, other_messages = [], []
+        for record in self._records:
+            (system_messages if record.role == "system" else other_messages).append(record)
+        return system_messages, other_messages
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Plain dict copies of the messages"""
+        return [record.to_dict() for record in self._records]
@@ -0,0 +1,240 @@
+"""
+End-to-end deadlines and cancellation for Ollama Agents SDK
+A Deadline bounds a whole operation (tool loop, handoff, orchestration), not one HTTP call
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional, Union
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an operation runs out of time or is cancelled"""
+    pass
+
+
+class Deadline:
+    """
+    A time budget that can also be cancelled explicitly.
+
+    Deadlines nest: a child created with ``parent`` expires with its parent,
+    so an inner scope can only shorten the budget of the outer one.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["Deadline"] = None):
+        """
+        Args:
+            timeout: Seconds from now (None = no time limit, only cancellation)
+            parent: Enclosing deadline
+        """
+        self.expires_at = None if timeout is None else time.monotonic() + timeout
+        self.parent = parent
+        self._cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        if parent is not None:
+            parent.add_callback(self.cancel)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a time limit"""
+        if self.cancelled:
+            return 0.0
+        remaining = None if self.expires_at is None else max(0.0, self.expires_at - time.monotonic())
+        if self.parent is not None:
+            inherited = self.parent.remaining()
+            if inherited is not None and (remaining is None or inherited < remaining):
+                remaining = inherited
+        return remaining
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled or (self.parent is not None and self.parent.cancelled)
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def cancel(self):
+        """Cancel the operation: in-flight requests under this deadline are aborted"""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Call ``callback`` on cancellation (at once if already cancelled)"""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def detach(self):
+        """Stop following the parent's cancellation (when the child's scope ends)"""
+        if self.parent is not None:
+            self.parent.remove_callback(self.cancel)
+
+    def check(self):
+        """Raise DeadlineExceeded if the budget is spent or the deadline was cancelled"""
+        if self.cancelled:
+            raise DeadlineExceeded("Operation cancelled")
+        if self.expired:
+            raise DeadlineExceeded("Deadline exceeded")
+
+    def bound(self, timeout: Optional[float]) -> Optional[float]:
+        """The smaller of ``timeout`` and the remaining budget"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("ollama_agents_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the enclosing deadline_scope(), if any"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Union[float, Deadline, None] = None) -> Iterator[Optional[Deadline]]:
+    """
+    Run a block under a deadline. A number of seconds creates a Deadline
+    nested in the current one; None keeps the current deadline.
+    """
+    if deadline is None:
+        yield current_deadline()
+        return
+    created = not isinstance(deadline, Deadline)
+    if created:
+        deadline = Deadline(deadline, parent=current_deadline())
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+        if created:
+            deadline.detach()
+
+
+_deadline_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_deadline_executor_lock = threading.Lock()
+
+
+def _get_deadline_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _deadline_executor
+    with _deadline_executor_lock:
+        if _deadline_executor is None:
+            _deadline_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="ollama-agents-deadline")
+        return _deadline_executor
+
+
+def run_with_deadline(fn: Callable[[], Any], deadline: Optional[Deadline] = None) -> Any:
+    """
+    Call ``fn`` but give up when the deadline passes or is cancelled.
+
+    The call runs in a worker thread; a blocking HTTP request cannot be
+    interrupted, so on expiry it is abandoned and its result discarded. An
+    abandoned call keeps its admission and scheduler slots and its pooled
+    connection until the server answers; streamed calls read through
+    iter_with_deadline() instead stop, and free them, at the next chunk.
+    """
+    deadline = deadline if deadline is not None else current_deadline()
+    if deadline is None:
+        return fn()
+    deadline.check()
+    future = _get_deadline_executor().submit(contextvars.copy_context().run, fn)
+    cancelled: concurrent.futures.Future = concurrent.futures.Future()
+
+    def on_cancel():
+        if not cancelled.done():
+            cancelled.set_result(None)
+
+    deadline.add_callback(on_cancel)
+    try:
+        done, _ = concurrent.futures.wait([future, cancelled], timeout=deadline.remaining(),
+                                          return_when=concurrent.futures.FIRST_COMPLETED)
+    finally:
+        deadline.remove_callback(on_cancel)
+    if future in done:
+        return future.result()
+    future.cancel()
+    deadline.check()
+    raise DeadlineExceeded("Deadline exceeded")
+
+
+async def arun_with_deadline(fn: Callable[[], Awaitable[Any]], deadline: Optional[Deadline] = None) -> Any:
+    """Await ``fn()``, cancelling it (and so aborting its HTTP request) when the deadline passes"""
+    deadline = deadline if deadline is not None else current_deadline()
+    if deadline is None:
+        return await fn()
+    deadline.check()
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(fn())
+    cancelled = loop.create_future()
+
+    def on_cancel():
+        loop.call_soon_threadsafe(lambda: cancelled.done() or cancelled.set_result(None))
+
+    deadline.add_callback(on_cancel)
+    try:
+        done, _ = await asyncio.wait({task, cancelled}, timeout=deadline.remaining(),
+                                     return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        deadline.remove_callback(on_cancel)
+        cancelled.cancel()
+    if task in done:
+        return task.result()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    deadline.check()
+    raise DeadlineExceeded("Deadline exceeded")
+
+
+def iter_with_deadline(chunks: Iterable[Any], deadline: Optional[Deadline] = None) -> Iterator[Any]:
+    """
+    Yield the chunks of a streamed response, stopping at the first chunk after
+    the deadline passes or is cancelled. The stream is closed either way, so
+    its connection and request slots are released at once.
+    """
+    deadline = deadline if deadline is not None else current_deadline()
+    iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            if deadline is not None:
+                deadline.check()
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+async def aiter_with_deadline(chunks: AsyncIterator[Any], deadline: Optional[Deadline] = None) -> AsyncIterator[Any]:
+    """Async variant of iter_with_deadline"""
+    deadline = deadline if deadline is not None else current_deadline()
+    try:
+        async for chunk in chunks:
+            if deadline is not None:
+                deadline.check()
+            yield chunk
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -2,8 +2,9 @@
 Agent handoff functionality for transferring conversations between agents
 """
 import time
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Union
 from .agent import Agent
+from .deadline import Deadline, deadline_scope
 from .stats import get_stats_tracker, StatType, TokenUsage
 from .tracing import get_tracer, TraceLevel, PerformanceMetrics
 from .logger import get_logger
@@ -73,7 +74,8 @@ class AgentHandoff:
     def handoff_to(self, target_agent_id: str, context: Optional[Dict[str, Any]] = None,
                    transfer_history: bool = True,
                    use_context_summarization: bool = True,
-                   max_context_length: Optional[int] = None) -> Dict[str, Any]:
+                   max_context_length: Optional[int] = None,
+                   deadline: Union[float, Deadline, None] = None) -> Dict[str, Any]:
         """
         Handoff the conversation to another agent
 
@@ -83,6 +85,8 @@ class AgentHandoff:
             transfer_history: Whether to transfer conversation history to the target agent
             use_context_summarization: Whether to summarize context if it's too long
             max_context_length: Maximum context length before summarization is triggered
+            deadline: Seconds (or a Deadline) for the handoff; a summary that does not
+                finish in time falls back to a truncated transcript
 
         Returns:
             Response from the target agent
@@ -93,13 +97,14 @@ class AgentHandoff:
         token_usage = TokenUsage()
         performance = PerformanceMetrics()
 
-        with self.tracer.span("handoff.execute",
-                             data={"target_agent_id": target_agent_id,
-                                   "has_context": context is not None,
-                                   "transfer_history": transfer_history,
-                                   "use_context_summarization": use_context_summarization},
-                             token_usage=token_usage,
-                             performance=performance) as span:
+        with deadline_scope(deadline), self.tracer.span(
+                "handoff.execute",
+                data={"target_agent_id": target_agent_id,
+                      "has_context": context is not None,
+                      "transfer_history": transfer_history,
+                      "use_context_summarization": use_context_summarization},
+                token_usage=token_usage,
+                performance=performance) as span:
             if target_agent_id not in self.agents:
                 raise ValueError(f"Target agent '{target_agent_id}' not found in registry")
 
@@ -139,10 +144,13 @@ class AgentHandoff:
                         # Add context as a system message
                         target_agent.add_message("system", f"Context from previous agent: {context}")
 
-                    # Copy the conversation history (excluding system messages to avoid duplication)
-                    for message in current_agent.messages:
-                        if message["role"] != "system" or message.get("content") != current_agent.instructions:
-                            target_agent.messages.append(message)
+                    # Copy the conversation history (excluding system messages to avoid duplication).
+                    # Message records are immutable, so they are shared rather than copied.
+                    history = current_agent.messages.snapshot()
+                    target_agent.messages.extend(
+                        message for message in history
+                        if message["role"] != "system" or message["content"] != current_agent.instructions
+                    )
 
                     transfer_time = time.time() - transfer_start
 
@@ -151,7 +159,8 @@ class AgentHandoff:
                         "context.transfer",
                         data={
                             "transfer_time": transfer_time,
-                            "messages_transferred": len(current_agent.messages)
+                            "messages_transferred": len(history),
+                            "chars_transferred": history.total_chars
                         }
                     )
             elif context:
@@ -213,7 +222,7 @@ class AgentHandoff:
 
             return result
 
-    def chat_with_current(self, message: str) -> Dict[str, Any]:
+    def chat_with_current(self, message: str, deadline: Union[float, Deadline, None] = None) -> Dict[str, Any]:
         """Send a message to the current agent, checking for automatic handoffs"""
         start_time = time.time()
 
@@ -223,7 +232,7 @@ class AgentHandoff:
             # Check if any handoff rules apply to this message
             target_agent_id = self.check_handoff_rules(message)
             if target_agent_id:
-                result = self.handoff_to(target_agent_id, context={"trigger_message": message})
+                result = self.handoff_to(target_agent_id, context={"trigger_message": message}, deadline=deadline)
 
                 # Log the automatic handoff
                 if self.tracer.level in [TraceLevel.STANDARD, TraceLevel.VERBOSE]:
@@ -240,7 +249,7 @@ class AgentHandoff:
             if not current_agent:
                 raise ValueError("No current agent set. Use set_current_agent() first.")
 
-            response = current_agent.chat(message)
+            response = current_agent.chat(message, deadline=deadline)
 
             # Calculate response time
             response_time = time.time() - start_time
@@ -256,7 +265,8 @@ class AgentHandoff:
 
             return response
 
-    async def achat_with_current(self, message: str) -> Dict[str, Any]:
+    async def achat_with_current(self, message: str,
+                                 deadline: Union[float, Deadline, None] = None) -> Dict[str, Any]:
         """Asynchronously send a message to the current agent, checking for automatic handoffs"""
         start_time = time.time()
 
@@ -266,7 +276,7 @@ class AgentHandoff:
             # Check if any handoff rules apply to this message
             target_agent_id = self.check_handoff_rules(message)
             if target_agent_id:
-                result = self.handoff_to(target_agent_id, context={"trigger_message": message})
+                result = self.handoff_to(target_agent_id, context={"trigger_message": message}, deadline=deadline)
 
                 # Log the automatic handoff
                 if self.tracer.level in [TraceLevel.STANDARD, TraceLevel.VERBOSE]:
@@ -283,7 +293,7 @@ class AgentHandoff:
             if not current_agent:
                 raise ValueError("No current agent set. Use set_current_agent() first.")
 
-            response = await current_agent.achat(message)
+            response = await current_agent.achat(message, deadline=deadline)
 
             # Calculate response time
             response_time = time.time() - start_time
@@ -0,0 +1,254 @@
+"""
+Multi-host load balancing for Ollama Agents SDK
+Routes each request to one of several Ollama servers
+"""
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+
+import httpx
+import ollama
+
+from .logger import get_logger
+
+logger = get_logger()
+
+
+class RoutingStrategy(Enum):
+    """How a HostPool picks a host"""
+    LEAST_OUTSTANDING = "least_outstanding"  # Fewest requests in flight
+    LOWEST_LATENCY = "lowest_latency"        # Lowest recent latency (EWMA)
+
+
+@dataclass
+class HostState:
+    """Routing state of one Ollama host"""
+    url: str
+    in_flight: int = 0
+    latency: Optional[float] = None  # Exponentially weighted moving average, seconds
+    healthy: bool = True
+    consecutive_failures: int = 0
+    unhealthy_since: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    loaded_models: Set[str] = field(default_factory=set)  # From /api/ps
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "latency": self.latency,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "loaded_models": sorted(self.loaded_models)
+        }
+
+
+def is_host_failure(error: BaseException) -> bool:
+    """Whether an error means the host itself is unreachable or failing"""
+    if isinstance(error, (ConnectionError, httpx.TransportError, TimeoutError)):
+        return True
+    return isinstance(error, ollama.ResponseError) and error.status_code in (502, 503, 504)
+
+
+class HostPool:
+    """
+    A set of Ollama hosts shared by agents.
+
+    Each request goes to a healthy host chosen by the routing strategy. A host
+    that fails ``failure_threshold`` requests in a row leaves the rotation until
+    a health check (GET /api/ps) succeeds, or ``retry_after`` seconds pass and a
+    request is allowed through to probe it. Requests for a model prefer hosts
+    that already have it loaded (per /api/ps) or served it last, unless those
+    have ``max_sticky_imbalance`` more requests in flight than the least loaded
+    host.
+    """
+
+    def __init__(
+        self,
+        hosts: List[str],
+        strategy: RoutingStrategy = RoutingStrategy.LEAST_OUTSTANDING,
+        failure_threshold: int = 2,
+        retry_after: float = 30.0,
+        health_check_interval: Optional[float] = None,
+        health_check_timeout: float = 2.0,
+        max_sticky_imbalance: int = 4,
+        latency_alpha: float = 0.3
+    ):
+        """
+        Initialize the host pool
+
+        Args:
+            hosts: Ollama base URLs, e.g. ["http://gpu1:11434", "http://gpu2:11434"]
+            strategy: Routing strategy
+            failure_threshold: Consecutive failures that take a host out of rotation
+            retry_after: Seconds before an unhealthy host is probed by a real request
+            health_check_interval: Run health checks in a background thread at this
+                interval (None = only when check_health() is called)
+            health_check_timeout: Timeout of one health check request
+            max_sticky_imbalance: In-flight difference allowed before ignoring model stickiness
+            latency_alpha: Weight of the newest sample in the latency average
+        """
+        if not hosts:
+            raise ValueError("HostPool needs at least one host")
+        self.hosts: Dict[str, HostState] = {url: HostState(url) for url in hosts}
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.retry_after = retry_after
+        self.health_check_timeout = health_check_timeout
+        self.max_sticky_imbalance = max_sticky_imbalance
+        self.latency_alpha = latency_alpha
+        self._model_hosts: Dict[str, str] = {}  # Model -> host that served it last
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        if health_check_interval:
+            self.start_health_checks(health_check_interval)
+
+    # Routing
+
+    def _score(self, state: HostState) -> tuple:
+        if self.strategy == RoutingStrategy.LOWEST_LATENCY:
+            # Hosts without samples are tried first
+            return (state.latency if state.latency is not None else -1.0, state.in_flight)
+        return (state.in_flight, state.latency if state.latency is not None else 0.0)
+
+    def _available(self, exclude: Optional[str] = None) -> List[HostState]:
+        now = time.time()
+        hosts = [state for state in self.hosts.values() if state.url != exclude] or list(self.hosts.values())
+        available = [state for state in hosts
+                     if state.healthy or now - state.unhealthy_since >= self.retry_after]
+        # With every host down, keep trying all of them rather than failing outright
+        return available or hosts
+
+    def select(self, model: Optional[str] = None, exclude: Optional[str] = None) -> str:
+        """Choose a host for a request (without reserving it), avoiding ``exclude`` if possible"""
+        with self._lock:
+            return self._select(model, exclude).url
+
+    def _select(self, model: Optional[str], exclude: Optional[str] = None) -> HostState:
+        candidates = self._available(exclude)
+        best = min(candidates, key=self._score)
+        if model is None:
+            return best
+        sticky = [state for state in candidates
+                  if model in state.loaded_models or self._model_hosts.get(model) == state.url]
+        if sticky:
+            preferred = min(sticky, key=self._score)
+            if preferred.in_flight - best.in_flight <= self.max_sticky_imbalance:
+                return preferred
+        return best
+
+    def _begin(self, model: Optional[str], exclude: Optional[str] = None) -> HostState:
+        with self._lock:
+            state = self._select(model, exclude)
+            state.in_flight += 1
+            state.requests += 1
+            return state
+
+    def _end(self, state: HostState, model: Optional[str], started: float, error: Optional[BaseException]):
+        with self._lock:
+            state.in_flight -= 1
+            if error is not None:
+                # Other errors (model not found, bad request, a cancelled hedge) say
+                # nothing about the host's health or latency, nor that it has the model
+                if is_host_failure(error):
+                    state.failures += 1
+                    state.consecutive_failures += 1
+                    if state.consecutive_failures >= self.failure_threshold:
+                        if state.healthy:
+                            logger.warning(f"⚠️ Host {state.url} taken out of rotation: {error}")
+                        state.healthy = False
+                        state.unhealthy_since = time.time()
+                return
+            elapsed = time.time() - started
+            state.latency = elapsed if state.latency is None else \
+                self.latency_alpha * elapsed + (1 - self.latency_alpha) * state.latency
+            state.consecutive_failures = 0
+            if not state.healthy:
+                logger.info(f"✅ Host {state.url} back in rotation")
+            state.healthy = True
+            if model is not None:
+                self._model_hosts[model] = state.url
+                state.loaded_models.add(model)
+
+    @contextmanager
+    def acquire(self, model: Optional[str] = None, exclude: Optional[str] = None) -> Iterator[str]:
+        """Reserve a host for one request and record its outcome"""
+        state = self._begin(model, exclude)
+        started = time.time()
+        try:
+            yield state.url
+        except BaseException as e:
+            self._end(state, model, started, e)
+            raise
+        self._end(state, model, started, None)
+
+    @asynccontextmanager
+    async def aacquire(self, model: Optional[str] = None, exclude: Optional[str] = None) -> AsyncIterator[str]:
+        """Async variant of acquire"""
+        state = self._begin(model, exclude)
+        started = time.time()
+        try:
+            yield state.url
+        except BaseException as e:
+            self._end(state, model, started, e)
+            raise
+        self._end(state, model, started, None)
+
+    # Health checks
+
+    def check_health(self) -> Dict[str, bool]:
+        """Probe every host with GET /api/ps and refresh health and loaded models"""
+        results = {}
+        for url in list(self.hosts):
+            try:
+                response = httpx.get(f"{url.rstrip('/')}/api/ps", timeout=self.health_check_timeout)
+                response.raise_for_status()
+                models = {entry.get("name") or entry.get("model") for entry in response.json().get("models", [])}
+                healthy = True
+            except Exception as e:
+                logger.debug(f"Health check failed for {url}: {e}")
+                models, healthy = None, False
+
+            with self._lock:
+                state = self.hosts[url]
+                if healthy:
+                    state.healthy = True
+                    state.consecutive_failures = 0
+                    state.loaded_models = {name for name in models if name}
+                elif state.healthy:
+                    state.healthy = False
+                    state.unhealthy_since = time.time()
+            results[url] = healthy
+        return results
+
+    def start_health_checks(self, interval: float = 10.0):
+        """Run check_health() every ``interval`` seconds in a daemon thread"""
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.check_health()
+                self._stop.wait(interval)
+
+        self._health_thread = threading.Thread(target=run, name="ollama-agents-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-host routing statistics"""
+        with self._lock:
+            return {
+                "strategy": self.strategy.value,
+                "hosts": [state.to_dict() for state in self.hosts.values()],
+                "model_hosts": dict(self._model_hosts)
+            }
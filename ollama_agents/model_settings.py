@@ -1,7 +1,7 @@
 """
 Model settings configuration following OpenAI agents patterns with Ollama-specific options
 """
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from typing import Optional, Union, List, Dict, Any, Sequence
 from enum import Enum
 from .thinking import ThinkingMode
@@ -86,6 +86,21 @@ class ModelSettings:
     extra_headers: Optional[Dict[str, str]] = None
     extra_args: Optional[Dict[str, Any]] = field(default_factory=dict)
     
+    def __setattr__(self, name: str, value: Any):
+        # Bump the revision on every assignment so compiled request templates can
+        # detect changes cheaply (in-place mutation of dict/list values is not seen)
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_revision', self.__dict__.get('_revision', 0) + 1)
+    
+    @property
+    def revision(self) -> int:
+        """Counter incremented whenever a setting is assigned"""
+        return self.__dict__.get('_revision', 0)
+    
+    def _field_values(self) -> Dict[str, Any]:
+        """Current values of all settings fields"""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+    
     def resolve(self, override: Optional['ModelSettings'] = None) -> 'ModelSettings':
         """
         Merge settings by overlaying non-None values from an override.
@@ -97,13 +112,13 @@ class ModelSettings:
             A new ModelSettings instance with merged values
         """
         if override is None:
-            return ModelSettings(**{k: v for k, v in self.__dict__.items() if v is not None})
+            return ModelSettings(**{k: v for k, v in self._field_values().items() if v is not None})
         
         # Start with the current settings
-        merged_values = self.__dict__.copy()
+        merged_values = self._field_values()
         
         # Overlay non-None values from override
-        for key, value in override.__dict__.items():
+        for key, value in override._field_values().items():
             if value is not None:
                 if key == 'extra_args':
                     # Special handling for extra_args: merge dictionaries
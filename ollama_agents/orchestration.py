@@ -3,15 +3,31 @@ Advanced agent orchestration patterns.
 Provides reusable patterns for agent coordination.
 """
 
+import functools
 from typing import List, Dict, Any, Callable, Optional
 from dataclasses import dataclass
 from enum import Enum
 from .agent import Agent
+from .admission import Priority, admission_context
+from .deadline import DeadlineExceeded, current_deadline, deadline_scope
 from .logger import get_logger
 
 logger = get_logger()
 
 
+def _deadline_aware(method: Callable) -> Callable:
+    """
+    Give a pattern a ``deadline`` keyword (seconds or a Deadline) covering all of
+    its agent calls; when it runs out the pattern returns its partial results
+    with ``metadata["deadline_exceeded"]``.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, deadline=None, **kwargs):
+        with deadline_scope(deadline):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class OrchestrationPattern(Enum):
     """Types of orchestration patterns"""
     SEQUENTIAL = "sequential"
@@ -34,10 +50,20 @@ class OrchestrationResult:
 class AgentOrchestrator:
     """Orchestrates multiple agents using various patterns"""
     
-    def __init__(self, agents: List[Agent]):
+    def __init__(self, agents: List[Agent], priority: Optional[Priority] = Priority.BATCH,
+                 tenant: Optional[str] = None):
+        """
+        Args:
+            agents: Agents to orchestrate
+            priority: Admission priority of the orchestration's requests (None = each agent's own)
+            tenant: Rate-limit tenant of the orchestration's requests (None = each agent's own)
+        """
         self.agents = agents
+        self.priority = priority
+        self.tenant = tenant
         logger.info(f"🎭 Orchestrator created with {len(agents)} agents")
     
+    @_deadline_aware
     def sequential(self, query: str, agent_order: Optional[List[str]] = None) -> OrchestrationResult:
         """
         Execute agents sequentially, passing output to next agent.
@@ -52,15 +78,18 @@ class AgentOrchestrator:
         results = []
         current_input = query
         
-        for agent in agents:
-            logger.debug(f"  → Running {agent.name}")
-            response = agent.chat(current_input)
-            results.append({
-                "agent": agent.name,
-                "input": current_input,
-                "output": response.get("content", "")
-            })
-            current_input = response.get("content", "")
+        try:
+            for agent in agents:
+                logger.debug(f"  → Running {agent.name}")
+                response = self._chat(agent, current_input)
+                results.append({
+                    "agent": agent.name,
+                    "input": current_input,
+                    "output": response.get("content", "")
+                })
+                current_input = response.get("content", "")
+        except DeadlineExceeded:
+            return self._partial(OrchestrationPattern.SEQUENTIAL, results, current_input)
         
         return OrchestrationResult(
             pattern=OrchestrationPattern.SEQUENTIAL,
@@ -69,6 +98,7 @@ class AgentOrchestrator:
             metadata={"agent_count": len(agents)}
         )
     
+    @_deadline_aware
     def parallel(self, query: str, aggregator: Optional[Callable] = None) -> OrchestrationResult:
         """
         Execute all agents in parallel and aggregate results.
@@ -80,14 +110,18 @@ class AgentOrchestrator:
         logger.info(f"⚡ Parallel orchestration: {query[:50]}...")
         
         results = []
-        for agent in self.agents:
-            logger.debug(f"  → Running {agent.name}")
-            response = agent.chat(query)
-            results.append({
-                "agent": agent.name,
-                "input": query,
-                "output": response.get("content", "")
-            })
+        deadline_exceeded = False
+        try:
+            for agent in self.agents:
+                logger.debug(f"  → Running {agent.name}")
+                response = self._chat(agent, query)
+                results.append({
+                    "agent": agent.name,
+                    "input": query,
+                    "output": response.get("content", "")
+                })
+        except DeadlineExceeded:
+            deadline_exceeded = True
         
         # Aggregate results
         if aggregator:
@@ -95,6 +129,8 @@ class AgentOrchestrator:
         else:
             final_result = self._default_aggregator(results)
         
+        if deadline_exceeded:
+            return self._partial(OrchestrationPattern.PARALLEL, results, final_result)
         return OrchestrationResult(
             pattern=OrchestrationPattern.PARALLEL,
             results=results,
@@ -102,6 +138,7 @@ class AgentOrchestrator:
             metadata={"agent_count": len(self.agents)}
         )
     
+    @_deadline_aware
     def hierarchical(
         self,
         query: str,
@@ -131,23 +168,28 @@ class AgentOrchestrator:
         Respond with a JSON list of tasks for each worker.
         """
         
-        plan_response = coordinator.chat(planning_prompt)
-        logger.debug(f"  📋 Plan: {plan_response.get('content', '')[:100]}...")
-        
-        # Workers execute
-        results = [{"agent": coordinator_name, "role": "coordinator", "output": plan_response.get("content", "")}]
-        
-        for worker in workers:
-            worker_response = worker.chat(f"Based on this plan, complete your part: {plan_response.get('content', '')}")
-            results.append({
-                "agent": worker.name,
-                "role": "worker",
-                "output": worker_response.get("content", "")
-            })
-        
-        # Coordinator synthesizes
-        synthesis_prompt = f"Synthesize these results into a final answer: {results}"
-        final_response = coordinator.chat(synthesis_prompt)
+        results = []
+        try:
+            plan_response = self._chat(coordinator, planning_prompt)
+            logger.debug(f"  📋 Plan: {plan_response.get('content', '')[:100]}...")
+            
+            # Workers execute
+            results.append({"agent": coordinator_name, "role": "coordinator", "output": plan_response.get("content", "")})
+            
+            for worker in workers:
+                worker_response = self._chat(worker, f"Based on this plan, complete your part: {plan_response.get('content', '')}")
+                results.append({
+                    "agent": worker.name,
+                    "role": "worker",
+                    "output": worker_response.get("content", "")
+                })
+            
+            # Coordinator synthesizes
+            synthesis_prompt = f"Synthesize these results into a final answer: {results}"
+            final_response = self._chat(coordinator, synthesis_prompt)
+        except DeadlineExceeded:
+            return self._partial(OrchestrationPattern.HIERARCHICAL, results,
+                                 self._default_aggregator(results[1:]) if len(results) > 1 else None)
         
         return OrchestrationResult(
             pattern=OrchestrationPattern.HIERARCHICAL,
@@ -156,6 +198,7 @@ class AgentOrchestrator:
             metadata={"coordinator": coordinator_name, "workers": worker_names}
         )
     
+    @_deadline_aware
     def consensus(self, query: str, threshold: float = 0.5) -> OrchestrationResult:
         """
         Agents vote on the answer, consensus is reached by majority.
@@ -169,14 +212,18 @@ class AgentOrchestrator:
         results = []
         answers = []
         
-        for agent in self.agents:
-            response = agent.chat(query)
-            answer = response.get("content", "")
-            results.append({
-                "agent": agent.name,
-                "answer": answer
-            })
-            answers.append(answer)
+        try:
+            for agent in self.agents:
+                response = self._chat(agent, query)
+                answer = response.get("content", "")
+                results.append({
+                    "agent": agent.name,
+                    "answer": answer
+                })
+                answers.append(answer)
+        except DeadlineExceeded:
+            if not answers:
+                return self._partial(OrchestrationPattern.CONSENSUS, results, None)
         
         # Simple consensus: most common answer
         from collections import Counter
@@ -186,16 +233,21 @@ class AgentOrchestrator:
         
         final_result = most_common[0] if consensus_reached else "No consensus reached"
         
+        metadata = {
+            "consensus_reached": consensus_reached,
+            "vote_distribution": dict(answer_counts)
+        }
+        if len(answers) < len(self.agents):
+            # Votes of the agents that answered before the deadline
+            metadata["deadline_exceeded"] = True
         return OrchestrationResult(
             pattern=OrchestrationPattern.CONSENSUS,
             results=results,
             final_result=final_result,
-            metadata={
-                "consensus_reached": consensus_reached,
-                "vote_distribution": dict(answer_counts)
-            }
+            metadata=metadata
         )
     
+    @_deadline_aware
     def debate(self, query: str, rounds: int = 2) -> OrchestrationResult:
         """
         Agents debate to reach best answer through argumentation.
@@ -209,25 +261,29 @@ class AgentOrchestrator:
         results = []
         conversation = []
         
-        for round_num in range(rounds):
-            logger.debug(f"  🔄 Round {round_num + 1}")
-            
-            for agent in self.agents:
-                # Agent sees previous conversation
-                context = f"Query: {query}\n\nPrevious arguments:\n" + "\n".join(conversation[-6:])
-                response = agent.chat(context)
-                argument = response.get("content", "")
+        try:
+            for round_num in range(rounds):
+                logger.debug(f"  🔄 Round {round_num + 1}")
                 
-                conversation.append(f"{agent.name}: {argument}")
-                results.append({
-                    "agent": agent.name,
-                    "round": round_num + 1,
-                    "argument": argument
-                })
-        
-        # Final synthesis by first agent
-        synthesis_prompt = f"After this debate, what is the best answer?\n\n{chr(10).join(conversation)}"
-        final_response = self.agents[0].chat(synthesis_prompt)
+                for agent in self.agents:
+                    # Agent sees previous conversation
+                    context = f"Query: {query}\n\nPrevious arguments:\n" + "\n".join(conversation[-6:])
+                    response = self._chat(agent, context)
+                    argument = response.get("content", "")
+                    
+                    conversation.append(f"{agent.name}: {argument}")
+                    results.append({
+                        "agent": agent.name,
+                        "round": round_num + 1,
+                        "argument": argument
+                    })
+            
+            # Final synthesis by first agent
+            synthesis_prompt = f"After this debate, what is the best answer?\n\n{chr(10).join(conversation)}"
+            final_response = self._chat(self.agents[0], synthesis_prompt)
+        except DeadlineExceeded:
+            return self._partial(OrchestrationPattern.DEBATE, results,
+                                 results[-1]["argument"] if results else None)
         
         return OrchestrationResult(
             pattern=OrchestrationPattern.DEBATE,
@@ -236,6 +292,7 @@ class AgentOrchestrator:
             metadata={"rounds": rounds, "total_arguments": len(results)}
         )
     
+    @_deadline_aware
     def pipeline(self, query: str, pipeline: List[Dict[str, Any]]) -> OrchestrationResult:
         """
         Execute agents in a pipeline with transformations.
@@ -249,25 +306,28 @@ class AgentOrchestrator:
         results = []
         current_input = query
         
-        for stage in pipeline:
-            agent_name = stage.get("agent")
-            transform = stage.get("transform")
-            
-            agent = self._get_agent(agent_name)
-            response = agent.chat(current_input)
-            output = response.get("content", "")
-            
-            if transform:
-                output = transform(output)
-            
-            results.append({
-                "agent": agent_name,
-                "input": current_input,
-                "output": output,
-                "transformed": transform is not None
-            })
-            
-            current_input = output
+        try:
+            for stage in pipeline:
+                agent_name = stage.get("agent")
+                transform = stage.get("transform")
+                
+                agent = self._get_agent(agent_name)
+                response = self._chat(agent, current_input)
+                output = response.get("content", "")
+                
+                if transform:
+                    output = transform(output)
+                
+                results.append({
+                    "agent": agent_name,
+                    "input": current_input,
+                    "output": output,
+                    "transformed": transform is not None
+                })
+                
+                current_input = output
+        except DeadlineExceeded:
+            return self._partial(OrchestrationPattern.PIPELINE, results, current_input)
         
         return OrchestrationResult(
             pattern=OrchestrationPattern.PIPELINE,
@@ -277,6 +337,25 @@ class AgentOrchestrator:
         )
     
     # Helper methods
+    def _chat(self, agent: Agent, message: str) -> Dict[str, Any]:
+        """Run one agent turn under the orchestration's admission priority, tenant and deadline"""
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check()
+        with admission_context(priority=self.priority, tenant=self.tenant):
+            return agent.chat(message)
+    
+    def _partial(self, pattern: OrchestrationPattern, results: List[Dict[str, Any]],
+                 final_result: Optional[str]) -> OrchestrationResult:
+        """Result of an orchestration stopped by its deadline"""
+        logger.warning(f"⏱️ {pattern.value} orchestration stopped by its deadline after {len(results)} step(s)")
+        return OrchestrationResult(
+            pattern=pattern,
+            results=results,
+            final_result=final_result,
+            metadata={"deadline_exceeded": True, "completed_steps": len(results)}
+        )
+    
     def _order_agents(self, order: List[str]) -> List[Agent]:
         """Order agents by name list"""
         ordered = []
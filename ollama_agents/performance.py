@@ -3,14 +3,16 @@ Performance optimizations for Ollama agents.
 Includes caching, batching, and connection pooling.
 """
 
+import asyncio
 import time
 import hashlib
 import json
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from collections import OrderedDict
 import threading
+from contextlib import contextmanager
 from .logger import get_logger
 
 logger = get_logger()
@@ -118,62 +120,142 @@ class LRUCache:
 
 
 class RequestBatcher:
-    """Batch multiple requests for efficiency"""
+    """
+    Async micro-batcher.
+
+    Callers ``await submit(item)`` and get that item's result. Items are
+    collected and handed to the processor as one list when ``batch_size`` items
+    are pending or ``max_wait_ms`` after the first pending item, whichever
+    comes first. Batches are processed in background tasks, so a new batch can
+    fill while earlier ones are in flight.
+
+    The processor takes a list of items and returns one result per item, in
+    order; it may be a coroutine function. If it raises, every item of the
+    batch receives the exception.
+    """
     
-    def __init__(self, batch_size: int = 10, max_wait_ms: int = 100):
+    def __init__(self, batch_size: int = 10, max_wait_ms: int = 100,
+                 processor: Optional[Callable[[List[Any]], Any]] = None):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
         self.batch_size = batch_size
         self.max_wait_ms = max_wait_ms
-        self.pending: List[Dict[str, Any]] = []
-        self.results: Dict[str, Any] = {}
-        self._lock = threading.Lock()
-        self._condition = threading.Condition(self._lock)
-        self._processor: Optional[Callable] = None
-    
-    def add_request(self, request_id: str, data: Any) -> Any:
-        """Add request to batch"""
-        with self._condition:
-            self.pending.append({"id": request_id, "data": data})
-            
-            # Process if batch is full
-            if len(self.pending) >= self.batch_size:
-                self._process_batch()
-            else:
-                # Wait for batch to fill or timeout
-                self._condition.wait(timeout=self.max_wait_ms / 1000.0)
-                if self.pending and request_id in [r["id"] for r in self.pending]:
-                    self._process_batch()
-            
-            # Return result
-            return self.results.pop(request_id, None)
+        self._processor = processor
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: set = set()
+        self.stats = {
+            "batches": 0,
+            "items": 0,
+            "size_flushes": 0,
+            "timer_flushes": 0
+        }
     
-    def set_processor(self, processor: Callable[[List[Any]], List[Any]]):
+    def set_processor(self, processor: Callable[[List[Any]], Any]):
         """Set batch processor function"""
         self._processor = processor
     
-    def _process_batch(self):
-        """Process current batch"""
-        if not self.pending or not self._processor:
-            return
-        
-        logger.debug(f"⚡ Processing batch of {len(self.pending)} requests")
+    async def submit(self, item: Any) -> Any:
+        """Add an item to the next batch and wait for its result"""
+        if self._processor is None:
+            raise RuntimeError("RequestBatcher has no processor; call set_processor() first")
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._pending:
+                raise RuntimeError("RequestBatcher is in use by another event loop")
+            self._loop = loop
         
-        # Extract data
-        batch_data = [r["data"] for r in self.pending]
-        batch_ids = [r["id"] for r in self.pending]
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.batch_size:
+            self.stats["size_flushes"] += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._on_timer)
+        return await future
+    
+    def _on_timer(self):
+        self._timer = None
+        self.stats["timer_flushes"] += 1
+        self._flush()
+    
+    def _flush(self):
+        """Start processing the pending items in the background"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            task = self._loop.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Process one batch and deliver the results"""
+        items = [item for item, _ in batch]
+        self.stats["batches"] += 1
+        self.stats["items"] += len(items)
+        logger.debug(f"⚡ Processing batch of {len(items)} requests")
         
-        # Process
         try:
-            results = self._processor(batch_data)
-            
-            # Store results
-            for req_id, result in zip(batch_ids, results):
-                self.results[req_id] = result
+            if asyncio.iscoroutinefunction(self._processor):
+                results = await self._processor(items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(None, self._processor, items)
+            results = list(results)
+            if len(results) != len(items):
+                raise ValueError(f"Batch processor returned {len(results)} results for {len(items)} items")
         except Exception as e:
             logger.error(f"Batch processing error: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
         
-        # Clear pending
-        self.pending.clear()
-        self._condition.notify_all()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
+    async def flush(self):
+        """Process pending items now and wait for all batches in flight"""
+        if self._pending:
+            self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "avg_batch_size": self.stats["items"] / batches if batches else 0
+        }
+
+
+class EmbeddingBatcher(RequestBatcher):
+    """
+    Batches embedding requests into one call to the Ollama embed endpoint,
+    which accepts a list of inputs, instead of one round trip per text.
+    """
+    
+    def __init__(self, model: str = "nomic-embed-text", host: Optional[str] = None, timeout: int = 30,
+                 batch_size: int = 32, max_wait_ms: int = 10):
+        super().__init__(batch_size=batch_size, max_wait_ms=max_wait_ms, processor=self._embed_batch)
+        self.model = model
+        self.host = host
+        self.timeout = timeout
+    
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        from .clients import get_async_client
+        response = await get_async_client(self.host, self.timeout).embed(model=self.model, input=texts)
+        return response.embeddings
+    
+    async def embed(self, text: str) -> List[float]:
+        """Embedding of one text, sent to the server as part of a batch"""
+        return await self.submit(text)
 
 
 class ConnectionPool:
@@ -227,6 +309,15 @@ class ConnectionPool:
                 self._condition.notify()
                 logger.debug(f"🔌 Connection released (pool: {len(self.available)})")
     
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Acquire a connection for the duration of a with-block"""
+        conn = self.acquire(timeout=timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
     def close_all(self):
         """Close all connections"""
         with self._lock:
@@ -239,21 +330,27 @@ class ConnectionPool:
 
 
 class ResponseCache:
-    """Cache for LLM responses based on prompt hashing"""
+    """
+    Cache for LLM responses based on prompt hashing.
     
-    def __init__(self, max_size: int = 1000, ttl_seconds: int = 3600):
+    An optional backend (see cache_backends) keeps responses across restarts or
+    shares them between processes; the LRU cache stays in front of it.
+    """
+    
+    def __init__(self, max_size: int = 1000, ttl_seconds: int = 3600, backend: Optional[Any] = None):
         self.cache = LRUCache(max_size=max_size)
         self.ttl = timedelta(seconds=ttl_seconds)
+        self.backend = backend
     
     def get_cache_key(self, model: str, messages: List[Dict], **params) -> str:
         """Generate cache key from request parameters"""
-        cache_data = {
-            "model": model,
-            "messages": messages,
-            "params": params
-        }
-        cache_str = json.dumps(cache_data, sort_keys=True)
-        return hashlib.sha256(cache_str.encode()).hexdigest()
+        from .caching import digest_request_value
+        hasher = hashlib.sha256(model.encode())
+        hasher.update(b"\0messages\0")
+        hasher.update(digest_request_value(messages))
+        hasher.update(b"\0params\0")
+        hasher.update(json.dumps(params, sort_keys=True).encode())
+        return hasher.hexdigest()
     
     def get(self, model: str, messages: List[Dict], **params) -> Optional[Dict]:
         """Get cached response"""
@@ -265,6 +362,14 @@ class ResponseCache:
             if datetime.now() - entry.get("timestamp", datetime.now()) < self.ttl:
                 return entry.get("response")
         
+        if self.backend is not None:
+            stored = self.backend.get(key)
+            if stored is not None:
+                response, expires_at = stored
+                timestamp = datetime.fromtimestamp(expires_at) - self.ttl if expires_at else datetime.now()
+                self.cache.set(key, {"response": response, "timestamp": timestamp})
+                return response
+        
         return None
     
     def set(self, model: str, messages: List[Dict], response: Dict, **params):
@@ -275,10 +380,15 @@ class ResponseCache:
             "timestamp": datetime.now()
         }
         self.cache.set(key, entry)
+        if self.backend is not None:
+            self.backend.set(key, response, (entry["timestamp"] + self.ttl).timestamp())
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        return self.cache.get_stats()
+        stats = self.cache.get_stats()
+        if self.backend is not None:
+            stats["backend"] = self.backend.get_stats()
+        return stats
 
 
 # Global instances
@@ -286,10 +396,10 @@ _response_cache: Optional[ResponseCache] = None
 _connection_pool: Optional[ConnectionPool] = None
 
 
-def enable_response_caching(max_size: int = 1000, ttl_seconds: int = 3600):
-    """Enable response caching"""
+def enable_response_caching(max_size: int = 1000, ttl_seconds: int = 3600, backend: Optional[Any] = None):
+    """Enable response caching, optionally backed by persistent or shared storage"""
     global _response_cache
-    _response_cache = ResponseCache(max_size=max_size, ttl_seconds=ttl_seconds)
+    _response_cache = ResponseCache(max_size=max_size, ttl_seconds=ttl_seconds, backend=backend)
     logger.info(f"✅ Response caching enabled (max_size={max_size}, ttl={ttl_seconds}s)")
 
 
@@ -298,9 +408,20 @@ def get_response_cache() -> Optional[ResponseCache]:
     return _response_cache
 
 
-def enable_connection_pooling(factory: Callable, max_connections: int = 10):
-    """Enable connection pooling"""
+def enable_connection_pooling(factory: Optional[Callable] = None, max_connections: int = 10):
+    """
+    Enable connection pooling.
+    
+    Without a factory, agent traffic is pooled: each host gets a ConnectionPool of
+    Ollama clients and sync requests check a client out for their duration.
+    With a factory, a standalone pool of factory-made connections is created.
+    """
     global _connection_pool
+    if factory is None:
+        from .clients import get_client_registry
+        get_client_registry().configure(pool_size=max_connections)
+        logger.info(f"✅ Agent connection pooling enabled (max={max_connections} per host)")
+        return
     _connection_pool = ConnectionPool(factory=factory, max_connections=max_connections)
     logger.info(f"✅ Connection pooling enabled (max={max_connections})")
 
@@ -0,0 +1,300 @@
+"""
+Model residency management for Ollama Agents SDK
+Keeps frequently used models loaded and unloads idle ones when memory is tight
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+import ollama
+
+from .logger import get_logger
+
+logger = get_logger()
+
+
+class ModelResidencyManager:
+    """
+    Tracks which models are loaded on an Ollama host and how they are used.
+
+    - ``preload()`` loads models ahead of the first request (optionally pinned,
+      i.e. never unloaded by Ollama).
+    - ``keep_alive_for()`` picks a keep_alive per model from observed traffic:
+      hot models get ``max_keep_alive``, others roughly twice their longest
+      recent gap between requests, within [min_keep_alive, max_keep_alive].
+    - ``refresh()`` polls the running-models endpoint (/api/ps).
+    - ``enforce_budget()`` unloads idle, unpinned models (keep_alive=0), least
+      recently used first, while the resident set exceeds max_resident_models
+      or max_resident_bytes. A model is idle when it has no request in flight
+      and none started or finished within ``idle_grace`` seconds.
+
+    A manager only loads, polls and unloads models on the single ``host`` it
+    was built with. Agents that route through a HostPool still take keep_alive
+    from it and report their traffic to it, but the other hosts' resident
+    models are not managed; use one manager per host for that.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        client: Optional[ollama.Client] = None,
+        default_keep_alive: float = 300.0,
+        min_keep_alive: float = 60.0,
+        max_keep_alive: float = 3600.0,
+        hot_requests: int = 10,
+        traffic_window: float = 600.0,
+        max_resident_models: Optional[int] = None,
+        max_resident_bytes: Optional[int] = None,
+        idle_grace: float = 60.0,
+        timeout: int = 30
+    ):
+        """
+        Initialize the residency manager
+
+        Args:
+            host: Ollama host to manage (one manager per host)
+            client: Client to use instead of the shared client for host
+            default_keep_alive: keep_alive (seconds) for models without traffic history
+            min_keep_alive: Lower bound of traffic-based keep_alive
+            max_keep_alive: keep_alive of hot models and upper bound for the rest
+            hot_requests: Requests within traffic_window that make a model hot
+            traffic_window: Seconds of request history considered
+            max_resident_models: Most models to keep loaded (None = no limit)
+            max_resident_bytes: Most memory loaded models may use (None = no limit)
+            idle_grace: Seconds after its last request before a model may be unloaded
+        """
+        self.host = host
+        self._client = client
+        self.timeout = timeout
+        self.default_keep_alive = default_keep_alive
+        self.min_keep_alive = min_keep_alive
+        self.max_keep_alive = max_keep_alive
+        self.hot_requests = hot_requests
+        self.traffic_window = traffic_window
+        self.max_resident_models = max_resident_models
+        self.max_resident_bytes = max_resident_bytes
+        self.idle_grace = idle_grace
+        self.pinned: set = set()
+        self.resident: Dict[str, Dict[str, Any]] = {}  # Model -> /api/ps entry
+        self._requests: Dict[str, Deque[float]] = {}
+        self._last_used: Dict[str, float] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.unloads = 0
+
+    @property
+    def client(self) -> ollama.Client:
+        if self._client is not None:
+            return self._client
+        from .clients import get_client
+        return get_client(self.host, self.timeout)
+
+    # Traffic
+
+    def record_request(self, model: str, now: Optional[float] = None):
+        """Record a request for a model"""
+        now = time.time() if now is None else now
+        with self._lock:
+            history = self._requests.setdefault(model, deque())
+            history.append(now)
+            self._trim(history, now)
+            self._last_used[model] = now
+
+    @contextmanager
+    def in_use(self, model: str) -> Iterator[None]:
+        """Mark a model busy for the duration of a request, so enforce_budget() leaves it loaded"""
+        with self._lock:
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[model] -= 1
+                if not self._in_flight[model]:
+                    del self._in_flight[model]
+                self._last_used[model] = time.time()
+
+    def _is_idle(self, model: str, now: float) -> bool:
+        """No request in flight and none within idle_grace (lock held)"""
+        return not self._in_flight.get(model) and now - self._last_used.get(model, 0.0) >= self.idle_grace
+
+    def _trim(self, history: Deque[float], now: float):
+        while history and now - history[0] > self.traffic_window:
+            history.popleft()
+
+    def keep_alive_for(self, model: str, now: Optional[float] = None) -> float:
+        """keep_alive in seconds for the next request to a model (-1 = keep loaded)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if model in self.pinned:
+                return -1
+            history = self._requests.get(model)
+            if history:
+                self._trim(history, now)
+            if not history:
+                return self.default_keep_alive
+            if len(history) >= self.hot_requests:
+                return self.max_keep_alive
+            gaps = [later - earlier for earlier, later in zip(history, list(history)[1:])]
+            gaps.append(now - history[-1])
+            keep_alive = 2 * max(gaps)
+        return min(self.max_keep_alive, max(self.min_keep_alive, keep_alive))
+
+    # Loading and unloading
+
+    def preload(self, models: Iterable[str], pin: bool = False, keep_alive: Optional[float] = None):
+        """
+        Load models now so the first real request does not pay the load time
+
+        Args:
+            models: Models to load
+            pin: Keep them loaded indefinitely (keep_alive=-1) and never unload them
+            keep_alive: keep_alive for the warmup request (default: keep_alive_for(model))
+        """
+        for model in models:
+            if pin:
+                with self._lock:
+                    self.pinned.add(model)
+            start = time.time()
+            # An empty prompt loads the model without generating
+            self.client.generate(model=model, prompt="",
+                                 keep_alive=keep_alive if keep_alive is not None else self.keep_alive_for(model))
+            logger.info(f"🔥 Preloaded model {model} in {time.time() - start:.2f}s")
+        self.refresh()
+
+    async def apreload(self, models: Iterable[str], pin: bool = False, keep_alive: Optional[float] = None):
+        """Async variant of preload (models load concurrently)"""
+        import asyncio
+        from .clients import get_async_client
+        models = list(models)
+        if pin:
+            with self._lock:
+                self.pinned.update(models)
+        client = get_async_client(self.host, self.timeout)
+        await asyncio.gather(*(
+            client.generate(model=model, prompt="",
+                            keep_alive=keep_alive if keep_alive is not None else self.keep_alive_for(model))
+            for model in models
+        ))
+        await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+
+    def unload(self, model: str):
+        """Unload a model now (keep_alive=0)"""
+        self.client.generate(model=model, prompt="", keep_alive=0)
+        with self._lock:
+            self.resident.pop(model, None)
+            self.pinned.discard(model)
+            self.unloads += 1
+        logger.info(f"💤 Unloaded model {model}")
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """Poll the running-models endpoint and update the resident set"""
+        response = self.client.ps()
+        resident = {}
+        for entry in response.models:
+            name = entry.model or entry.name
+            resident[name] = {
+                "size": entry.size or 0,
+                "size_vram": entry.size_vram or 0,
+                "expires_at": entry.expires_at
+            }
+        with self._lock:
+            self.resident = resident
+        return resident
+
+    def _over_budget(self, resident: Dict[str, Dict[str, Any]]) -> bool:
+        if self.max_resident_models is not None and len(resident) > self.max_resident_models:
+            return True
+        if self.max_resident_bytes is not None:
+            return sum(entry["size"] for entry in resident.values()) > self.max_resident_bytes
+        return False
+
+    def enforce_budget(self) -> List[str]:
+        """Unload idle, unpinned models until the resident set fits the budget"""
+        now = time.time()
+        with self._lock:
+            resident = dict(self.resident)
+            candidates = sorted((model for model in resident
+                                 if model not in self.pinned and self._is_idle(model, now)),
+                                key=lambda model: self._last_used.get(model, 0.0))
+        unloaded = []
+        for model in candidates:
+            if not self._over_budget(resident):
+                break
+            self.unload(model)
+            resident.pop(model)
+            unloaded.append(model)
+        return unloaded
+
+    # Background polling
+
+    def start(self, interval: float = 30.0):
+        """Refresh and enforce the budget every ``interval`` seconds in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.refresh()
+                    self.enforce_budget()
+                except Exception as e:
+                    logger.debug(f"Residency poll failed: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="ollama-agents-residency", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Resident models, traffic and chosen keep_alive per model"""
+        now = time.time()
+        with self._lock:
+            models = set(self._requests) | set(self.resident) | self.pinned
+        return {
+            "resident": sorted(self.resident),
+            "pinned": sorted(self.pinned),
+            "unloads": self.unloads,
+            "models": {
+                model: {
+                    "recent_requests": len(self._requests.get(model, ())),
+                    "in_flight": self._in_flight.get(model, 0),
+                    "keep_alive": self.keep_alive_for(model, now)
+                }
+                for model in sorted(models)
+            }
+        }
+
+
+# Global residency manager
+_global_residency_manager: Optional[ModelResidencyManager] = None
+
+
+def get_residency_manager() -> Optional[ModelResidencyManager]:
+    """Get the global residency manager"""
+    return _global_residency_manager
+
+
+def enable_residency_management(**kwargs) -> ModelResidencyManager:
+    """
+    Enable the global residency manager; agents without their own manager
+    then take keep_alive from it. Arguments are passed to ModelResidencyManager.
+    """
+    global _global_residency_manager
+    _global_residency_manager = ModelResidencyManager(**kwargs)
+    return _global_residency_manager
+
+
+def disable_residency_management():
+    """Disable the global residency manager"""
+    global _global_residency_manager
+    if _global_residency_manager is not None:
+        _global_residency_manager.stop()
+    _global_residency_manager = None
@@ -3,11 +3,64 @@ Retry functionality for Ollama Agents SDK
 Provides automatic retry with exponential backoff for API calls
 """
 import time
+import contextvars
 import functools
-from typing import Callable, Optional, Type, Tuple, Any
+import threading
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Dict, Iterator, Optional, Type, Tuple, Any
 from dataclasses import dataclass
+import concurrent.futures
 import ollama
 
+from .hosts import is_host_failure
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent traffic so that a struggling server
+    is not hit by a retry storm: within the last ``window`` seconds, retries
+    may be at most ``ratio`` of requests (plus ``min_retries`` for quiet periods).
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 3, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        """Count a first attempt"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        """Take a retry from the budget; False when the budget is spent"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {"requests": len(self._requests), "retries": len(self._retries), "denied": self.denied}
+
 
 @dataclass
 class RetryConfig:
@@ -22,6 +75,9 @@ class RetryConfig:
         ConnectionError,
         TimeoutError,
     )
+    budget: Optional[RetryBudget] = None  # Shared retry budget (None = unlimited)
+    hedge_percentile: Optional[float] = None  # Hedge after this latency percentile, e.g. 0.95 (None = off)
+    hedge_min_samples: int = 20  # Latency samples needed before hedging starts
 
 
 class RetryExhausted(Exception):
@@ -29,6 +85,216 @@ class RetryExhausted(Exception):
     pass
 
 
+class CircuitOpenError(Exception):
+    """Raised without calling the server while a circuit breaker is open"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitState(Enum):
+    """State of a circuit breaker"""
+    CLOSED = "closed"        # Requests flow normally
+    OPEN = "open"            # Requests fail fast
+    HALF_OPEN = "half_open"  # A probe request decides whether to close again
+
+
+def is_server_failure(error: BaseException) -> bool:
+    """Whether an error counts against a circuit breaker (unreachable host or 5xx)"""
+    if is_host_failure(error):
+        return True
+    return isinstance(error, ollama.ResponseError) and error.status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one host/model pair.
+
+    After ``failure_threshold`` consecutive server failures the circuit opens
+    and calls fail at once with CircuitOpenError. After ``recovery_timeout``
+    seconds it lets ``half_open_max_calls`` probe requests through: a success
+    closes it, a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def before_call(self, name: str = "circuit"):
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == CircuitState.OPEN:
+                remaining = self.opened_at + self.recovery_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit open for {name}", retry_after=remaining)
+                self.state = CircuitState.HALF_OPEN
+                self.probes = 0
+            if self.state == CircuitState.HALF_OPEN:
+                if self.probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit half-open for {name}, probe in progress")
+                self.probes += 1
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.state = CircuitState.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == CircuitState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = CircuitState.OPEN
+                self.opened_at = time.monotonic()
+
+    def record_abort(self):
+        """A call ended without an outcome (e.g. cancelled): free its probe slot"""
+        with self._lock:
+            if self.state == CircuitState.HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"state": self.state.value, "consecutive_failures": self.consecutive_failures,
+                "rejected": self.rejected}
+
+
+class CircuitBreakers:
+    """Circuit breakers keyed by (host, model), created on first use"""
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._breakers: Dict[Tuple[Optional[str], Optional[str]], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: Optional[str], model: Optional[str]) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get((host, model))
+            if breaker is None:
+                breaker = self._breakers[(host, model)] = CircuitBreaker(
+                    self.failure_threshold, self.recovery_timeout, self.half_open_max_calls)
+            return breaker
+
+    @contextmanager
+    def guard(self, host: Optional[str], model: Optional[str]) -> Iterator[None]:
+        """Run one call through the breaker of (host, model)"""
+        breaker = self.get(host, model)
+        breaker.before_call(f"{model} on {host or 'default host'}")
+        try:
+            yield
+        except Exception as e:
+            if is_server_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()  # The server answered
+            raise
+        except BaseException:
+            breaker.record_abort()
+            raise
+        breaker.record_success()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {f"{model}@{host or 'default'}": breaker.to_dict()
+                    for (host, model), breaker in self._breakers.items()}
+
+
+class LatencyTracker:
+    """Recent request latencies, for percentile-based hedging delays"""
+
+    def __init__(self, max_samples: int = 200):
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+_hedge_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="ollama-agents-hedge")
+        return _hedge_executor
+
+
+def hedged_call(primary: Callable[[], Any], backup: Callable[[], Any], delay: float) -> Any:
+    """
+    Call ``primary``; if it has not finished after ``delay`` seconds, also call
+    ``backup`` and return whichever succeeds first. The loser's result is
+    discarded (a running sync HTTP request cannot be aborted).
+    """
+    executor = _get_hedge_executor()
+    # Each call runs in a copy of the caller's context (admission priority, tenant)
+    first = executor.submit(contextvars.copy_context().run, primary)
+    try:
+        return first.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+    second = executor.submit(contextvars.copy_context().run, backup)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+async def async_hedged_call(primary: Callable[[], Awaitable[Any]], backup: Callable[[], Awaitable[Any]],
+                            delay: float) -> Any:
+    """Async variant of hedged_call; the losing request is cancelled"""
+    import asyncio
+
+    first = asyncio.ensure_future(primary())
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.add(asyncio.ensure_future(backup()))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
 def calculate_backoff(
     attempt: int,
     initial_delay: float,
@@ -84,6 +350,8 @@ def with_retry(
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             last_exception = None
+            if config.budget is not None:
+                config.budget.record_request()
             
             for attempt in range(config.max_retries + 1):
                 try:
@@ -92,6 +360,10 @@ def with_retry(
                 except config.retry_on_exceptions as e:
                     last_exception = e
                     
+                    if config.budget is not None and attempt < config.max_retries \
+                            and not config.budget.try_retry():
+                        raise  # Retry budget spent: fail like an unretried call
+                    
                     if attempt >= config.max_retries:
                         # All retries exhausted
                         raise RetryExhausted(
@@ -152,6 +424,8 @@ async def async_with_retry(
         config = RetryConfig()
     
     last_exception = None
+    if config.budget is not None:
+        config.budget.record_request()
     
     for attempt in range(config.max_retries + 1):
         try:
@@ -160,6 +434,10 @@ async def async_with_retry(
         except config.retry_on_exceptions as e:
             last_exception = e
             
+            if config.budget is not None and attempt < config.max_retries \
+                    and not config.budget.try_retry():
+                raise
+            
             if attempt >= config.max_retries:
                 raise RetryExhausted(
                     f"Failed after {config.max_retries} retries: {str(e)}"
@@ -204,3 +482,26 @@ def disable_retry():
     """Disable global retry"""
     global _global_retry_config
     _global_retry_config = None
+
+
+# Global circuit breakers
+_global_circuit_breakers: Optional[CircuitBreakers] = None
+
+
+def get_circuit_breakers() -> Optional[CircuitBreakers]:
+    """Get the global circuit breakers"""
+    return _global_circuit_breakers
+
+
+def enable_circuit_breakers(failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                            half_open_max_calls: int = 1) -> CircuitBreakers:
+    """Guard every agent request with a per host/model circuit breaker"""
+    global _global_circuit_breakers
+    _global_circuit_breakers = CircuitBreakers(failure_threshold, recovery_timeout, half_open_max_calls)
+    return _global_circuit_breakers
+
+
+def disable_circuit_breakers():
+    """Disable the global circuit breakers"""
+    global _global_circuit_breakers
+    _global_circuit_breakers = None
@@ -0,0 +1,286 @@
+"""
+Model-affinity request scheduling for Ollama Agents SDK
+Groups queued requests by model so Ollama swaps models as rarely as possible
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+from .deadline import current_deadline
+from .logger import get_logger
+
+logger = get_logger()
+
+
+class _Waiter:
+    """A queued request, granted by resolving its future"""
+    __slots__ = ("model", "enqueued", "future", "granted")
+
+    def __init__(self, model: str):
+        self.model = model
+        self.enqueued = time.monotonic()
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.granted = False
+
+
+class _HostLane:
+    """Scheduling state of one Ollama server"""
+
+    def __init__(self):
+        self.active_model: Optional[str] = None
+        self.in_flight = 0
+        self.queues: Dict[str, Deque[_Waiter]] = {}
+        self.timer: Optional[threading.Timer] = None
+        self.timer_due = 0.0
+        self.switches = 0
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+
+class ModelScheduler:
+    """
+    Process-level scheduler between agents and their Ollama servers.
+
+    Each host is scheduled on its own; requests for a host wait in a queue per
+    model. The scheduler serves one model at a time per host: requests for the
+    active model run (up to ``max_concurrent`` at once) while that model has
+    work queued, and a different model only starts once the active one has
+    drained, taking all its queued requests as a batch. ``max_wait`` is the
+    fairness deadline: once a request for another model has waited that long,
+    the active model gets no new requests and the scheduler switches as soon
+    as its in-flight requests finish.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_wait: float = 2.0, timeout: Optional[float] = None):
+        """
+        Initialize the scheduler
+
+        Args:
+            max_concurrent: Requests in flight at once per host (match OLLAMA_NUM_PARALLEL)
+            max_wait: Seconds a request for another model waits before the active
+                model is preempted (it still finishes its in-flight requests)
+            timeout: Seconds a request may wait for its slot before TimeoutError
+                (None = no limit; the current deadline always applies)
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._lanes: Dict[Optional[str], _HostLane] = {}
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    # Request slots
+
+    @contextmanager
+    def slot(self, model: str, host: Optional[str] = None) -> Iterator[None]:
+        """
+        Hold a slot for one request to ``model`` on ``host`` (blocks until scheduled).
+        Raises DeadlineExceeded or TimeoutError when the current deadline or
+        ``timeout`` runs out first.
+        """
+        waiter = self._enqueue(host, model)
+        self._wait(host, waiter)
+        try:
+            yield
+        finally:
+            self._release(host)
+
+    def _wait(self, host: Optional[str], waiter: _Waiter):
+        deadline = current_deadline()
+        timeout = self.timeout if deadline is None else deadline.bound(self.timeout)
+        cancelled: concurrent.futures.Future = concurrent.futures.Future()
+
+        def on_cancel():
+            if not cancelled.done():
+                cancelled.set_result(None)
+
+        if deadline is not None:
+            deadline.add_callback(on_cancel)
+        try:
+            concurrent.futures.wait([waiter.future, cancelled], timeout=timeout,
+                                    return_when=concurrent.futures.FIRST_COMPLETED)
+        finally:
+            if deadline is not None:
+                deadline.remove_callback(on_cancel)
+        if waiter.future.done() or self._withdraw(host, waiter):
+            return
+        if deadline is not None:
+            deadline.check()
+        raise self._timed_out(waiter)
+
+    @asynccontextmanager
+    async def aslot(self, model: str, host: Optional[str] = None) -> AsyncIterator[None]:
+        """Async variant of slot (the current deadline applies by cancelling the caller)"""
+        waiter = self._enqueue(host, model)
+        try:
+            # Shielded so a cancelled caller is removed under the lock rather than racing a grant
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(waiter.future)), self.timeout)
+        except asyncio.TimeoutError:
+            if not self._withdraw(host, waiter):
+                raise self._timed_out(waiter) from None
+        except asyncio.CancelledError:
+            if self._withdraw(host, waiter):
+                self._release(host)
+            raise
+        try:
+            yield
+        finally:
+            self._release(host)
+
+    def _timed_out(self, waiter: _Waiter) -> TimeoutError:
+        with self._lock:
+            self.timeouts += 1
+        return TimeoutError(f"No scheduler slot for model {waiter.model} within {self.timeout}s")
+
+    def _enqueue(self, host: Optional[str], model: str) -> _Waiter:
+        waiter = _Waiter(model)
+        with self._lock:
+            lane = self._lanes.get(host)
+            if lane is None:
+                lane = self._lanes[host] = _HostLane()
+            lane.queues.setdefault(model, deque()).append(waiter)
+            self._dispatch(lane)
+        return waiter
+
+    def _release(self, host: Optional[str]):
+        with self._lock:
+            lane = self._lanes[host]
+            lane.in_flight -= 1
+            self._dispatch(lane)
+
+    def _withdraw(self, host: Optional[str], waiter: _Waiter) -> bool:
+        """Remove a waiting request; returns True if it was granted meanwhile (and so holds a slot)"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            lane = self._lanes[host]
+            queue = lane.queues.get(waiter.model)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+            self._dispatch(lane)
+            return False
+
+    # Scheduling (called with the lock held)
+
+    def _grant(self, lane: _HostLane, waiter: _Waiter, now: float):
+        waited = now - waiter.enqueued
+        waiter.granted = True
+        lane.in_flight += 1
+        self.granted += 1
+        self.total_wait += waited
+        self.max_observed_wait = max(self.max_observed_wait, waited)
+        waiter.future.set_result(None)
+
+    @staticmethod
+    def _oldest_waiter(lane: _HostLane, exclude: Optional[str] = None) -> Optional[_Waiter]:
+        heads = [queue[0] for model, queue in lane.queues.items() if queue and model != exclude]
+        return min(heads, key=lambda waiter: waiter.enqueued) if heads else None
+
+    def _dispatch(self, lane: _HostLane):
+        now = time.monotonic()
+        for model in [model for model, queue in lane.queues.items() if not queue]:
+            del lane.queues[model]
+
+        waiting = self._oldest_waiter(lane, exclude=lane.active_model)
+        overdue = waiting is not None and now - waiting.enqueued >= self.max_wait
+        active_queue = lane.queues.get(lane.active_model)
+        if active_queue and not overdue:
+            while active_queue and lane.in_flight < self.max_concurrent:
+                self._grant(lane, active_queue.popleft(), now)
+        elif not lane.in_flight:
+            # The active model is idle or preempted: switch to the longest-waiting model
+            head = waiting if overdue else self._oldest_waiter(lane)
+            if head is not None:
+                if head.model != lane.active_model:
+                    if lane.active_model is not None:
+                        lane.switches += 1
+                        logger.debug(f"🔀 Scheduler switching {lane.active_model} -> {head.model}")
+                    lane.active_model = head.model
+                queue = lane.queues[head.model]
+                while queue and lane.in_flight < self.max_concurrent:
+                    self._grant(lane, queue.popleft(), now)
+
+        waiting = self._oldest_waiter(lane, exclude=lane.active_model)
+        if waiting is not None and now - waiting.enqueued < self.max_wait:
+            self._schedule_timer(lane, waiting.enqueued + self.max_wait)
+
+    def _schedule_timer(self, lane: _HostLane, due: float):
+        """Re-run dispatch when the oldest request for another model becomes overdue"""
+        if lane.timer is not None and lane.timer.is_alive() and lane.timer_due <= due:
+            return
+        if lane.timer is not None:
+            lane.timer.cancel()
+        lane.timer_due = due
+        lane.timer = threading.Timer(max(0.0, due - time.monotonic()), self._on_timer, args=(lane,))
+        lane.timer.daemon = True
+        lane.timer.start()
+
+    def _on_timer(self, lane: _HostLane):
+        with self._lock:
+            lane.timer = None
+            self._dispatch(lane)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth per model, switches and wait times, in total and per host"""
+        with self._lock:
+            hosts = {
+                host or "default": {
+                    "active_model": lane.active_model,
+                    "in_flight": lane.in_flight,
+                    "queue_depth": {model: len(queue) for model, queue in lane.queues.items() if queue},
+                    "queued": lane.queued(),
+                    "switches": lane.switches
+                }
+                for host, lane in self._lanes.items()
+            }
+            queue_depth: Dict[str, int] = {}
+            for lane in hosts.values():
+                for model, depth in lane["queue_depth"].items():
+                    queue_depth[model] = queue_depth.get(model, 0) + depth
+            active = {lane["active_model"] for lane in hosts.values()}
+            return {
+                # With a single host (or all hosts on one model) the model it serves
+                "active_model": active.pop() if len(active) == 1 else None,
+                "in_flight": sum(lane["in_flight"] for lane in hosts.values()),
+                "queue_depth": queue_depth,
+                "queued": sum(lane["queued"] for lane in hosts.values()),
+                "switches": sum(lane["switches"] for lane in hosts.values()),
+                "granted": self.granted,
+                "timeouts": self.timeouts,
+                "avg_wait": self.total_wait / self.granted if self.granted else 0.0,
+                "max_wait": self.max_observed_wait,
+                "hosts": hosts
+            }
+
+
+# Global model scheduler
+_global_scheduler: Optional[ModelScheduler] = None
+
+
+def get_model_scheduler() -> Optional[ModelScheduler]:
+    """Get the global model scheduler"""
+    return _global_scheduler
+
+
+def enable_model_scheduling(max_concurrent: int = 4, max_wait: float = 2.0,
+                            timeout: Optional[float] = None) -> ModelScheduler:
+    """Route every agent request through a global ModelScheduler"""
+    global _global_scheduler
+    _global_scheduler = ModelScheduler(max_concurrent=max_concurrent, max_wait=max_wait, timeout=timeout)
+    return _global_scheduler
+
+
+def disable_model_scheduling():
+    """Disable the global model scheduler"""
+    global _global_scheduler
+    _global_scheduler = None
@@ -0,0 +1,265 @@
+"""
+Semantic response cache for Ollama Agents SDK
+Returns cached responses for queries that are similar, not only identical, to earlier ones
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# An embedder maps a batch of texts to one vector per text
+Embedder = Callable[[List[str]], List[Sequence[float]]]
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold and strip punctuation and extra whitespace from a query"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class OllamaEmbedder:
+    """Embeds texts with the Ollama embed endpoint"""
+
+    def __init__(self, model: str = "nomic-embed-text", host: Optional[str] = None, timeout: int = 30):
+        self.model = model
+        self.host = host
+        self.timeout = timeout
+
+    def __call__(self, texts: List[str]) -> List[Sequence[float]]:
+        from .clients import get_client
+        response = get_client(self.host, self.timeout).embed(model=self.model, input=texts)
+        return response.embeddings
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder (feature hashing of words and word pairs).
+
+    Needs no server, so it suits tests and offline use; paraphrases sharing
+    most of their words score high.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dimensions, 1.0 if value >> 63 else -1.0
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            words = normalize_query(text).split()
+            vector = [0.0] * self.dimensions
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                index, sign = self._bucket(feature)
+                vector[index] += sign
+            vectors.append(vector)
+        return vectors
+
+
+class _Namespace:
+    """Unit-normalized query vectors of one namespace, stored as matrix rows"""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.keys: List[str] = []
+        self.entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()  # LRU order
+        self.rows: Dict[str, int] = {}
+        if NUMPY_AVAILABLE:
+            self.matrix = np.empty((16, dimensions), dtype=np.float32)
+        else:
+            self.matrix = []
+
+    def add(self, key: str, vector: Any):
+        row = len(self.keys)
+        if NUMPY_AVAILABLE:
+            if row == len(self.matrix):
+                self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+            self.matrix[row] = vector
+        else:
+            self.matrix.append(vector)
+        self.keys.append(key)
+        self.rows[key] = row
+
+    def remove(self, key: str):
+        """Remove a row by moving the last row into its place"""
+        row = self.rows.pop(key)
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+        self.keys.pop()
+        if not NUMPY_AVAILABLE:
+            self.matrix.pop()
+        del self.entries[key]
+
+    def best_match(self, vector: Any) -> Tuple[Optional[str], float]:
+        """Key of the most similar cached query and its cosine similarity"""
+        if not self.keys:
+            return None, 0.0
+        if NUMPY_AVAILABLE:
+            scores = self.matrix[:len(self.keys)] @ vector
+            row = int(np.argmax(scores))
+            return self.keys[row], float(scores[row])
+        best_row, best_score = 0, -math.inf
+        for row, cached in enumerate(self.matrix):
+            score = sum(a * b for a, b in zip(cached, vector))
+            if score > best_score:
+                best_row, best_score = row, score
+        return self.keys[best_row], best_score
+
+
+class SemanticCache:
+    """
+    Cache of responses keyed on the meaning of the user query.
+
+    Queries are normalized and embedded; a lookup returns the response of the
+    most similar cached query if its cosine similarity reaches ``threshold``.
+    Entries live in namespaces (one per agent by default), each bounded to
+    ``max_entries`` with least-recently-used eviction. Vectors are kept in a
+    NumPy matrix so a lookup is one matrix-vector product (pure Python is used
+    when NumPy is not installed).
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: float = 0.9,
+        max_entries: int = 1000,
+        default_ttl: Optional[float] = None
+    ):
+        """
+        Initialize the semantic cache
+
+        Args:
+            embedder: Callable embedding a list of texts (default: OllamaEmbedder())
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Maximum number of entries per namespace
+            default_ttl: Time-to-live in seconds (None = no expiration)
+        """
+        self.embedder = embedder or OllamaEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.namespaces: Dict[str, _Namespace] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        # Recently embedded queries, so a miss followed by set() embeds once
+        self._recent_vectors: "OrderedDict[str, Any]" = OrderedDict()
+
+    def _embed(self, query: str) -> Any:
+        """Unit-normalized embedding of a normalized query"""
+        with self._lock:
+            vector = self._recent_vectors.get(query)
+            if vector is not None:
+                self._recent_vectors.move_to_end(query)
+                return vector
+
+        raw = self.embedder([query])[0]
+        if NUMPY_AVAILABLE:
+            vector = np.asarray(raw, dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+        else:
+            vector = [float(x) for x in raw]
+            norm = math.sqrt(sum(x * x for x in vector))
+        if norm:
+            vector = vector / norm if NUMPY_AVAILABLE else [x / norm for x in vector]
+
+        with self._lock:
+            self._recent_vectors[query] = vector
+            if len(self._recent_vectors) > 64:
+                self._recent_vectors.popitem(last=False)
+        return vector
+
+    def lookup(self, query: str, namespace: str = "default") -> Optional[Tuple[Any, float]]:
+        """
+        Find the cached response for a similar query
+
+        Returns:
+            (response, similarity) or None on a miss
+        """
+        query = normalize_query(query)
+        vector = self._embed(query)
+        with self._lock:
+            space = self.namespaces.get(namespace)
+            key, score = space.best_match(vector) if space is not None else (None, 0.0)
+            if key is not None and score >= self.threshold:
+                response, expires_at = space.entries[key]
+                if expires_at is None or expires_at > time.time():
+                    space.entries.move_to_end(key)
+                    self.hits += 1
+                    return response, score
+                space.remove(key)
+            self.misses += 1
+            return None
+
+    def get(self, query: str, namespace: str = "default") -> Optional[Any]:
+        """Get the cached response for a similar query, or None"""
+        match = self.lookup(query, namespace)
+        return match[0] if match is not None else None
+
+    def set(self, query: str, response: Any, namespace: str = "default", ttl: Optional[float] = None):
+        """Cache a response for a query"""
+        query = normalize_query(query)
+        vector = self._embed(query)
+        ttl = ttl if ttl is not None else self.default_ttl
+        with self._lock:
+            space = self.namespaces.get(namespace)
+            if space is None:
+                space = self.namespaces[namespace] = _Namespace(len(vector))
+            if query in space.rows:
+                space.remove(query)
+            elif len(space.keys) >= self.max_entries:
+                space.remove(next(iter(space.entries)))
+            space.add(query, vector)
+            space.entries[query] = (response, time.time() + ttl if ttl is not None else None)
+
+    def invalidate(self, query: str, namespace: str = "default"):
+        """Remove the entry for exactly this (normalized) query"""
+        query = normalize_query(query)
+        with self._lock:
+            space = self.namespaces.get(namespace)
+            if space is not None and query in space.rows:
+                space.remove(query)
+
+    def clear(self, namespace: Optional[str] = None):
+        """Clear one namespace, or all of them"""
+        with self._lock:
+            if namespace is None:
+                self.namespaces.clear()
+                self.hits = 0
+                self.misses = 0
+            else:
+                self.namespaces.pop(namespace, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "namespaces": {name: len(space.keys) for name, space in self.namespaces.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 2) if total > 0 else 0,
+                "threshold": self.threshold,
+                "max_entries": self.max_entries
+            }
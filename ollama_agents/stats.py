@@ -25,6 +25,8 @@ class StatType(Enum):
     AGENT_SWITCHES = "agent_switches"
     CACHE_HITS = "cache_hits"
     CACHE_MISSES = "cache_misses"
+    TIME_TO_FIRST_TOKEN = "time_to_first_token"
+    TOKENS_PER_SECOND = "tokens_per_second"
 
 
 class NoOpStatsTracker:
@@ -0,0 +1,121 @@
+"""
+Streaming support for Ollama Agents SDK
+Aggregates streamed chat chunks and measures time-to-first-token and throughput
+"""
+import time
+from typing import Any, List, Optional
+
+from ollama import ChatResponse, Message
+
+from .tracing import PerformanceMetrics
+
+
+class StreamMetrics:
+    """Latency and throughput metrics for a single streamed response"""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.chunk_count = 0
+        self.eval_count: Optional[int] = None
+        self.eval_duration: Optional[int] = None  # Nanoseconds, as reported by Ollama
+
+    def record_chunk(self, delta: str):
+        """Record the arrival of a chunk carrying ``delta`` content"""
+        if delta:
+            self.chunk_count += 1
+            if self.first_token_time is None:
+                self.first_token_time = time.perf_counter()
+
+    def finish(self, final_chunk: Any = None):
+        """Mark the stream as complete, picking up server-side counters if present"""
+        self.end_time = time.perf_counter()
+        if final_chunk is not None:
+            self.eval_count = getattr(final_chunk, 'eval_count', None)
+            self.eval_duration = getattr(final_chunk, 'eval_duration', None)
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """Seconds between the request and the first content delta"""
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    @property
+    def total_time(self) -> Optional[float]:
+        """Seconds between the request and the end of the stream"""
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """
+        Generation throughput. Uses Ollama's eval counters when available,
+        otherwise falls back to content chunks over the generation window.
+        """
+        if self.eval_count and self.eval_duration:
+            return self.eval_count / (self.eval_duration / 1e9)
+        if self.first_token_time is None or self.end_time is None:
+            return None
+        elapsed = self.end_time - self.first_token_time
+        if elapsed <= 0:
+            return None
+        return self.chunk_count / elapsed
+
+    def to_performance_metrics(self) -> PerformanceMetrics:
+        """Convert to tracing performance metrics"""
+        return PerformanceMetrics(
+            tokens_per_second=self.tokens_per_second,
+            response_time=self.total_time,
+            output_throughput=self.tokens_per_second,
+            time_to_first_token=self.time_to_first_token
+        )
+
+
+class StreamAccumulator:
+    """Merges streamed chat chunks back into a single response"""
+
+    def __init__(self):
+        self.content_parts: List[str] = []
+        self.thinking_parts: List[str] = []
+        self.tool_calls: List[Any] = []
+        self.last_chunk: Any = None
+
+    def feed(self, chunk: Any) -> str:
+        """Add a chunk and return its content delta"""
+        self.last_chunk = chunk
+        message = getattr(chunk, 'message', None)
+        if message is None:
+            return ""
+
+        thinking = getattr(message, 'thinking', None)
+        if thinking:
+            self.thinking_parts.append(thinking)
+
+        tool_calls = getattr(message, 'tool_calls', None)
+        if tool_calls:
+            self.tool_calls.extend(tool_calls)
+
+        delta = getattr(message, 'content', None) or ""
+        if delta:
+            self.content_parts.append(delta)
+        return delta
+
+    @property
+    def content(self) -> str:
+        """Content received so far"""
+        return "".join(self.content_parts)
+
+    def build_response(self) -> ChatResponse:
+        """Build a ChatResponse equivalent to a non-streamed call"""
+        message = Message(
+            role='assistant',
+            content=self.content,
+            thinking="".join(self.thinking_parts) or None,
+            tool_calls=self.tool_calls or None
+        )
+        if isinstance(self.last_chunk, ChatResponse):
+            return self.last_chunk.model_copy(update={'message': message})
+        return ChatResponse(message=message, done=True)
@@ -1,67 +1,145 @@
 """
 Tool registration and calling functionality for Ollama agents
 """
+import asyncio
+import contextvars
 import inspect
-from typing import Callable, Dict, Any, List, Optional, get_origin, get_args
-from functools import wraps
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple, get_origin, get_args
+from functools import partial, wraps
 import json
 import re
 
 
+@dataclass
+class ToolCallResult:
+    """Outcome of a single tool call"""
+    name: str
+    arguments: Dict[str, Any]
+    result: Any = None
+    error: Optional[Exception] = None
+    execution_time: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+    @property
+    def content(self) -> str:
+        """Message content to send back to the model"""
+        if self.error is not None:
+            return f"Tool {self.name} failed: {str(self.error)}"
+        return str(self.result)
+
+
+class _CallStart:
+    """When a submitted tool call was queued and when a worker started running it"""
+
+    def __init__(self):
+        self.submitted = time.perf_counter()
+        self.time = self.submitted
+        self.event = threading.Event()
+
+    def set(self):
+        self.time = time.perf_counter()
+        self.event.set()
+
+
 class ToolRegistry:
     """Registry for managing tools that agents can use"""
 
-    def __init__(self):
+    def __init__(self, max_workers: int = 8, tool_timeout: Optional[float] = None,
+                 executor: Optional[Executor] = None):
+        """
+        Initialize the tool registry
+
+        Args:
+            max_workers: Maximum number of sync tools run concurrently in the thread pool
+            tool_timeout: Default per-call timeout in seconds (None = no timeout)
+            executor: Executor for blocking sync tools (defaults to a private thread pool)
+        """
         self.tools: Dict[str, Callable] = {}
+        self.max_workers = max_workers
+        self.tool_timeout = tool_timeout
+        self._executor: Optional[Executor] = executor
+        self._owns_executor = executor is None
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        self._ollama_tools: Optional[List[Dict[str, Any]]] = None
+        self.revision = 0
 
     def register_tool(self, func: Callable):
         """Register a function as a tool"""
         name = func.__name__
         self.tools[name] = func
+        self._invalidate(name)
         return func
 
-    def get_ollama_tools(self) -> List[Dict[str, Any]]:
-        """Get tools in Ollama-compatible format"""
-        ollama_tools = []
-
-        for name, func in self.tools.items():
-            # Extract function signature and docstring
-            sig = inspect.signature(func)
-            docstring = inspect.getdoc(func) or ""
-
-            # Parse parameters with better type detection
-            parameters = {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-
-            for param_name, param in sig.parameters.items():
-                param_info = self._infer_parameter_type(param)
-
-                # Check if parameter has a default value
-                if param.default == inspect.Parameter.empty:
-                    parameters["required"].append(param_name)
+    def unregister_tool(self, name: str):
+        """Remove a tool from the registry"""
+        self.tools.pop(name, None)
+        self._invalidate(name)
 
-                # Extract parameter description from docstring if available
-                param_desc = self._extract_param_description(docstring, param_name)
-                if param_desc:
-                    param_info["description"] = param_desc
+    def _invalidate(self, name: str):
+        """Drop cached schemas after the tool set changed"""
+        self._schemas.pop(name, None)
+        self._ollama_tools = None
+        self.revision += 1
 
-                parameters["properties"][param_name] = param_info
-
-            tool_def = {
-                "type": "function",
-                "function": {
-                    "name": name,
-                    "description": docstring.split('\n\n')[0] if docstring else "",  # First line as description
-                    "parameters": parameters
-                }
+    def get_ollama_tools(self) -> List[Dict[str, Any]]:
+        """
+        Get tools in Ollama-compatible format.
+        Schemas are built once per tool and reused until the tool set changes.
+        """
+        if self._ollama_tools is None:
+            self._ollama_tools = [self.get_tool_schema(name) for name in self.tools]
+        return list(self._ollama_tools)
+
+    def get_tool_schema(self, name: str) -> Dict[str, Any]:
+        """Get the Ollama schema of a single tool, building it on first use"""
+        schema = self._schemas.get(name)
+        if schema is None:
+            schema = self._schemas[name] = self._build_tool_schema(name, self.tools[name])
+        return schema
+
+    def _build_tool_schema(self, name: str, func: Callable) -> Dict[str, Any]:
+        """Build a tool definition from the function signature and docstring"""
+        # Extract function signature and docstring
+        sig = inspect.signature(func)
+        docstring = inspect.getdoc(func) or ""
+
+        # Parse parameters with better type detection
+        parameters = {
+            "type": "object",
+            "properties": {},
+            "required": []
+        }
+
+        for param_name, param in sig.parameters.items():
+            param_info = self._infer_parameter_type(param)
+
+            # Check if parameter has a default value
+            if param.default == inspect.Parameter.empty:
+                parameters["required"].append(param_name)
+
+            # Extract parameter description from docstring if available
+            param_desc = self._extract_param_description(docstring, param_name)
+            if param_desc:
+                param_info["description"] = param_desc
+
+            parameters["properties"][param_name] = param_info
+
+        tool_def = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": docstring.split('\n\n')[0] if docstring else "",  # First line as description
+                "parameters": parameters
             }
-
-            ollama_tools.append(tool_def)
-
-        return ollama_tools
+        }
+        return tool_def
 
     def _infer_parameter_type(self, param: inspect.Parameter) -> Dict[str, Any]:
         """Infer parameter type from annotation"""
@@ -182,13 +260,218 @@ class ToolRegistry:
             # Execute without timing if no tracer provided
             return func(**arguments)
 
+    def is_async_tool(self, name: str) -> bool:
+        """Check whether a registered tool is a coroutine function"""
+        return asyncio.iscoroutinefunction(self.tools[name])
+
+    def is_blocking_tool(self, name: str) -> bool:
+        """Check whether a sync tool must be kept off the event loop (see ``@tool(blocking=...)``)"""
+        return getattr(self.tools[name], '_blocking', True)
+
+    def _get_executor(self) -> Executor:
+        """Get the executor used for sync tools, creating the default pool on first use"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="ollama-agents-tool")
+        return self._executor
+
+    def _call_sync(self, name: str, arguments: Dict[str, Any]) -> ToolCallResult:
+        """Call a tool from a thread with no running event loop"""
+        start_time = time.perf_counter()
+        try:
+            if name not in self.tools:
+                raise ValueError(f"Tool '{name}' not found in registry")
+            result = self.tools[name](**arguments)
+            if inspect.isawaitable(result):
+                result = asyncio.run(result)
+            return ToolCallResult(name, arguments, result=result,
+                                  execution_time=time.perf_counter() - start_time)
+        except Exception as e:
+            return ToolCallResult(name, arguments, error=e,
+                                  execution_time=time.perf_counter() - start_time)
+
+    def execute_tool_calls(self, tool_calls: Sequence[Tuple[str, Dict[str, Any]]],
+                           timeout: Optional[float] = None) -> List[ToolCallResult]:
+        """
+        Execute several tool calls concurrently in a bounded thread pool
+
+        Args:
+            tool_calls: (name, arguments) pairs
+            timeout: Per-call timeout in seconds (defaults to ``tool_timeout``), counted
+                from when the call starts running; a call that waits longer than this
+                for a free worker is dropped
+
+        Returns:
+            One ToolCallResult per call, in the order the calls were given
+        """
+        timeout = timeout if timeout is not None else self.tool_timeout
+        if len(tool_calls) == 1 and timeout is None and self._can_call_inline(tool_calls[0][0]):
+            # Nothing to overlap - skip the thread hop
+            name, arguments = tool_calls[0]
+            return [self._call_sync(name, arguments)]
+
+        futures = [self._submit(name, arguments) for name, arguments in tool_calls]
+        return self._collect([(name, arguments, future)
+                              for (name, arguments), future in zip(tool_calls, futures)], timeout)
+
+    def _can_call_inline(self, name: str) -> bool:
+        """
+        Whether _call_sync may run in this thread: async tools need asyncio.run(),
+        which fails on a thread with a running event loop (sync chat() called from async code)
+        """
+        func = self.tools.get(name)
+        if func is None or not asyncio.iscoroutinefunction(func):
+            return True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return True
+        return False
+
+    def _submit(self, name: str, arguments: Dict[str, Any]) -> Future:
+        """Start a tool call in the executor; the future's ``started`` tracks when a worker picks it up"""
+        started = _CallStart()
+        context = contextvars.copy_context()
+
+        def run() -> ToolCallResult:
+            started.set()
+            # Tools run in the caller's context, so they can see its deadline
+            return context.run(self._call_sync, name, arguments)
+
+        future = self._get_executor().submit(run)
+        future.started = started
+        return future
+
+    def _collect(self, calls: Sequence[Tuple[str, Dict[str, Any], Future]],
+                 timeout: Optional[float]) -> List[ToolCallResult]:
+        """
+        Wait for submitted (name, arguments, future) calls, each within timeout of
+        starting to run; time spent queued behind other calls does not count
+        """
+        results = []
+        for name, arguments, future in calls:
+            started = future.started
+            remaining = None
+            if timeout is not None:
+                queued = max(0.0, started.submitted + timeout - time.perf_counter())
+                if not started.event.wait(queued) and future.cancel():
+                    results.append(ToolCallResult(name, arguments,
+                                                  error=TimeoutError(f"no free worker within {timeout}s"),
+                                                  execution_time=0.0))
+                    continue
+                started.event.wait()  # Picked up just as the wait ran out
+                remaining = max(0.0, started.time + timeout - time.perf_counter())
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                # The worker cannot be interrupted; its eventual result is discarded
+                results.append(ToolCallResult(name, arguments,
+                                              error=TimeoutError(f"timed out after {timeout}s"),
+                                              execution_time=time.perf_counter() - started.time))
+        return results
+
+    async def _invoke_async(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Run a tool without blocking the event loop: coroutine tools are awaited,
+        non-blocking sync tools run inline and blocking ones go to the executor.
+        """
+        func = self.tools[name]
+        if asyncio.iscoroutinefunction(func):
+            return await func(**arguments)
+        if self.is_blocking_tool(name):
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(),
+                                                contextvars.copy_context().run, partial(func, **arguments))
+        else:
+            result = func(**arguments)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def aexecute_tool(self, name: str, arguments: Dict[str, Any], tracer=None) -> Any:
+        """Asynchronously execute a registered tool with given arguments"""
+        if name not in self.tools:
+            raise ValueError(f"Tool '{name}' not found in registry")
 
-def tool(description: Optional[str] = None):
+        start_time = time.time()
+        try:
+            result = await self._invoke_async(name, arguments)
+        except Exception as e:
+            if tracer:
+                tracer.log_event(
+                    "tool.execution.error",
+                    data={
+                        "tool_name": name,
+                        "arguments": arguments,
+                        "error": str(e),
+                        "execution_time": time.time() - start_time
+                    }
+                )
+            raise
+
+        if tracer:
+            tracer.log_event(
+                "tool.execution",
+                data={
+                    "tool_name": name,
+                    "arguments": arguments,
+                    "result_type": type(result).__name__,
+                    "execution_time": time.time() - start_time
+                }
+            )
+        return result
+
+    async def _acall(self, name: str, arguments: Dict[str, Any],
+                     timeout: Optional[float]) -> ToolCallResult:
+        """Call a single tool from the event loop"""
+        start_time = time.perf_counter()
+        try:
+            if name not in self.tools:
+                raise ValueError(f"Tool '{name}' not found in registry")
+            result = await asyncio.wait_for(self._invoke_async(name, arguments), timeout)
+            return ToolCallResult(name, arguments, result=result,
+                                  execution_time=time.perf_counter() - start_time)
+        except asyncio.TimeoutError:
+            return ToolCallResult(name, arguments, error=TimeoutError(f"timed out after {timeout}s"),
+                                  execution_time=time.perf_counter() - start_time)
+        except Exception as e:
+            return ToolCallResult(name, arguments, error=e,
+                                  execution_time=time.perf_counter() - start_time)
+
+    async def aexecute_tool_calls(self, tool_calls: Sequence[Tuple[str, Dict[str, Any]]],
+                                  timeout: Optional[float] = None) -> List[ToolCallResult]:
+        """
+        Execute several tool calls concurrently with asyncio.gather.
+        Async tools are awaited, blocking sync tools run in the executor.
+
+        Args:
+            tool_calls: (name, arguments) pairs
+            timeout: Per-call timeout in seconds (defaults to ``tool_timeout``)
+
+        Returns:
+            One ToolCallResult per call, in the order the calls were given
+        """
+        timeout = timeout if timeout is not None else self.tool_timeout
+        return list(await asyncio.gather(
+            *(self._acall(name, arguments, timeout) for name, arguments in tool_calls)
+        ))
+
+    def shutdown(self, wait: bool = True):
+        """Shut down the tool thread pool (a caller-supplied executor is left running)"""
+        if self._executor is not None and self._owns_executor:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def tool(description: Optional[str] = None, blocking: bool = True):
     """
     Decorator to register a function as a tool with optional description
 
     Args:
         description: Optional description for the tool (overrides function docstring)
+        blocking: Whether a sync tool blocks (network, disk, subprocesses). Blocking tools
+            are offloaded to the tool executor when called from async code; pass False for
+            cheap pure functions so they run inline on the event loop. Ignored for async tools.
     """
     def decorator(func: Callable) -> Callable:
         # If description is provided, attach it to the function
@@ -200,14 +483,21 @@ def tool(description: Optional[str] = None):
                 # Prepend the description to the existing docstring
                 func.__doc__ = f"{description}\n\n{func.__doc__}"
 
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
+        if asyncio.iscoroutinefunction(func):
+            # Keep coroutine tools detectable as coroutine functions
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await func(*args, **kwargs)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return func(*args, **kwargs)
 
         wrapper._is_tool = True
+        wrapper._blocking = blocking
         wrapper.__name__ = func.__name__
         wrapper.__doc__ = func.__doc__
 
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator
@@ -38,6 +38,7 @@ class PerformanceMetrics:
     processing_time: Optional[float] = None
     input_throughput: Optional[float] = None  # Tokens per second for input
     output_throughput: Optional[float] = None  # Tokens per second for output
+    time_to_first_token: Optional[float] = None  # Seconds until the first streamed token
 
 
 @dataclass
@@ -169,7 +170,8 @@ class TraceStore:
                     "response_time": event.performance.response_time,
                     "processing_time": event.performance.processing_time,
                     "input_throughput": event.performance.input_throughput,
-                    "output_throughput": event.performance.output_throughput
+                    "output_throughput": event.performance.output_throughput,
+                    "time_to_first_token": event.performance.time_to_first_token
                 }
             
             export_data.append(event_dict)
@@ -0,0 +1,569 @@
+"""
+Turn engine shared by Agent.chat and Agent.achat.
+
+A turn is written once as a generator-based state machine that yields the I/O
+it needs (a chat request or a batch of tool calls) and is resumed with the
+result. The sync and async drivers only differ in how they fulfil those
+requests, so both paths run the exact same tool loop, parsers and hooks.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, Generator, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from ollama import Message
+
+from .deadline import DeadlineExceeded, current_deadline
+from .stats import StatType
+from .tools import ToolCallResult, ToolRegistry
+from .logger import get_logger
+
+if TYPE_CHECKING:
+    from .agent import Agent
+
+
+class TurnPhase(Enum):
+    """Phases of a single agent turn"""
+    PREPARE = "prepare"            # Building messages, tools and options
+    NETWORK = "network"            # Waiting on the Ollama server
+    TOOLS = "tools"                # Executing tool calls
+    POST_PROCESS = "post_process"  # Recording the reply and building the result
+
+
+# A parser receives the assistant message and returns the tool calls it contains
+ToolCallParser = Callable[[Any], List[Any]]
+
+# A phase hook receives the phase, its duration in seconds and the agent name
+PhaseHook = Callable[[TurnPhase, float, str], None]
+
+
+def native_tool_call_parser(message: Any) -> List[Any]:
+    """Tool calls reported by Ollama in ``message.tool_calls``"""
+    return list(getattr(message, 'tool_calls', None) or [])
+
+
+class IncrementalJSONScanner:
+    """
+    Finds complete top-level JSON objects in text that arrives in pieces.
+
+    Each piece is scanned once, resuming from the state the previous one left
+    (nesting depth, inside a string, pending escape). Only structural
+    characters (braces, quotes and backslashes) are visited, found with one
+    precompiled regex. The pieces of an open object are kept in a list and
+    joined and decoded once, when its closing brace arrives.
+    """
+    _STRUCTURAL = re.compile(r'[{}"\\]')
+    _PREFIX_TAIL = 16  # Text kept before an object, enough to recognise a code fence
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False  # The next piece starts with an escaped character
+        self._parts: List[str] = []  # Pieces of the open object
+        self._tail = ""  # End of the text since the last object
+        self._prefix = ""  # Tail before the open object
+        self._leading = True  # Only whitespace so far before the open (or next) object
+
+    def feed(self, text: str) -> List[Tuple[Any, bool, str]]:
+        """
+        Add text and return the objects it completes as (value, leading, prefix):
+        ``leading`` is True when only whitespace came before the object and
+        ``prefix`` ends with the text just before it.
+        """
+        found = []
+        if not text:
+            return found
+        pos = 0
+        if self._escape:
+            self._escape = False
+            pos = 1
+        start = 0 if self._depth else None  # Where the open object starts in this piece
+        between = 0  # Where the text after the last object starts in this piece
+        search = self._STRUCTURAL.search
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            i = match.start()
+            char = text[i]
+            pos = i + 1
+            if self._in_string:
+                if char == '\\':
+                    pos += 1  # Skip the escaped character
+                    self._escape = pos > len(text)
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = self._depth > 0  # Quotes in prose between objects are not strings
+            elif char == '{':
+                if self._depth == 0:
+                    self._open(text[between:i])
+                    start = i
+                self._depth += 1
+            elif char == '}' and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(text[start:pos])
+                    found.extend(self._close())
+                    start, between = None, pos
+
+        if self._depth:
+            self._parts.append(text[start:])
+        else:
+            self._skip(text[between:])
+        return found
+
+    def _skip(self, text: str):
+        """Text between objects: only whether it is blank and its tail matter"""
+        if self._leading and text.strip():
+            self._leading = False
+        self._tail = (self._tail + text)[-self._PREFIX_TAIL:]
+
+    def _open(self, text: str):
+        self._skip(text)
+        self._prefix, self._tail = self._tail, ""
+
+    def _close(self) -> List[Tuple[Any, bool, str]]:
+        candidate, self._parts = "".join(self._parts), []
+        leading, self._leading = self._leading, False
+        try:
+            return [(json.loads(candidate), leading, self._prefix)]
+        except ValueError:
+            return []  # Braces in prose, not JSON
+
+
+_CODE_FENCE = re.compile(r'```(?:json)?\s*$')
+
+
+def _content_tool_call(value: Any, leading: bool, prefix: str) -> Optional[Any]:
+    """A tool call from a JSON object in content that opens the reply or a code block"""
+    if not (leading or _CODE_FENCE.search(prefix)):
+        return None
+    if isinstance(value, dict) and 'name' in value and isinstance(value.get('arguments'), dict):
+        return Message.ToolCall(function=Message.ToolCall.Function(
+            name=value['name'], arguments=value['arguments']
+        ))
+    return None
+
+
+def json_content_tool_call_parser(message: Any) -> List[Any]:
+    """
+    Fallback for models without native tool calling that answer with a JSON
+    object such as ``{"name": ..., "arguments": {...}}``, either at the start
+    of the reply or inside a markdown code block.
+    """
+    content = getattr(message, 'content', None)
+    if not content:
+        return []
+    for value, leading, prefix in IncrementalJSONScanner().feed(content):
+        tool_call = _content_tool_call(value, leading, prefix)
+        if tool_call is not None:
+            return [tool_call]
+    return []
+
+
+DEFAULT_TOOL_CALL_PARSERS: List[ToolCallParser] = [native_tool_call_parser, json_content_tool_call_parser]
+
+
+# Identifies a tool call across stream attempts: (name, canonical arguments, occurrence)
+ToolCallKey = Tuple[str, str, int]
+
+
+class _CallKeys:
+    """Numbers repeated identical calls so each occurrence gets its own key"""
+
+    def __init__(self):
+        self._seen: Dict[Tuple[str, str], int] = {}
+
+    def key(self, name: str, arguments: Dict[str, Any]) -> ToolCallKey:
+        call = (name, json.dumps(arguments, sort_keys=True, default=str))
+        occurrence = self._seen.get(call, 0)
+        self._seen[call] = occurrence + 1
+        return call + (occurrence,)
+
+
+class StreamingToolCallParser:
+    """
+    Finds tool calls in a chat stream as soon as each one is complete.
+    Native calls arrive whole in a chunk's ``message.tool_calls``; a JSON call
+    in the content is complete when the scanner sees its closing brace.
+    As in DEFAULT_TOOL_CALL_PARSERS, native calls take precedence: once one is
+    seen (``native_seen``) the content is no longer scanned.
+    """
+
+    def __init__(self, native: bool = True, content: bool = True):
+        self.native = native
+        self.content = content
+        self.native_seen = False
+        self._scanner = IncrementalJSONScanner()
+        self._native_keys = _CallKeys()
+        self._content_keys = _CallKeys()
+        self._content_call_found = False
+
+    def feed(self, chunk: Any) -> List[Tuple[ToolCallKey, Any]]:
+        """
+        Add a chunk and return the (key, tool call) pairs it completes.
+        A chunk yields native calls or content calls, never both.
+        """
+        message = getattr(chunk, 'message', None)
+        if message is None:
+            return []
+        tool_calls = list(getattr(message, 'tool_calls', None) or []) if self.native else []
+        if tool_calls:
+            self.native_seen = True
+            keys = self._native_keys
+        else:
+            keys = self._content_keys
+            delta = getattr(message, 'content', None)
+            if self.content and delta and not self.native_seen and not self._content_call_found:
+                for value, leading, prefix in self._scanner.feed(delta):
+                    tool_call = _content_tool_call(value, leading, prefix)
+                    if tool_call is not None:
+                        # Like json_content_tool_call_parser, only the first one counts
+                        tool_calls.append(tool_call)
+                        self._content_call_found = True
+                        break
+        return [(keys.key(tool_call.function.name, tool_call.function.arguments), tool_call)
+                for tool_call in tool_calls]
+
+
+class EarlyToolDispatcher:
+    """
+    Starts tool calls while the model is still streaming, so tool latency
+    overlaps with generation, and hands their results to the turn's tool step.
+
+    Calls are matched by name, arguments and occurrence: a call seen by several
+    stream attempts (retries, hedged requests) runs once, calls the final
+    response does not contain are discarded, and calls that were not started
+    early run as usual. Content calls are only started until any attempt sees
+    a native call; those already started are then discarded, since the turn
+    will use the native ones.
+    """
+
+    def __init__(self, registry: ToolRegistry, timeout: Optional[float] = None,
+                 native: bool = True, content: bool = True):
+        self.registry = registry
+        self.timeout = timeout if timeout is not None else registry.tool_timeout
+        self.native = native
+        self.content = content
+        self._started: Dict[ToolCallKey, Any] = {}
+        self._content_started: Set[ToolCallKey] = set()
+        self._native_seen = False
+        self._lock = threading.Lock()
+        self.dispatched = 0
+
+    def watch(self) -> Callable[[Any], None]:
+        """Chunk callback for one stream attempt (each attempt parses independently)"""
+        parser = StreamingToolCallParser(native=self.native, content=self.content)
+
+        def on_chunk(chunk: Any):
+            pairs = parser.feed(chunk)
+            native = parser.native_seen
+            dropped = []
+            with self._lock:
+                if native and not self._native_seen:
+                    # The turn will use the native calls; an identical content call counts as one
+                    self._native_seen = True
+                    unused = self._content_started - {key for key, _ in pairs}
+                    dropped = [self._started.pop(key) for key in unused if key in self._started]
+                    self._content_started.clear()
+                started = []
+                for key, tool_call in pairs:
+                    if key in self._started or (self._native_seen and not native):
+                        continue
+                    self._started[key] = self._start(tool_call.function.name, tool_call.function.arguments)
+                    self.dispatched += 1
+                    if not native:
+                        self._content_started.add(key)
+                    started.append(tool_call.function.name)
+            for item in dropped:
+                self._discard(item)
+            if dropped:
+                get_logger().debug(f"⚡ Dropped {len(dropped)} content tool call(s) superseded by native ones")
+            for name in started:
+                get_logger().debug(f"⚡ Dispatched {name} before the response finished")
+
+        return on_chunk
+
+    def _start(self, name: str, arguments: Dict[str, Any]) -> Any:
+        return self.registry._submit(name, arguments)
+
+    def _claim(self, tool_calls: List[Tuple[str, Dict[str, Any]]]) -> List[Optional[Any]]:
+        """The started call for each (name, arguments) pair, or None; the rest are discarded"""
+        keys = _CallKeys()
+        with self._lock:
+            claimed = [self._started.pop(keys.key(name, arguments), None) for name, arguments in tool_calls]
+            leftover, self._started = list(self._started.values()), {}
+            self._content_started.clear()
+        for started in leftover:
+            self._discard(started)
+        return claimed
+
+    def _discard(self, started: Any):
+        started.cancel()  # Only stops calls still queued in the executor
+
+    def discard(self):
+        """Drop calls that were started but will not be used"""
+        self._claim([])
+
+    def collect(self, tool_calls: List[Tuple[str, Dict[str, Any]]]) -> List[ToolCallResult]:
+        """Results for the turn's tool calls, in order, reusing the ones started early"""
+        claimed = self._claim(tool_calls)
+        missing = [call for call, started in zip(tool_calls, claimed) if started is None]
+        late = iter(self.registry.execute_tool_calls(missing, timeout=self.timeout) if missing else [])
+        early = iter(self.registry._collect(
+            [(name, arguments, started) for (name, arguments), started in zip(tool_calls, claimed)
+             if started is not None], self.timeout))
+        return [next(late) if started is None else next(early) for started in claimed]
+
+
+class AsyncEarlyToolDispatcher(EarlyToolDispatcher):
+    """EarlyToolDispatcher for async turns: early calls run as tasks on the event loop"""
+
+    def _start(self, name: str, arguments: Dict[str, Any]) -> Any:
+        return asyncio.ensure_future(self.registry._acall(name, arguments, self.timeout))
+
+    async def acollect(self, tool_calls: List[Tuple[str, Dict[str, Any]]]) -> List[ToolCallResult]:
+        """Results for the turn's tool calls, in order, reusing the ones started early"""
+        claimed = self._claim(tool_calls)
+        missing = [call for call, started in zip(tool_calls, claimed) if started is None]
+        late, *early = await asyncio.gather(
+            self.registry.aexecute_tool_calls(missing, timeout=self.timeout),
+            *(started for started in claimed if started is not None)
+        )
+        late, early = iter(late), iter(early)
+        return [next(late) if started is None else next(early) for started in claimed]
+
+
+@dataclass
+class ChatRequest:
+    """A chat request the turn is waiting on"""
+    params: Dict[str, Any]
+
+
+@dataclass
+class ToolRequest:
+    """A batch of tool calls the turn is waiting on"""
+    tool_calls: List[Any]
+
+
+@dataclass
+class TurnState:
+    """Mutable state of a turn in progress"""
+    message: str
+    iteration: int = 0
+    response: Any = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    used_tools: bool = False  # A tool ran in this turn, so the reply depends on its results
+    dispatcher: Optional[EarlyToolDispatcher] = None  # Tool calls started during the last streamed response
+
+
+class TurnEngine:
+    """Runs one user turn (request, tool loop, final reply) for an agent"""
+
+    def __init__(self, agent: Agent, max_tool_iterations: int = 5,
+                 parsers: Optional[List[ToolCallParser]] = None,
+                 phase_hooks: Optional[List[PhaseHook]] = None):
+        self.agent = agent
+        self.max_tool_iterations = max_tool_iterations
+        self.parsers = list(parsers) if parsers is not None else list(DEFAULT_TOOL_CALL_PARSERS)
+        self.phase_hooks: List[PhaseHook] = phase_hooks if phase_hooks is not None else []
+        self.logger = get_logger()
+
+    def add_phase_hook(self, hook: PhaseHook):
+        """Register a callback invoked with the duration of every phase"""
+        self.phase_hooks.append(hook)
+
+    def parse_tool_calls(self, message: Any) -> List[Any]:
+        """Return tool calls from the first parser that finds any"""
+        for parser in self.parsers:
+            tool_calls = parser(message)
+            if tool_calls:
+                return tool_calls
+        return []
+
+    @contextmanager
+    def phase(self, phase: TurnPhase, state: Optional[TurnState] = None):
+        """Time a phase and report it to hooks and the tracer"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            if state is not None:
+                state.timings[phase.value] = state.timings.get(phase.value, 0.0) + duration
+            for hook in self.phase_hooks:
+                hook(phase, duration, self.agent.name)
+            self.agent.tracer.log_event("turn.phase", agent_id=self.agent.name,
+                                        data={"phase": phase.value, "duration": duration})
+
+    def _steps(self, state: TurnState, tools: Optional[List[Callable]]) -> Generator[Any, Any, Dict[str, Any]]:
+        """The turn state machine. Yields ChatRequest/ToolRequest and returns the result dict."""
+        agent = self.agent
+
+        with self.phase(TurnPhase.PREPARE, state):
+            agent.add_message("user", state.message)
+            chat_params = agent._build_chat_params(tools)
+
+        state.response = yield ChatRequest(chat_params)
+
+        while state.iteration < self.max_tool_iterations:
+            state.iteration += 1
+            self.logger.debug(f"🔄 Tool execution iteration {state.iteration}/{self.max_tool_iterations}")
+
+            tool_calls = self.parse_tool_calls(state.response.message)
+            if not tool_calls:
+                self.logger.info(f"ℹ️  No tool calls found in response from {agent.name}")
+                break
+
+            self.logger.info(f"✅ Found {len(tool_calls)} tool call(s) to execute")
+            agent.add_message("assistant", state.response.message.content)
+            agent._log_tool_calls(tool_calls)
+
+            results: List[ToolCallResult] = yield ToolRequest(tool_calls)
+            state.used_tools = True
+            agent._record_tool_results(results)
+
+            self.logger.info(f"🔄 Making follow-up call to process tool results...")
+            state.response = yield ChatRequest(chat_params)
+
+        with self.phase(TurnPhase.POST_PROCESS, state):
+            response = state.response
+            agent.add_message("assistant", response.message.content)
+            agent.stats_tracker.increment(StatType.CONVERSATION_TURNS, 1, agent_id=agent.name)
+            return {
+                "content": response.message.content,
+                "tool_calls": getattr(response.message, 'tool_calls', None),
+                "raw_response": response,
+                "used_tools": state.used_tools
+            }
+
+    @staticmethod
+    def _as_call_pairs(tool_calls: List[Any]):
+        return [(tool_call.function.name, tool_call.function.arguments) for tool_call in tool_calls]
+
+    def _tool_timeout(self) -> Optional[float]:
+        """Per-call tool timeout, shortened to what is left of the current deadline"""
+        timeout = self.agent.tool_registry.tool_timeout
+        deadline = current_deadline()
+        return timeout if deadline is None else deadline.bound(timeout)
+
+    def early_dispatcher(self, params: Dict[str, Any],
+                         asynchronous: bool = False) -> Optional[EarlyToolDispatcher]:
+        """
+        A dispatcher that starts tool calls while ``params``' response streams in,
+        or None when the request is not streamed or its calls cannot be recognised early
+        """
+        native = native_tool_call_parser in self.parsers
+        content = json_content_tool_call_parser in self.parsers
+        if native and content and (self.parsers.index(json_content_tool_call_parser)
+                                   < self.parsers.index(native_tool_call_parser)):
+            native = False  # Content calls take precedence, so native ones are only known at the end
+        if not (params.get('stream') and self.agent.early_tool_dispatch and (native or content)):
+            return None
+        if not self.agent.tool_registry.tools:
+            return None
+        dispatcher_class = AsyncEarlyToolDispatcher if asynchronous else EarlyToolDispatcher
+        return dispatcher_class(self.agent.tool_registry, timeout=self._tool_timeout(),
+                                native=native, content=content)
+
+    def _partial(self, state: TurnState, error: DeadlineExceeded, span: Any) -> Dict[str, Any]:
+        """Result of a turn cut short by its deadline: whatever the model said last"""
+        self.logger.warning(f"⏱️ Turn of {self.agent.name} stopped after {state.iteration} tool iteration(s): {error}")
+        self.agent.tracer.log_event("turn.deadline_exceeded", agent_id=self.agent.name,
+                                    data={"iteration": state.iteration, "error": str(error)})
+        self._finish(state, span)
+        message = getattr(state.response, 'message', None)
+        return {
+            "content": (getattr(message, 'content', None) or "") if message is not None else "",
+            "tool_calls": None,
+            "raw_response": state.response,
+            "used_tools": state.used_tools,
+            "deadline_exceeded": True
+        }
+
+    def run(self, message: str, tools: Optional[List[Callable]] = None,
+            span: Any = None) -> Dict[str, Any]:
+        """Drive a turn synchronously"""
+        state = TurnState(message=message)
+        steps = self._steps(state, tools)
+        value, error = None, None
+        try:
+            while True:
+                try:
+                    request = steps.throw(error) if error is not None else steps.send(value)
+                except StopIteration as stop:
+                    self._finish(state, span)
+                    return stop.value
+                except DeadlineExceeded as e:
+                    return self._partial(state, e, span)
+
+                value, error = None, None
+                try:
+                    if isinstance(request, ChatRequest):
+                        with self.phase(TurnPhase.NETWORK, state):
+                            state.dispatcher = self.early_dispatcher(request.params)
+                            value = self.agent._send_chat(request.params, dispatcher=state.dispatcher)
+                    else:
+                        with self.phase(TurnPhase.TOOLS, state):
+                            pairs = self._as_call_pairs(request.tool_calls)
+                            if state.dispatcher is not None:
+                                value = state.dispatcher.collect(pairs)
+                            else:
+                                value = self.agent.tool_registry.execute_tool_calls(
+                                    pairs, timeout=self._tool_timeout()
+                                )
+                except Exception as e:
+                    error = e
+        finally:
+            if state.dispatcher is not None:
+                state.dispatcher.discard()
+
+    async def arun(self, message: str, tools: Optional[List[Callable]] = None,
+                   span: Any = None) -> Dict[str, Any]:
+        """Drive a turn asynchronously"""
+        state = TurnState(message=message)
+        steps = self._steps(state, tools)
+        value, error = None, None
+        try:
+            while True:
+                try:
+                    request = steps.throw(error) if error is not None else steps.send(value)
+                except StopIteration as stop:
+                    self._finish(state, span)
+                    return stop.value
+                except DeadlineExceeded as e:
+                    return self._partial(state, e, span)
+
+                value, error = None, None
+                try:
+                    if isinstance(request, ChatRequest):
+                        with self.phase(TurnPhase.NETWORK, state):
+                            state.dispatcher = self.early_dispatcher(request.params, asynchronous=True)
+                            value = await self.agent._asend_chat(request.params, dispatcher=state.dispatcher)
+                    else:
+                        with self.phase(TurnPhase.TOOLS, state):
+                            pairs = self._as_call_pairs(request.tool_calls)
+                            if state.dispatcher is not None:
+                                value = await state.dispatcher.acollect(pairs)
+                            else:
+                                value = await self.agent.tool_registry.aexecute_tool_calls(
+                                    pairs, timeout=self._tool_timeout()
+                                )
+                except Exception as e:
+                    error = e
+        finally:
+            if state.dispatcher is not None:
+                state.dispatcher.discard()
+
+    def _finish(self, state: TurnState, span: Any):
+        """Attach per-phase timings to the turn's trace span"""
+        if span is not None:
+            span.data.update({"phase_timings": dict(state.timings),
+                              "tool_iterations": state.iteration})
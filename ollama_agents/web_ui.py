@@ -4,6 +4,7 @@ Provides a Flask-based web interface for managing and monitoring agents.
 """
 
 import json
+import math
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from dataclasses import asdict
@@ -15,6 +16,7 @@ except ImportError:
     FLASK_AVAILABLE = False
 
 from .agent import Agent
+from .admission import AdmissionController, OverloadedError, Priority, admission_context
 from .stats import get_stats_tracker
 from .logger import get_logger
 
@@ -24,12 +26,15 @@ logger = get_logger()
 class AgentManager:
     """Manages multiple agents for the Web UI"""
     
-    def __init__(self):
+    def __init__(self, admission: Optional[AdmissionController] = None):
         self.agents: Dict[str, Agent] = {}
         self.conversations: Dict[str, List[Dict]] = {}
+        self.admission = admission
     
     def add_agent(self, agent: Agent):
         """Add an agent to the manager"""
+        if self.admission is not None and agent.admission is None:
+            agent.admission = self.admission
         self.agents[agent.name] = agent
         self.conversations[agent.name] = []
         logger.info(f"➕ Added agent to manager: {agent.name}")
@@ -57,22 +62,27 @@ class AgentManager:
             for agent in self.agents.values()
         ]
     
-    def chat(self, agent_name: str, message: str) -> Dict[str, Any]:
-        """Send a message to an agent"""
+    def chat(self, agent_name: str, message: str, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """Send a message to an agent (as interactive traffic of ``tenant``)"""
         agent = self.get_agent(agent_name)
         if not agent:
             return {"error": "Agent not found"}
         
+        sent_at = datetime.now().isoformat()
+        try:
+            with admission_context(priority=Priority.INTERACTIVE, tenant=tenant):
+                response = agent.chat(message)
+        except OverloadedError as e:
+            logger.warning(f"🚦 Rejected chat for {agent_name}: {e}")
+            return {"error": str(e), "overloaded": True, "retry_after": e.retry_after}
+        
         # Add user message to conversation
         self.conversations[agent_name].append({
             "role": "user",
             "content": message,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": sent_at
         })
         
-        # Get response
-        response = agent.chat(message)
-        
         # Add agent response to conversation
         self.conversations[agent_name].append({
             "role": "assistant",
@@ -372,7 +382,10 @@ def create_web_ui(agent_manager: AgentManager, host: str = "0.0.0.0", port: int
         if not agent_name or not message:
             return jsonify({"error": "Missing agent or message"}), 400
         
-        response = agent_manager.chat(agent_name, message)
+        response = agent_manager.chat(agent_name, message, tenant=data.get('tenant') or request.remote_addr)
+        if response.get("overloaded"):
+            # Tell clients to back off instead of letting them time out
+            return jsonify(response), 503, {"Retry-After": str(math.ceil(min(max(response["retry_after"], 1), 3600)))}
         return jsonify(response)
     
     @app.route('/api/stats')
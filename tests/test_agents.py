@@ -1,9 +1,10 @@
 """
 Tests for the Ollama Agents SDK
 """
+import time
 import pytest
 from unittest.mock import Mock, patch
-from ollama_agents import Agent, AgentHandoff, tool, ThinkingMode, ThinkingManager, ModelSettings
+from ollama_agents import Agent, AgentHandoff, tool, ThinkingMode, ThinkingManager, ModelSettings, TruncationStrategy
 
 
 class TestAgent:
@@ -91,6 +92,1992 @@ class TestAgent:
         assert triage_agent.handoff_manager.current_agent_id == "triage_agent"
 
 
+class TestStreaming:
+    """Tests for token streaming"""
+
+    @staticmethod
+    def _chunks(*parts, tool_calls=None):
+        from ollama import ChatResponse, Message
+        chunks = [ChatResponse(message=Message(role="assistant", content=part), done=False) for part in parts]
+        chunks.append(ChatResponse(
+            message=Message(role="assistant", content="", tool_calls=tool_calls),
+            done=True, eval_count=len(parts), eval_duration=int(1e9)
+        ))
+        return chunks
+
+    def test_chat_stream_yields_deltas(self):
+        """Test that chat_stream yields content deltas and records the reply"""
+        from ollama_agents.stats import StatsTracker, StatType
+        agent = Agent(name="test_agent")
+        agent.stats_tracker = StatsTracker()
+
+        with patch.object(agent.client, 'chat', return_value=iter(self._chunks("Hel", "lo"))):
+            deltas = list(agent.chat_stream("Hi"))
+
+        assert deltas == ["Hel", "lo"]
+        assert agent.messages[-1] == {"role": "assistant", "content": "Hello"}
+        assert agent.stats_tracker.get(StatType.TIME_TO_FIRST_TOKEN) > 0
+        assert agent.stats_tracker.get(StatType.TOKENS_PER_SECOND) == 2.0
+
+    def test_chat_stream_runs_tools_between_turns(self):
+        """Test that tool calls are executed before the next streamed turn"""
+        from ollama import Message
+
+        def add(a: int, b: int) -> int:
+            return a + b
+
+        agent = Agent(name="test_agent", tools=[add])
+        call = Message.ToolCall(function=Message.ToolCall.Function(name="add", arguments={"a": 1, "b": 2}))
+        turns = [iter(self._chunks(tool_calls=[call])), iter(self._chunks("3"))]
+
+        with patch.object(agent.client, 'chat', side_effect=turns):
+            deltas = list(agent.chat_stream("1+2?"))
+
+        assert deltas == ["3"]
+        assert {"role": "tool", "content": "3"} in agent.messages
+
+    @pytest.mark.asyncio
+    async def test_achat_stream_yields_deltas(self):
+        """Test async streaming"""
+        agent = Agent(name="test_agent")
+
+        async def stream():
+            for chunk in self._chunks("a", "b", "c"):
+                yield chunk
+
+        async def fake_chat(**kwargs):
+            assert kwargs["stream"] is True
+            return stream()
+
+        with patch.object(agent.async_client, 'chat', side_effect=fake_chat):
+            deltas = [delta async for delta in agent.achat_stream("Hi")]
+
+        assert deltas == ["a", "b", "c"]
+        assert agent.messages[-1]["content"] == "abc"
+
+    def test_chat_with_stream_enabled(self):
+        """Test that chat aggregates the stream when stream=True"""
+        agent = Agent(name="test_agent", stream=True)
+
+        with patch.object(agent.client, 'chat', return_value=iter(self._chunks("Hi", " there"))):
+            result = agent.chat("Hello")
+
+        assert result["content"] == "Hi there"
+
+
+class TestTurnEngine:
+    """Tests for the turn engine shared by chat and achat"""
+
+    @staticmethod
+    def _response(content="", tool_calls=None):
+        from ollama import ChatResponse, Message
+        return ChatResponse(message=Message(role="assistant", content=content, tool_calls=tool_calls), done=True)
+
+    @pytest.mark.asyncio
+    async def test_achat_uses_content_fallback_parser(self):
+        """Test that achat handles JSON tool calls in content like chat does"""
+        def add(a: int, b: int) -> int:
+            return a + b
+
+        agent = Agent(name="test_agent", tools=[add])
+        responses = [self._response('```json\n{"name": "add", "arguments": {"a": 2, "b": 3}}\n```'),
+                     self._response("The answer is 5")]
+
+        async def fake_chat(**kwargs):
+            return responses.pop(0)
+
+        with patch.object(agent.async_client, 'chat', side_effect=fake_chat):
+            result = await agent.achat("2+3?")
+
+        assert result["content"] == "The answer is 5"
+        assert {"role": "tool", "content": "5"} in agent.messages
+
+    def test_max_tool_iterations_and_phase_hooks(self):
+        """Test the iteration limit and that every phase is reported"""
+        from ollama import Message
+        from ollama_agents.turn import TurnPhase
+
+        def ping() -> str:
+            return "pong"
+
+        phases = []
+        agent = Agent(name="test_agent", tools=[ping], max_tool_iterations=2,
+                      phase_hooks=[lambda phase, duration, name: phases.append(phase)])
+        call = Message.ToolCall(function=Message.ToolCall.Function(name="ping", arguments={}))
+
+        with patch.object(agent.client, 'chat', return_value=self._response(tool_calls=[call])) as chat:
+            agent.chat("loop forever")
+
+        assert chat.call_count == 3  # Initial request plus two tool rounds
+        assert [m["content"] for m in agent.messages if m["role"] == "tool"] == ["pong", "pong"]
+        assert set(phases) == {TurnPhase.PREPARE, TurnPhase.NETWORK, TurnPhase.TOOLS, TurnPhase.POST_PROCESS}
+
+    def test_custom_tool_call_parser(self):
+        """Test plugging in a custom tool-call parser"""
+        from ollama import Message
+
+        def shout(text: str) -> str:
+            return text.upper()
+
+        def bang_parser(message):
+            if message.content.startswith("!shout "):
+                return [Message.ToolCall(function=Message.ToolCall.Function(
+                    name="shout", arguments={"text": message.content[7:]}))]
+            return []
+
+        agent = Agent(name="test_agent", tools=[shout], tool_call_parsers=[bang_parser])
+        responses = [self._response("!shout hi"), self._response("done")]
+
+        with patch.object(agent.client, 'chat', side_effect=responses):
+            result = agent.chat("hello")
+
+        assert result["content"] == "done"
+        assert {"role": "tool", "content": "HI"} in agent.messages
+
+class TestRequestTemplate:
+    """Tests for the compiled per-agent request template"""
+
+    def test_template_is_reused_between_calls(self):
+        """Test that tool schemas and options are not rebuilt on every call"""
+        def lookup(key: str) -> str:
+            """Look up a key"""
+            return key
+
+        agent = Agent(name="test_agent", tools=[lookup], temperature=0.2)
+        first = agent._build_chat_params()
+
+        with patch("ollama_agents.tools.inspect.signature") as signature, \
+                patch.object(agent.settings.__class__, "to_ollama_options") as to_options:
+            second = agent._build_chat_params()
+
+        signature.assert_not_called()
+        to_options.assert_not_called()
+        assert second["tools"] == first["tools"]
+        assert second["options"] == {"temperature": 0.2}
+
+    def test_template_invalidation(self):
+        """Test that add_tool, set_thinking_mode and settings changes rebuild the template"""
+        def first_tool() -> str:
+            return "a"
+
+        def second_tool() -> str:
+            return "b"
+
+        agent = Agent(name="test_agent", tools=[first_tool])
+        assert len(agent._build_chat_params()["tools"]) == 1
+
+        agent.add_tool(second_tool)
+        assert len(agent._build_chat_params()["tools"]) == 2
+
+        agent.set_thinking_mode(ThinkingMode.HIGH)
+        assert agent._build_chat_params()["think"] == "high"
+
+        agent.settings.temperature = 0.1
+        assert agent._build_chat_params()["options"]["temperature"] == 0.1
+
+        agent.settings = ModelSettings(top_p=0.5)
+        assert agent._build_chat_params()["options"] == {"top_p": 0.5}
+
+    def test_per_call_tools_are_memoised(self):
+        """Test that per-call tools do not rebuild a registry every call"""
+        def extra(x: int) -> int:
+            return x
+
+        agent = Agent(name="test_agent")
+        first = agent._build_chat_params(tools=[extra])["tools"]
+
+        with patch("ollama_agents.agent.ToolRegistry") as registry_class:
+            second = agent._build_chat_params(tools=[extra])["tools"]
+
+        registry_class.assert_not_called()
+        assert second is first
+        assert first[0]["function"]["name"] == "extra"
+
+class TestClientRegistry:
+    """Tests for shared Ollama clients"""
+
+    def test_agents_share_clients_per_host(self):
+        """Test that agents on the same host reuse one lazily created client"""
+        from ollama_agents.clients import ClientRegistry
+
+        registry = ClientRegistry()
+        with patch("ollama_agents.agent.get_client", registry.get_client):
+            first = Agent(name="first", host="http://host-a:11434")
+            second = Agent(name="second", host="http://host-a:11434")
+            other = Agent(name="other", host="http://host-b:11434")
+            assert registry.get_stats()["sync_clients"] == 0
+
+            assert first.client is second.client
+            assert first.client is not other.client
+        assert registry.get_stats()["sync_clients"] == 2
+
+    @pytest.mark.asyncio
+    async def test_async_clients_are_per_event_loop(self):
+        """Test that async clients are shared within a loop"""
+        from ollama_agents.clients import ClientRegistry
+
+        registry = ClientRegistry()
+        client = registry.get_async_client("http://host-a:11434")
+        assert registry.get_async_client("http://host-a:11434") is client
+        assert registry.get_async_client("http://host-a:11434", timeout=5) is not client
+
+    def test_pooled_checkout(self):
+        """Test that pooling hands each request a client from the host's pool"""
+        from ollama_agents.clients import ClientRegistry
+
+        registry = ClientRegistry()
+        with registry.checkout("http://host-a:11434") as client:
+            assert client is registry.get_client("http://host-a:11434")
+
+        registry.configure(pool_size=2)
+        pool = registry.get_pool("http://host-a:11434")
+        with registry.checkout("http://host-a:11434") as client:
+            assert client is not registry.get_client("http://host-a:11434")
+            assert len(pool.in_use) == 1
+        assert len(pool.in_use) == 0
+        assert pool.available == [client]
+        registry.close()
+
+    def test_agent_uses_pool_when_enabled(self):
+        """Test that agent requests go through the connection pool"""
+        from ollama_agents.clients import ClientRegistry
+
+        registry = ClientRegistry()
+        registry.configure(pool_size=1)
+        pooled = Mock()
+        pooled.chat.return_value = Mock(message=Mock(content="pooled", tool_calls=None),
+                                        prompt_eval_count=0, eval_count=0)
+
+        agent = Agent(name="test_agent", host="http://host-a:11434")
+        with patch.object(registry, "client_factory", return_value=lambda: pooled), \
+                patch("ollama_agents.agent.get_client_registry", return_value=registry):
+            response = agent.chat("Hello")
+
+        assert response["content"] == "pooled"
+        pooled.chat.assert_called_once()
+        assert registry.get_pool("http://host-a:11434", agent.timeout).available == [pooled]
+
+
+class TestConversationLog:
+    """Tests for the conversation history log"""
+
+    def test_running_totals(self):
+        """Test that size totals are maintained without rescanning"""
+        from ollama_agents.conversation import ConversationLog
+
+        log = ConversationLog()
+        log.add("system", "abcd")
+        log.append({"role": "user", "content": "12345678"})
+        assert log.total_chars == 12
+        assert log.total_tokens == 3
+
+        log[1] = {"role": "user", "content": "xy"}
+        del log[0]
+        assert log.total_chars == 2
+        log.clear()
+        assert (log.total_chars, log.total_tokens) == (0, 0)
+
+    def test_records_behave_like_dicts(self):
+        """Test that records compare equal to message dicts and intern roles"""
+        from ollama_agents.conversation import ConversationLog
+
+        log = ConversationLog([{"role": "tool", "content": "ok", "tool_name": "ping"}])
+        record = log[0]
+        assert record == {"role": "tool", "content": "ok", "tool_name": "ping"}
+        assert record.get("missing") is None
+        assert log.add("".join(["to", "ol"]), "x").role is record.role
+        with pytest.raises(AttributeError):
+            record.content = "changed"
+
+    def test_snapshot_is_isolated(self):
+        """Test that snapshots are unaffected by later changes"""
+        from ollama_agents.conversation import ConversationLog
+
+        log = ConversationLog()
+        log.add("user", "one")
+        log.add("assistant", "two")
+        snapshot = log.snapshot()
+
+        log.add("user", "three")
+        del log[0]
+        log[0] = {"role": "assistant", "content": "changed"}
+
+        assert [m["content"] for m in snapshot] == ["one", "two"]
+        assert snapshot.total_chars == 6
+        assert [m["content"] for m in log] == ["changed", "three"]
+
+    def test_agent_and_handoff_use_log(self):
+        """Test that the agent tracks context size and handoff shares records"""
+        agent = Agent(name="agent1", instructions="sys")
+        agent.summary_threshold = 8
+        agent.add_message("user", "hello")
+        assert not agent.should_summarize_context()
+        agent.add_message("assistant", "!")
+        assert agent.should_summarize_context()
+
+        target = Agent(name="agent2", instructions="other")
+        handoff = AgentHandoff({"agent1": agent, "agent2": target})
+        handoff.set_current_agent("agent1")
+        handoff.handoff_to("agent2", use_context_summarization=False)
+        assert target.messages[1] is agent.messages[1]
+        assert target.messages.total_chars == len("other") + len("hello!")
+
+
+class TestContextManagement:
+    """Tests for context truncation in the request path"""
+
+    def test_incremental_oldest_first_matches_full_scan(self):
+        """Test that the incremental window equals a from-scratch truncation"""
+        from ollama_agents import ContextManager, TruncationStrategy
+        from ollama_agents.conversation import ConversationLog
+
+        log = ConversationLog()
+        log.add("system", "sys")
+        manager = ContextManager(30, TruncationStrategy.OLDEST_FIRST, messages=log)
+        for i in range(20):
+            log.add("user" if i % 2 else "assistant", f"message {i}")
+            fresh = ContextManager(30, TruncationStrategy.OLDEST_FIRST, messages=ConversationLog(log))
+            assert manager.truncate_context(None, "model") == fresh.truncate_context(None, "model")
+        assert manager._read_count == len(log)
+
+        del log[1]
+        fresh = ContextManager(30, TruncationStrategy.OLDEST_FIRST, messages=ConversationLog(log))
+        assert manager.truncate_context(None, "model") == fresh.truncate_context(None, "model")
+
+    def test_newest_first_keeps_prefix(self):
+        """Test that newest-first keeps the oldest messages that fit"""
+        from ollama_agents import ContextManager, TruncationStrategy
+
+        manager = ContextManager(10, TruncationStrategy.NEWEST_FIRST)
+        for content in ["aaaa", "bbbb", "cccc", "dddd"]:
+            manager.add_message("user", content)
+        assert [m["content"] for m in manager.truncate_context(None, "model")] == ["aaaa", "bbbb"]
+
+    def test_chat_sends_truncated_context(self):
+        """Test that chat applies the agent's truncation strategy before each request"""
+        from ollama_agents import TruncationStrategy
+
+        agent = Agent(name="test_agent", instructions="sys", max_context_length=20,
+                      context_truncation_strategy=TruncationStrategy.OLDEST_FIRST)
+        agent.add_message("user", "a" * 15)
+        agent.add_message("assistant", "b" * 15)
+
+        mock_response = Mock(message=Mock(content="ok", tool_calls=None), prompt_eval_count=0, eval_count=0)
+        with patch.object(agent.client, 'chat', return_value=mock_response) as mock_chat:
+            agent.chat("hello")
+
+        sent = mock_chat.call_args.kwargs["messages"]
+        assert [m["content"] for m in sent] == ["sys", "hello"]
+        assert len(agent.messages) == 5  # Full history is kept locally
+
+
+class TestRollingSummary:
+    """Tests for incremental summary checkpoints"""
+
+    def test_only_new_messages_are_summarized(self):
+        """Test that each call summarizes just the messages after the checkpoint"""
+        from ollama_agents.context_manager import RollingSummary
+        from ollama_agents.conversation import ConversationLog
+
+        log = ConversationLog([{"role": "user", "content": f"m{i}"} for i in range(3)])
+        prompts = []
+        summary = RollingSummary()
+        generate = lambda prompt: prompts.append(prompt) or f"summary {len(prompts)}"
+
+        assert summary.summarize(log[:2], generate) == "summary 1"
+        assert summary.summarize(log[:2], generate) == "summary 1"
+        assert summary.summarize(log[:3], generate) == "summary 2"
+
+        assert len(prompts) == 2
+        assert "m0" not in prompts[1] and "m2" in prompts[1] and "summary 1" in prompts[1]
+
+    def test_summaries_cached_by_covered_messages(self):
+        """Test that re-summarizing identical messages hits the cache"""
+        from ollama_agents.context_manager import RollingSummary
+        from ollama_agents.conversation import ConversationLog
+
+        generate = Mock(return_value="cached")
+        summary = RollingSummary()
+        summary.summarize(ConversationLog([{"role": "user", "content": "a"}]), generate)
+        summary.reset()
+        assert summary.summarize(ConversationLog([{"role": "user", "content": "a"}]), generate) == "cached"
+        generate.assert_called_once()
+
+    def test_summarize_middle_is_incremental(self):
+        """Test that repeated truncation does not re-summarize the whole middle"""
+        from ollama_agents import ContextManager, TruncationStrategy
+
+        manager = ContextManager(60, TruncationStrategy.SUMMARIZE_MIDDLE)
+        client = Mock()
+        client.generate.return_value = Mock(response="S")
+        for i in range(8):
+            manager.add_message("user", f"message number {i}")
+        first = manager.truncate_context(client, "model")
+        assert any(m["content"] == "Summary of previous conversation: S" for m in first)
+
+        for i in range(8, 12):
+            manager.add_message("user", f"message number {i}")
+        manager.truncate_context(client, "model")
+
+        assert client.generate.call_count == 2
+        second_prompt = client.generate.call_args.kwargs["prompt"]
+        assert "message number 2 " not in second_prompt
+        assert "message number 6" in second_prompt
+
+    def test_agent_summarize_context_is_incremental(self):
+        """Test that Agent.summarize_context reuses its checkpoint"""
+        agent = Agent(name="test_agent")
+        for i in range(10):
+            agent.add_message("user", f"question number {i}")
+
+        with patch.object(agent.client, 'generate', return_value=Mock(response="S")) as mock_generate:
+            assert agent.summarize_context() == "S"
+            assert agent.summarize_context() == "S"
+            agent.add_message("assistant", "answer")
+            agent.summarize_context()
+
+        assert mock_generate.call_count == 2
+        assert "question number 3" not in mock_generate.call_args.kwargs["prompt"]
+
+
+class TestBackgroundSummarizer:
+    """Tests for summaries precomputed off the request path"""
+
+    def test_truncation_swaps_in_precomputed_summary(self):
+        """Test that truncation uses the background summary instead of an inline call"""
+        from ollama_agents import ContextManager, TruncationStrategy
+
+        manager = ContextManager(250, TruncationStrategy.SUMMARIZE_MIDDLE, background_summary_ratio=0.6)
+        client = Mock()
+        client.generate.return_value = Mock(response="S")
+        for i in range(8):
+            manager.add_message("user", f"message number {i}")
+        assert not manager.maybe_precompute_summary(client, "model")  # Below 60%
+
+        for i in range(8, 12):
+            manager.add_message("user", f"message number {i}")
+        assert manager.maybe_precompute_summary(client, "model")
+        manager.background_summarizer.wait(timeout=5)
+        assert client.generate.call_count == 1
+
+        for i in range(12, 16):
+            manager.add_message("user", f"message number {i}")
+        with patch.object(manager.rolling_summary, "summarize", wraps=manager.rolling_summary.summarize) as inline:
+            result = manager.truncate_context(client, "model")
+            # The update scheduled by truncation runs in the background
+            manager.background_summarizer.wait(timeout=5)
+
+        contents = [m["content"] for m in result]
+        assert "Summary of previous conversation: S" in contents
+        assert "message number 9" in contents  # Not yet covered by the summary, kept verbatim
+        assert "message number 4" not in contents
+        assert inline.call_count == 1
+
+    def test_agent_handoff_summary_is_precomputed(self):
+        """Test that summarize_context returns the background summary"""
+        agent = Agent(name="test_agent", max_context_length=250, background_summarization=True,
+                      context_truncation_strategy=TruncationStrategy.OLDEST_FIRST)
+        for i in range(10):
+            agent.add_message("user", f"question number {i}")
+
+        with patch.object(agent.client, 'generate', return_value=Mock(response="S")) as mock_generate:
+            agent._schedule_background_summaries()
+            agent.summary_worker.wait(timeout=5)
+            assert mock_generate.call_count == 1
+
+            agent.add_message("assistant", "fresh answer")
+            summary = agent.summarize_context()
+            agent.summary_worker.wait(timeout=5)
+
+        assert summary == "S\nassistant: fresh answer"
+        assert mock_generate.call_count == 2  # The catch-up ran in the background
+
+
+class TestResponseCaching:
+    """Tests for the response cache in the request path"""
+
+    @staticmethod
+    def _response(content):
+        return Mock(message=Mock(content=content, tool_calls=None), prompt_eval_count=0, eval_count=0)
+
+    def test_chat_cache_keyed_on_full_history(self):
+        """Test that identical requests hit and different histories miss"""
+        from ollama_agents import ResponseCache
+
+        cache = ResponseCache()
+        agent = Agent(name="test_agent", enable_cache=True, cache=cache)
+        with patch.object(agent.client, 'chat', return_value=self._response("first")) as mock_chat:
+            agent.chat("Hello")
+            agent.reset_conversation()
+            assert agent.chat("Hello")["content"] == "first"
+            assert mock_chat.call_count == 1
+
+            # Same latest message, different history
+            agent.chat("Hello")
+            assert mock_chat.call_count == 2
+
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 2
+
+    def test_cache_key_includes_options_and_tools(self):
+        """Test that changing options or tools changes the key"""
+        def lookup(key: str) -> str:
+            return key
+
+        agent = Agent(name="test_agent", enable_cache=True, temperature=0.1)
+        agent.add_message("user", "Hello")
+        base = agent._cache_key(agent._build_chat_params())
+        assert agent._cache_key(agent._build_chat_params()) == base
+
+        agent.settings.temperature = 0.9
+        assert agent._cache_key(agent._build_chat_params()) != base
+        assert agent._cache_key(agent._build_chat_params(tools=[lookup])) != \
+            agent._cache_key(agent._build_chat_params())
+
+    def test_cache_reports_stats(self):
+        """Test that hits and misses reach the stats tracker"""
+        from ollama_agents import StatType
+
+        agent = Agent(name="test_agent", enable_cache=True)
+        agent.stats_tracker = Mock()
+        with patch.object(agent.client, 'generate',
+                          return_value=Mock(response="text", prompt_eval_count=0, eval_count=0)) as mock_generate:
+            agent.generate("Hi")
+            assert agent.generate("Hi")["content"] == "text"
+        mock_generate.assert_called_once()
+
+        stats = [call.args[0] for call in agent.stats_tracker.increment.call_args_list]
+        assert stats.count(StatType.CACHE_MISSES) == 1
+        assert stats.count(StatType.CACHE_HITS) == 1
+
+    @pytest.mark.asyncio
+    async def test_async_paths_use_cache(self):
+        """Test that achat and agenerate share the cache"""
+        agent = Agent(name="test_agent", enable_cache=True)
+
+        async def fake_chat(**kwargs):
+            return self._response("async")
+
+        async def fake_generate(**kwargs):
+            return Mock(response="generated")
+
+        with patch.object(agent.async_client, 'chat', side_effect=fake_chat) as mock_chat, \
+                patch.object(agent.async_client, 'generate', side_effect=fake_generate) as mock_generate:
+            await agent.achat("Hello")
+            agent.reset_conversation()
+            await agent.achat("Hello")
+            await agent.agenerate("Hi")
+            await agent.agenerate("Hi")
+
+        assert mock_chat.call_count == 1
+        assert mock_generate.call_count == 1
+
+
+class TestConversationDigest:
+    """Tests for the chained per-message hash"""
+
+    def test_digest_tracks_history(self):
+        """Test that equal histories share a digest and rewrites rechain"""
+        from ollama_agents.conversation import ConversationLog, EMPTY_CHAIN
+
+        first = ConversationLog()
+        second = ConversationLog()
+        assert first.digest == EMPTY_CHAIN
+        for log in (first, second):
+            log.add("user", "a")
+            log.add("assistant", "b")
+        assert first.digest == second.digest
+        assert first.digest_at(1) != first.digest
+
+        second.add("user", "c")
+        assert second.digest_at(2) == first.digest
+        del second[0]
+        assert second.digest == ConversationLog([{"role": "assistant", "content": "b"},
+                                                 {"role": "user", "content": "c"}]).digest
+
+    def test_cache_key_cost_independent_of_history(self):
+        """Test that keying a long conversation hashes no old messages"""
+        agent = Agent(name="test_agent", enable_cache=True)
+        for i in range(200):
+            agent.add_message("user" if i % 2 == 0 else "assistant", f"turn {i}")
+        params = agent._build_chat_params()
+
+        with patch("ollama_agents.conversation.chain_link") as chain_link, \
+                patch("ollama_agents.conversation.MessageRecord.from_message") as from_message:
+            key = agent._cache_key(params)
+        chain_link.assert_not_called()
+        from_message.assert_not_called()
+
+        agent.add_message("user", "one more")
+        assert agent._cache_key(params) != key
+
+
+class TestCacheEviction:
+    """Tests for ResponseCache eviction strategies"""
+
+    def test_lru_evicts_least_recently_used(self):
+        from ollama_agents import ResponseCache, CacheStrategy
+
+        cache = ResponseCache(max_size=2, strategy=CacheStrategy.LRU)
+        cache.set_by_key("a", 1)
+        cache.set_by_key("b", 2)
+        cache.get_by_key("a")
+        cache.set_by_key("c", 3)
+        assert cache.get_by_key("b") is None
+        assert cache.get_by_key("a") == 1 and cache.get_by_key("c") == 3
+
+    def test_lfu_evicts_least_frequently_used(self):
+        from ollama_agents import ResponseCache, CacheStrategy
+
+        cache = ResponseCache(max_size=3, strategy=CacheStrategy.LFU)
+        for key in "abc":
+            cache.set_by_key(key, key)
+        cache.get_by_key("a")
+        cache.get_by_key("a")
+        cache.get_by_key("c")
+        cache.set_by_key("d", "d")  # b has the lowest count
+        assert cache.get_by_key("b") is None
+        cache.set_by_key("e", "e")  # d is now the only entry with count 1
+        assert cache.get_by_key("d") is None
+        assert cache.get_stats()["size"] == 3
+
+    def test_ttl_evicts_first_to_expire(self):
+        from ollama_agents import ResponseCache, CacheStrategy
+
+        cache = ResponseCache(max_size=2, strategy=CacheStrategy.TTL)
+        cache.set_by_key("long", 1, ttl=100)
+        cache.set_by_key("short", 2, ttl=10)
+        cache.set_by_key("new", 3, ttl=50)
+        assert cache.get_by_key("short") is None
+        assert cache.get_by_key("long") == 1
+
+    def test_concurrent_access(self):
+        """Test that shared caches stay consistent across threads"""
+        from concurrent.futures import ThreadPoolExecutor
+        from ollama_agents import ResponseCache, CacheStrategy
+
+        for strategy in CacheStrategy:
+            cache = ResponseCache(max_size=100, strategy=strategy, default_ttl=60)
+
+            def worker(offset):
+                for i in range(500):
+                    cache.set_by_key(f"{offset}-{i}", i)
+                    cache.get_by_key(f"{offset}-{i // 2}")
+
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(worker, range(4)))
+            assert len(cache.cache) == 100
+
+
+class TestCacheBackends:
+    """Tests for persistent cache backends"""
+
+    def test_sqlite_backend_survives_restart(self, tmp_path):
+        from ollama_agents import ResponseCache, SQLiteCacheBackend
+
+        db_path = str(tmp_path / "cache.db")
+        cache = ResponseCache(backend=SQLiteCacheBackend(db_path))
+        cache.set_by_key("key", {"content": "cached"}, ttl=60)
+        cache.backend.close()
+
+        # A new process starts with an empty in-process tier
+        backend = SQLiteCacheBackend(db_path)
+        assert backend._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        warm = ResponseCache(backend=backend)
+        assert warm.get_by_key("key") == {"content": "cached"}
+        assert "key" in warm.cache
+        assert warm.get_stats()["backend"]["size"] == 1
+
+    def test_sqlite_backend_expiry(self, tmp_path):
+        from ollama_agents import SQLiteCacheBackend
+
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.set("old", 1, expires_at=time.time() - 1)
+        backend.set("new", 2, expires_at=time.time() + 60)
+        assert backend.get("old") is None
+        assert backend.get("new")[0] == 2
+        assert len(backend) == 1
+
+    def test_sqlite_backend_size_bounds(self, tmp_path):
+        from ollama_agents import SQLiteCacheBackend
+
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=3, max_bytes=None)
+        for i in range(3):
+            backend.set(f"k{i}", i)
+        backend._conn.execute("UPDATE cache SET last_access = 0 WHERE key = 'k1'")
+        backend.set("k3", 3)
+        assert backend.get("k1") is None
+        assert len(backend) == 3
+
+        backend = SQLiteCacheBackend(str(tmp_path / "bytes.db"), max_entries=None, max_bytes=1000)
+        for i in range(10):
+            backend.set(f"k{i}", "x" * 300)
+        stats = backend.get_stats()
+        assert stats["bytes"] <= 1000 and stats["size"] == 3
+        assert backend.get("k9") is not None
+
+    def test_redis_backend(self):
+        from ollama_agents import RedisCacheBackend, ResponseCache
+
+        store = {}
+        client = Mock()
+        client.get.side_effect = store.get
+        client.set.side_effect = lambda key, value, **kwargs: store.__setitem__(key, value)
+        backend = RedisCacheBackend(client=client, prefix="test:")
+
+        cache = ResponseCache(backend=backend)
+        cache.set_by_key("key", "value", ttl=30)
+        assert "test:key" in store
+        assert client.set.call_args.kwargs["pxat"] > time.time() * 1000
+
+        other_worker = ResponseCache(backend=backend)
+        assert other_worker.get_by_key("key") == "value"
+
+    @pytest.mark.asyncio
+    async def test_async_lookups_run_backend_off_the_event_loop(self):
+        import threading
+        from ollama_agents import ResponseCache
+
+        loop_thread = threading.get_ident()
+        threads = []
+        backend = Mock()
+        backend.get.side_effect = lambda key: threads.append(threading.get_ident()) or ("stored", None)
+        backend.set.side_effect = lambda *args: threads.append(threading.get_ident())
+
+        cache = ResponseCache(backend=backend)
+        assert await cache.aget_by_key("key") == "stored"
+        assert await cache.aget_by_key("key") == "stored"  # Now served by the in-process tier
+        await cache.aset_by_key("other", "value", ttl=30)
+
+        assert backend.get.call_count == 1 and backend.set.call_count == 1
+        assert loop_thread not in threads
+        assert backend.set.call_args.args[2] > time.time()
+
+    def test_performance_cache_backend(self, tmp_path):
+        from ollama_agents import SQLiteCacheBackend
+        from ollama_agents.performance import ResponseCache as PerformanceCache
+
+        db_path = str(tmp_path / "cache.db")
+        messages = [{"role": "user", "content": "hi"}]
+        PerformanceCache(backend=SQLiteCacheBackend(db_path)).set("m", messages, {"content": "hello"})
+        cache = PerformanceCache(backend=SQLiteCacheBackend(db_path))
+        assert cache.get("m", messages) == {"content": "hello"}
+
+
+class TestSemanticCache:
+    """Tests for the embedding-based semantic cache"""
+
+    def test_paraphrase_hits_above_threshold(self):
+        from ollama_agents import SemanticCache, HashingEmbedder
+
+        cache = SemanticCache(embedder=HashingEmbedder(), threshold=0.6)
+        cache.set("How do I reset my password?", "Use the reset link.")
+        assert cache.get("how do I reset my password") == "Use the reset link."
+        response, similarity = cache.lookup("How can I reset my password?")
+        assert response == "Use the reset link." and 0.6 <= similarity < 1.0
+        assert cache.get("What are your opening hours?") is None
+        assert cache.get_stats()["hits"] == 2
+
+    def test_namespaces_and_eviction(self):
+        from ollama_agents import SemanticCache, HashingEmbedder
+
+        cache = SemanticCache(embedder=HashingEmbedder(), threshold=0.99, max_entries=2)
+        cache.set("first question", 1, namespace="a")
+        assert cache.get("first question", namespace="b") is None
+
+        cache.set("second question", 2, namespace="a")
+        cache.get("first question", namespace="a")
+        cache.set("third question", 3, namespace="a")  # evicts the least recently used
+        assert cache.get("second question", namespace="a") is None
+        assert cache.get("first question", namespace="a") == 1
+        assert cache.get("third question", namespace="a") == 3
+        assert cache.get_stats()["namespaces"] == {"a": 2}
+
+    def test_embeds_once_per_query(self):
+        from ollama_agents import SemanticCache, HashingEmbedder
+
+        embedder = Mock(side_effect=HashingEmbedder())
+        cache = SemanticCache(embedder=embedder)
+        assert cache.get("question") is None
+        cache.set("question", "answer")
+        assert embedder.call_count == 1
+
+    def test_agent_chat_uses_semantic_cache(self):
+        from ollama_agents import SemanticCache, HashingEmbedder
+
+        agent = Agent(name="faq", semantic_cache=SemanticCache(embedder=HashingEmbedder(), threshold=0.6))
+        mock_response = Mock()
+        mock_response.message.content = "Use the reset link."
+        mock_response.message.tool_calls = None
+        mock_response.prompt_eval_count = 0
+        mock_response.eval_count = 0
+
+        with patch.object(agent.client, 'chat', return_value=mock_response) as chat:
+            agent.chat("How do I reset my password?")
+            result = agent.chat("How can I reset my password?")
+
+        assert chat.call_count == 1
+        assert result["content"] == "Use the reset link."
+        assert agent.messages[-1] == {"role": "assistant", "content": "Use the reset link."}
+        assert "faq" in agent.semantic_cache.get_stats()["namespaces"]
+
+    def test_answers_from_tool_results_are_not_cached(self):
+        from ollama import ChatResponse, Message
+        from ollama_agents import SemanticCache, HashingEmbedder
+
+        def get_current_time() -> str:
+            return "12:00"
+
+        agent = Agent(name="clock", tools=[get_current_time],
+                      semantic_cache=SemanticCache(embedder=HashingEmbedder(), threshold=0.6))
+        call = Message.ToolCall(function=Message.ToolCall.Function(name="get_current_time", arguments={}))
+        responses = [ChatResponse(message=Message(role="assistant", content="", tool_calls=[call]), done=True),
+                     ChatResponse(message=Message(role="assistant", content="It is 12:00"), done=True)]
+
+        with patch.object(agent.client, 'chat', side_effect=responses):
+            result = agent.chat("What time is it?")
+
+        assert result["content"] == "It is 12:00" and result["used_tools"]
+        assert agent.semantic_cache.get("what time is it", namespace="clock") is None
+
+
+class TestRequestCoalescing:
+    """Tests for single-flight coalescing of identical concurrent requests"""
+
+    def test_threads_share_one_call(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from ollama_agents import SingleFlight
+
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(flight.do, "key", fetch) for _ in range(5)]
+            while flight.coalesced < 4:
+                time.sleep(0.01)
+            release.set()
+            results = [future.result() for future in futures]
+
+        assert len(calls) == 1
+        assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+        assert all(result == "result" for result, _ in results)
+        assert flight.in_flight() == 0
+
+    @pytest.mark.asyncio
+    async def test_async_errors_and_cancellation(self):
+        import asyncio
+        from ollama_agents import SingleFlight
+
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flight.ado("err", fail), flight.ado("err", fail), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+
+        # A cancelled leader hands the call over to a waiting caller
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.ensure_future(flight.ado("key", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado("key", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == ("done", False)
+
+    @pytest.mark.asyncio
+    async def test_agent_agenerate_coalesces(self):
+        import asyncio
+
+        agent = Agent(name="test_agent", enable_cache=True)
+        agent.cache.clear()
+        calls = []
+
+        async def fake_generate(**kwargs):
+            calls.append(kwargs)
+            await asyncio.sleep(0.02)
+            response = Mock()
+            response.response = "shared"
+            return response
+
+        with patch.object(agent.async_client, 'generate', side_effect=fake_generate):
+            results = await asyncio.gather(*(agent.agenerate("same prompt") for _ in range(4)))
+
+        assert len(calls) == 1
+        assert [r["content"] for r in results] == ["shared"] * 4
+
+    def test_agent_chat_threads_coalesce(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from ollama_agents import get_single_flight
+
+        flight = get_single_flight()
+        baseline = flight.coalesced
+        agents = [Agent(name=f"worker{i}", enable_cache=True) for i in range(3)]
+        agents[0].cache.clear()
+        release = threading.Event()
+        calls = []
+
+        def fake_chat(**kwargs):
+            calls.append(kwargs)
+            release.wait(5)
+            response = Mock()
+            response.message.content = "answer"
+            response.message.tool_calls = None
+            response.prompt_eval_count = 0
+            response.eval_count = 0
+            return response
+
+        with patch.object(agents[0].client, 'chat', side_effect=fake_chat):
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                futures = [pool.submit(agent.chat, "hello") for agent in agents]
+                while flight.coalesced < baseline + 2:
+                    time.sleep(0.01)
+                release.set()
+                results = [future.result() for future in futures]
+
+        assert len(calls) == 1
+        assert all(result["content"] == "answer" for result in results)
+
+
+class TestBatchRequests:
+    """Tests for generate_many / chat_many"""
+
+    @staticmethod
+    def _fake_generate(tracker):
+        import asyncio
+
+        async def fake_generate(**kwargs):
+            tracker["active"] += 1
+            tracker["peak"] = max(tracker["peak"], tracker["active"])
+            prompt = kwargs["prompt"]
+            await asyncio.sleep(0.001 * (5 - int(prompt[-1]) % 5))
+            tracker["active"] -= 1
+            if prompt == "p3":
+                raise RuntimeError("bad item")
+            response = Mock()
+            response.response = prompt.upper()
+            return response
+        return fake_generate
+
+    @pytest.mark.asyncio
+    async def test_agenerate_many_bounded_and_ordered(self):
+        agent = Agent(name="batch_agent")
+        tracker = {"active": 0, "peak": 0}
+        prompts = [f"p{i}" for i in range(10)]
+
+        with patch.object(agent.async_client, 'generate', side_effect=self._fake_generate(tracker)):
+            results = await agent.agenerate_many(prompts, concurrency=3)
+
+        assert tracker["peak"] <= 3
+        assert [r.index for r in results] == list(range(10))
+        assert results[0].result["content"] == "P0"
+        assert not results[3].ok and isinstance(results[3].error, RuntimeError)
+        assert sum(r.ok for r in results) == 9
+
+    def test_generate_many_sync_as_completed(self):
+        from ollama_agents import BatchResult
+
+        agent = Agent(name="batch_agent")
+        tracker = {"active": 0, "peak": 0}
+        # The batch runs on a private event loop, which gets its own async client
+        with patch('ollama.AsyncClient.generate', side_effect=self._fake_generate(tracker)):
+            ordered = agent.generate_many((f"p{i}" for i in range(6)), concurrency=2)
+            streamed = list(agent.generate_many([f"p{i}" for i in range(6)], concurrency=2, as_completed=True))
+
+        assert [r.input for r in ordered] == [f"p{i}" for i in range(6)]
+        assert all(isinstance(r, BatchResult) for r in streamed)
+        assert sorted(r.index for r in streamed) == list(range(6))
+        assert tracker["peak"] <= 2
+
+    @pytest.mark.asyncio
+    async def test_achat_many_leaves_history_untouched(self):
+        agent = Agent(name="batch_agent", instructions="Be brief")
+        seen = []
+
+        async def fake_chat(**kwargs):
+            seen.append([dict(m) for m in kwargs["messages"]])
+            response = Mock()
+            response.message.content = kwargs["messages"][-1]["content"][::-1]
+            response.prompt_eval_count = 0
+            response.eval_count = 0
+            return response
+
+        conversations = ["abc", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "yo"},
+                                 {"role": "user", "content": "xyz"}]]
+        with patch.object(agent.async_client, 'chat', side_effect=fake_chat):
+            results = await agent.achat_many(conversations, concurrency=2)
+
+        assert [r.result["content"] for r in results] == ["cba", "zyx"]
+        assert seen[0][0] == {"role": "system", "content": "Be brief"}
+        assert len(agent.messages) == 1
+
+
+class TestRequestBatcher:
+    """Tests for the async micro-batcher"""
+
+    @pytest.mark.asyncio
+    async def test_flushes_on_size_and_timeout(self):
+        import asyncio
+        from ollama_agents import RequestBatcher
+
+        batches = []
+
+        async def processor(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = RequestBatcher(batch_size=4, max_wait_ms=20, processor=processor)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+        assert results == [i * 2 for i in range(10)]
+        assert [len(batch) for batch in batches] == [4, 4, 2]
+        stats = batcher.get_stats()
+        assert stats["size_flushes"] == 2 and stats["timer_flushes"] == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_caller(self):
+        import asyncio
+        from ollama_agents import RequestBatcher
+
+        def processor(items):
+            raise ValueError("backend down")
+
+        batcher = RequestBatcher(batch_size=3, max_wait_ms=5, processor=processor)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+        batcher.set_processor(lambda items: items[:-1])
+        with pytest.raises(ValueError):
+            await batcher.submit("x")
+
+    @pytest.mark.asyncio
+    async def test_embedding_batcher_uses_one_request_per_batch(self):
+        import asyncio
+        from ollama_agents import EmbeddingBatcher
+        from ollama_agents.clients import get_async_client
+
+        calls = []
+
+        async def fake_embed(model, input):
+            calls.append(list(input))
+            response = Mock()
+            response.embeddings = [[float(len(text))] for text in input]
+            return response
+
+        batcher = EmbeddingBatcher(model="embed-model", batch_size=16, max_wait_ms=5)
+        with patch.object(get_async_client(None, 30), 'embed', side_effect=fake_embed):
+            vectors = await asyncio.gather(*(batcher.embed("x" * i) for i in range(20)))
+
+        assert vectors == [[float(i)] for i in range(20)]
+        assert [len(batch) for batch in calls] == [16, 4]
+
+
+class TestHostPool:
+    """Tests for multi-host routing against stub Ollama servers"""
+
+    @staticmethod
+    def _start_server(name, loaded_models=(), delay=0.0):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._send({"models": [{"name": model, "model": model} for model in loaded_models]})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests.append(request)
+                time.sleep(delay)
+                self._send({"model": request["model"], "response": name, "done": True})
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_least_outstanding_spreads_concurrent_requests(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        servers = [self._start_server(f"s{i}", delay=0.05) for i in range(2)]
+        try:
+            agent = Agent(name="balanced", model="m", host=[url for _, url in servers])
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                results = list(pool.map(lambda i: agent.generate(f"prompt {i}")["content"], range(8)))
+            assert sorted(set(results)) == ["s0", "s1"]
+            assert all(len(server.requests) >= 2 for server, _ in servers)
+            assert all(host["in_flight"] == 0 for host in agent.host_pool.get_stats()["hosts"])
+        finally:
+            for server, _ in servers:
+                server.shutdown()
+
+    def test_failed_host_leaves_rotation_until_healthy(self):
+        from ollama_agents import HostPool
+
+        live, live_url = self._start_server("live")
+        dead, dead_url = self._start_server("dead")
+        dead.shutdown()
+        dead.server_close()
+        try:
+            pool = HostPool([dead_url, live_url], failure_threshold=1, retry_after=60)
+            agent = Agent(name="failover", model="m", host=pool)
+            with pytest.raises(ConnectionError):
+                agent.generate("hi")  # Ties go to the first host
+            assert agent.generate("hi")["content"] == "live"
+            assert not pool.hosts[dead_url].healthy
+            assert pool.check_health() == {dead_url: False, live_url: True}
+        finally:
+            live.shutdown()
+
+    def test_models_stick_to_hosts_that_have_them_loaded(self):
+        from ollama_agents import HostPool
+
+        servers = [self._start_server("cold"), self._start_server("warm", loaded_models=["big-model"])]
+        try:
+            pool = HostPool([url for _, url in servers])
+            pool.check_health()
+            assert pool.select("big-model") == servers[1][1]
+            agent = Agent(name="sticky", model="big-model", host=pool)
+            assert {agent.generate("hi")["content"] for _ in range(3)} == {"warm"}
+        finally:
+            for server, _ in servers:
+                server.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_async_requests_are_routed(self):
+        import asyncio
+        from ollama_agents import HostPool, RoutingStrategy
+
+        servers = [self._start_server(f"s{i}", delay=0.02) for i in range(2)]
+        try:
+            pool = HostPool([url for _, url in servers], strategy=RoutingStrategy.LOWEST_LATENCY)
+            agent = Agent(name="async_balanced", model="m", host=pool)
+            results = await asyncio.gather(*(agent.agenerate(f"p{i}") for i in range(4)))
+            assert {r["content"] for r in results} <= {"s0", "s1"}
+            assert all(host["latency"] is not None or host["requests"] == 0
+                       for host in pool.get_stats()["hosts"])
+        finally:
+            for server, _ in servers:
+                server.shutdown()
+
+    def test_model_not_found_does_not_make_host_sticky(self):
+        import ollama
+        from ollama_agents import HostPool
+
+        pool = HostPool(["http://a:11434", "http://b:11434"])
+        with pytest.raises(ollama.ResponseError):
+            with pool.acquire("llama3") as url:
+                assert url == "http://a:11434"
+                raise ollama.ResponseError("model 'llama3' not found", 404)
+
+        stats = pool.get_stats()
+        assert stats["model_hosts"] == {}
+        assert all(host["latency"] is None and host["in_flight"] == 0 for host in stats["hosts"])
+        assert "llama3" not in pool.hosts["http://a:11434"].loaded_models
+
+    @pytest.mark.asyncio
+    async def test_cancelled_request_is_not_recorded(self):
+        import asyncio
+        from ollama_agents import HostPool
+
+        pool = HostPool(["http://a:11434", "http://b:11434"])
+        with pytest.raises(asyncio.CancelledError):
+            async with pool.aacquire("llama3"):
+                raise asyncio.CancelledError()  # e.g. the losing hedge request
+
+        stats = pool.get_stats()
+        assert stats["model_hosts"] == {}
+        assert all(host["latency"] is None and host["in_flight"] == 0 for host in stats["hosts"])
+
+
+class TestModelResidency:
+    """Tests for model preloading and traffic-based keep_alive"""
+
+    @staticmethod
+    def _ps(*models):
+        return Mock(models=[Mock(model=name, name=name, size=size, size_vram=size, expires_at=None)
+                            for name, size in models])
+
+    def test_keep_alive_follows_traffic(self):
+        from ollama_agents import ModelResidencyManager
+        manager = ModelResidencyManager(client=Mock(), default_keep_alive=300, min_keep_alive=60,
+                                        max_keep_alive=3600, hot_requests=5, traffic_window=600)
+        assert manager.keep_alive_for("cold") == 300
+
+        manager.record_request("sparse", now=1000.0)
+        manager.record_request("sparse", now=1200.0)
+        assert manager.keep_alive_for("sparse", now=1210.0) == 400  # 2 x the 200s gap
+
+        for i in range(5):
+            manager.record_request("hot", now=1000.0 + i)
+        assert manager.keep_alive_for("hot", now=1010.0) == 3600
+        # Requests older than the window are forgotten
+        assert manager.keep_alive_for("hot", now=5000.0) == 300
+
+    def test_preload_pins_and_unloads_idle_models(self):
+        from ollama_agents import ModelResidencyManager
+        client = Mock()
+        client.ps.return_value = self._ps(("pinned", 4), ("old", 4), ("recent", 4))
+        manager = ModelResidencyManager(client=client, max_resident_models=2)
+
+        manager.preload(["pinned"], pin=True)
+        client.generate.assert_called_with(model="pinned", prompt="", keep_alive=-1)
+        manager.record_request("old", now=1.0)
+        manager.record_request("recent", now=2.0)
+
+        assert manager.enforce_budget() == ["old"]
+        client.generate.assert_called_with(model="old", prompt="", keep_alive=0)
+        assert sorted(manager.resident) == ["pinned", "recent"]
+
+        manager.max_resident_models = None
+        manager.max_resident_bytes = 3
+        assert manager.enforce_budget() == ["recent"]  # The pinned model stays even over budget
+
+    def test_busy_and_recent_models_are_not_unloaded(self):
+        from ollama_agents import ModelResidencyManager
+        client = Mock()
+        client.ps.return_value = self._ps(("busy", 4), ("warm", 4), ("idle", 4))
+        manager = ModelResidencyManager(client=client, max_resident_models=0, idle_grace=60)
+        manager.refresh()
+        manager.record_request("busy", now=1.0)
+        manager.record_request("warm")
+        manager.record_request("idle", now=2.0)
+
+        with manager.in_use("busy"):
+            assert manager.get_stats()["models"]["busy"]["in_flight"] == 1
+            assert manager.enforce_budget() == ["idle"]
+        # Finishing a request counts as use, so the model gets its grace period too
+        assert manager.enforce_budget() == []
+        assert sorted(manager.resident) == ["busy", "warm"]
+
+    def test_agent_uses_manager_keep_alive(self):
+        from ollama_agents import ModelResidencyManager
+        manager = ModelResidencyManager(client=Mock(), hot_requests=2, max_keep_alive=1800)
+        agent = Agent(name="resident", model="m", residency_manager=manager)
+        response = Mock(response="ok", thinking=None, prompt_eval_count=0, eval_count=0)
+
+        with patch.object(agent.client, 'generate', return_value=response) as generate:
+            agent.generate("a")
+            agent.generate("b")
+
+        assert generate.call_args.kwargs["keep_alive"] == 1800
+        assert manager.get_stats()["models"]["m"]["recent_requests"] == 2
+        assert Agent(name="plain", model="m", keep_alive=5)._keep_alive() == 5
+
+    def test_explicit_keep_alive_wins_over_manager(self):
+        from ollama_agents import ModelResidencyManager
+        manager = ModelResidencyManager(client=Mock(), hot_requests=1, max_keep_alive=1800)
+        agent = Agent(name="pinned", model="m", residency_manager=manager, keep_alive="5m")
+
+        assert agent._keep_alive() == "5m"
+        assert manager.get_stats()["models"]["m"]["recent_requests"] == 1
+
+
+class TestModelScheduler:
+    """Tests for the model-affinity request scheduler"""
+
+    @pytest.mark.asyncio
+    async def test_groups_requests_by_model(self):
+        import asyncio
+        from ollama_agents import ModelScheduler
+        scheduler = ModelScheduler(max_concurrent=1, max_wait=10)
+        order = []
+
+        async def request(model):
+            async with scheduler.aslot(model):
+                order.append(model)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(request("a"))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, *(request(model) for model in ["b", "a", "b", "a"]))
+
+        assert order == ["a", "a", "a", "b", "b"]
+        stats = scheduler.get_stats()
+        assert stats["switches"] == 1 and stats["granted"] == 5 and stats["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_fairness_deadline_preempts_busy_model(self):
+        import asyncio
+        from ollama_agents import ModelScheduler
+        scheduler = ModelScheduler(max_concurrent=1, max_wait=0.05)
+        order = []
+
+        async def busy_worker():
+            for _ in range(15):
+                async with scheduler.aslot("a"):
+                    order.append("a")
+                    await asyncio.sleep(0.01)
+
+        async def other():
+            await asyncio.sleep(0.005)
+            async with scheduler.aslot("b"):
+                order.append("b")
+
+        await asyncio.gather(busy_worker(), busy_worker(), other())
+        # "a" always has work queued, yet "b" runs once its deadline passes
+        assert order.index("b") < len(order) - 1
+        assert scheduler.get_stats()["max_wait"] < 0.5
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        import asyncio
+        from ollama_agents import ModelScheduler
+        scheduler = ModelScheduler(max_concurrent=1, max_wait=10)
+        async with scheduler.aslot("a"):
+            waiter = asyncio.create_task(scheduler.aslot("b").__aenter__())
+            await asyncio.sleep(0.01)
+            assert scheduler.get_stats()["queue_depth"] == {"b": 1}
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert scheduler.get_stats()["queued"] == 0
+        assert scheduler.get_stats()["in_flight"] == 0
+
+    def test_hosts_are_scheduled_independently(self):
+        from ollama_agents import ModelScheduler
+        scheduler = ModelScheduler(max_concurrent=1, max_wait=10)
+        with scheduler.slot("a", host="http://one:11434"), scheduler.slot("b", host="http://two:11434"):
+            stats = scheduler.get_stats()
+            assert stats["in_flight"] == 2 and stats["switches"] == 0
+            assert stats["hosts"]["http://two:11434"]["active_model"] == "b"
+
+    def test_sync_wait_is_bounded_by_timeout_and_deadline(self):
+        import threading
+        from ollama_agents import ModelScheduler, Deadline, DeadlineExceeded, deadline_scope
+        scheduler = ModelScheduler(max_concurrent=1, max_wait=10, timeout=0.05)
+        release = threading.Event()
+
+        def hold():
+            with scheduler.slot("a"):
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        time.sleep(0.02)
+        try:
+            with pytest.raises(TimeoutError):
+                with scheduler.slot("a"):
+                    pass
+            scheduler.timeout = None
+            deadline = Deadline()
+            threading.Timer(0.05, deadline.cancel).start()
+            with deadline_scope(deadline), pytest.raises(DeadlineExceeded):
+                with scheduler.slot("b"):
+                    pass
+            assert scheduler.get_stats()["queued"] == 0
+        finally:
+            release.set()
+            holder.join()
+        assert scheduler.get_stats()["in_flight"] == 0
+
+    def test_agent_requests_use_scheduler(self):
+        from ollama_agents import ModelScheduler
+        scheduler = ModelScheduler()
+        agent = Agent(name="scheduled", model="m", scheduler=scheduler)
+        response = Mock(response="ok", thinking=None, prompt_eval_count=0, eval_count=0)
+
+        with patch.object(agent.client, 'generate', return_value=response):
+            agent.generate("hello")
+
+        stats = scheduler.get_stats()
+        assert stats["granted"] == 1 and stats["in_flight"] == 0 and stats["active_model"] == "m"
+
+
+    @staticmethod
+    def _summarizing_agent(scheduler):
+        from ollama_agents.context_manager import TruncationStrategy
+        agent = Agent(name="scheduled_stream", model="m", scheduler=scheduler, max_context_length=200,
+                      context_truncation_strategy=TruncationStrategy.SUMMARIZE_MIDDLE)
+        for i in range(8):
+            agent.add_message("user" if i % 2 == 0 else "assistant", f"message {i} " + "x" * 40)
+        return agent
+
+    def test_stream_summary_does_not_deadlock_one_slot_scheduler(self):
+        import threading
+        from ollama import ChatResponse, Message
+        from ollama_agents import ModelScheduler
+        agent = self._summarizing_agent(ModelScheduler(max_concurrent=1))
+        chunks = [ChatResponse(message=Message(role="assistant", content="hi"), done=True)]
+        deltas = []
+
+        with patch.object(agent.client, 'generate', return_value=Mock(response="summary")) as generate, \
+                patch.object(agent.client, 'chat', return_value=iter(chunks)):
+            # A daemon thread, so a deadlock fails the test instead of hanging it
+            worker = threading.Thread(target=lambda: deltas.extend(agent.chat_stream("hello")), daemon=True)
+            worker.start()
+            worker.join(5)
+
+        assert not worker.is_alive()
+        assert deltas == ["hi"] and generate.call_count == 1
+        assert agent.scheduler.get_stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_async_stream_summary_does_not_deadlock_one_slot_scheduler(self):
+        import asyncio
+        from ollama import ChatResponse, Message
+        from ollama_agents import ModelScheduler
+        agent = self._summarizing_agent(ModelScheduler(max_concurrent=1))
+
+        async def stream():
+            yield ChatResponse(message=Message(role="assistant", content="hi"), done=True)
+
+        async def fake_chat(**kwargs):
+            return stream()
+
+        async def collect():
+            return [delta async for delta in agent.achat_stream("hello")]
+
+        with patch.object(agent.client, 'generate', return_value=Mock(response="summary")) as generate, \
+                patch.object(agent.async_client, 'chat', side_effect=fake_chat):
+            deltas = await asyncio.wait_for(collect(), 5)
+
+        assert deltas == ["hi"] and generate.call_count == 1
+
+class TestAdmissionControl:
+    """Tests for admission control, rate limits and priority classes"""
+
+    @pytest.mark.asyncio
+    async def test_priority_order_and_fast_rejection(self):
+        import asyncio
+        from ollama_agents import AdmissionController, OverloadedError, Priority
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5)
+        order = []
+
+        async def request(name, priority):
+            async with controller.aadmit("h", priority=priority):
+                order.append(name)
+
+        async with controller.aadmit("h"):
+            tasks = [asyncio.create_task(request("batch", Priority.BATCH)),
+                     asyncio.create_task(request("interactive", Priority.INTERACTIVE))]
+            await asyncio.sleep(0.01)
+            start = time.time()
+            with pytest.raises(OverloadedError):
+                async with controller.aadmit("h", priority=Priority.BATCH):
+                    pass
+            assert time.time() - start < 0.1
+            assert controller.get_stats()["hosts"]["h"]["queued"] == {"interactive": 1, "batch": 1}
+        await asyncio.gather(*tasks)
+
+        assert order == ["interactive", "batch"]
+        assert controller.get_stats()["hosts"]["h"]["rejected"] == 1
+
+    def test_queue_timeout_and_interactive_sheds_batch(self):
+        from ollama_agents import AdmissionController, OverloadedError, Priority
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+        with controller.admit():
+            with pytest.raises(OverloadedError):
+                with controller.admit():
+                    pass
+
+            batch = controller._enqueue(None, Priority.BATCH)
+            interactive = controller._enqueue(None, Priority.INTERACTIVE)
+            with pytest.raises(OverloadedError, match="shed"):
+                batch.future.result(timeout=1)
+            assert not interactive.future.done()
+        assert interactive.future.result(timeout=1) is None
+
+    def test_token_bucket_per_tenant(self):
+        from ollama_agents import AdmissionController, OverloadedError
+        controller = AdmissionController(rate=0.01, burst=2, tenant_limits={"vip": (100, 100)})
+        for _ in range(2):
+            with controller.admit(tenant="alice"):
+                pass
+        with pytest.raises(OverloadedError) as excinfo:
+            with controller.admit(tenant="alice"):
+                pass
+        assert excinfo.value.retry_after > 1
+        for _ in range(5):
+            with controller.admit(tenant="vip"):
+                pass
+        with controller.admit(tenant="bob"):
+            pass
+        assert controller.get_stats()["rate_limited"] == 1
+
+    def test_web_ui_and_orchestrator_priorities(self):
+        from ollama_agents import AdmissionController, AgentManager, AgentOrchestrator, Priority
+        from ollama_agents.admission import current_priority, current_tenant
+        controller = AdmissionController(rate=0.01, burst=1)
+        manager = AgentManager(admission=controller)
+        agent = Agent(name="ui_agent", model="m")
+        manager.add_agent(agent)
+        assert agent.admission is controller
+        response = Mock(message=Mock(content="hi", tool_calls=None, thinking=None),
+                        prompt_eval_count=0, eval_count=0)
+
+        with patch.object(agent.client, 'chat', return_value=response):
+            assert manager.chat("ui_agent", "one", tenant="alice")["content"] == "hi"
+            rejected = manager.chat("ui_agent", "two", tenant="alice")
+        assert rejected["overloaded"] is True and rejected["retry_after"] > 0
+        assert len(manager.get_conversation("ui_agent")) == 2
+
+        seen = []
+        worker = Agent(name="worker", model="m")
+        with patch.object(worker, 'chat', side_effect=lambda message: seen.append(
+                (current_priority(), current_tenant())) or {"content": "ok"}):
+            AgentOrchestrator([worker], tenant="jobs").sequential("task")
+        assert seen == [(Priority.BATCH, "jobs")]
+        assert current_priority() is None
+
+
+class TestResilience:
+    """Tests for circuit breakers, retries, retry budgets and hedged requests"""
+
+    @staticmethod
+    def _response(text="ok"):
+        return Mock(response=text, thinking=None, prompt_eval_count=0, eval_count=0)
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        from ollama_agents import CircuitBreakers, CircuitOpenError, CircuitState
+        breakers = CircuitBreakers(failure_threshold=2, recovery_timeout=0.05)
+        agent = Agent(name="breaker", model="m", circuit_breakers=breakers)
+
+        with patch.object(agent.client, 'generate', side_effect=ConnectionError("down")) as generate:
+            for _ in range(2):
+                with pytest.raises(ConnectionError):
+                    agent.generate("hi")
+            with pytest.raises(CircuitOpenError):
+                agent.generate("hi")
+            assert generate.call_count == 2  # Failed fast without calling the server
+        assert breakers.get(None, "m").state == CircuitState.OPEN
+
+        time.sleep(0.06)
+        with patch.object(agent.client, 'generate', return_value=self._response()):
+            assert agent.generate("hi")["content"] == "ok"
+        assert breakers.get(None, "m").state == CircuitState.CLOSED
+
+    def test_enable_retry_applies_to_requests(self):
+        from ollama_agents import RetryConfig
+        agent = Agent(name="retrying", model="m", enable_retry=True,
+                      retry_config=RetryConfig(max_retries=2, initial_delay=0, jitter=False))
+        with patch.object(agent.client, 'generate',
+                          side_effect=[ConnectionError("blip"), self._response()]) as generate:
+            assert agent.generate("hi")["content"] == "ok"
+        assert generate.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_async_retry(self):
+        from unittest.mock import AsyncMock
+        from ollama_agents import RetryConfig
+        agent = Agent(name="aretrying", model="m", enable_retry=True,
+                      retry_config=RetryConfig(max_retries=2, initial_delay=0, jitter=False))
+        with patch('ollama.AsyncClient.generate', new_callable=AsyncMock,
+                   side_effect=[ConnectionError("blip"), self._response()]) as generate:
+            assert (await agent.agenerate("hi"))["content"] == "ok"
+        assert generate.call_count == 2
+
+    def test_retry_budget_stops_retry_storms(self):
+        from ollama_agents import RetryBudget, RetryConfig, with_retry
+        budget = RetryBudget(ratio=0.0, min_retries=1)
+        config = RetryConfig(max_retries=5, initial_delay=0, jitter=False, budget=budget)
+        calls = []
+
+        @with_retry(config)
+        def failing():
+            calls.append(1)
+            raise ConnectionError("down")
+
+        with pytest.raises(ConnectionError):
+            failing()
+        assert len(calls) == 2  # One retry allowed, then the budget is spent
+        with pytest.raises(ConnectionError):
+            failing()
+        assert len(calls) == 3
+        assert budget.get_stats()["denied"] == 2
+
+    def test_hedged_request_goes_to_second_host(self):
+        from ollama_agents import HostPool, RetryConfig
+        slow = TestHostPool._start_server("slow", delay=1.0)
+        fast = TestHostPool._start_server("fast")
+        try:
+            pool = HostPool([slow[1], fast[1]])
+            agent = Agent(name="hedged", model="m", host=pool,
+                          retry_config=RetryConfig(hedge_percentile=0.95, hedge_min_samples=5))
+            for _ in range(5):
+                agent._latency.record(0.05)
+
+            start = time.time()
+            assert agent.generate("hi")["content"] == "fast"
+            assert time.time() - start < 0.8
+            assert len(slow[0].requests) == 1 and len(fast[0].requests) == 1
+        finally:
+            slow[0].shutdown()
+            fast[0].shutdown()
+
+    @pytest.mark.asyncio
+    async def test_async_hedge_cancels_loser(self):
+        import asyncio
+        from ollama_agents.retry import async_hedged_call
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def fast():
+            return "fast"
+
+        assert await async_hedged_call(slow, fast, 0.02) == "fast"
+        assert cancelled == [True]
+
+
+class TestDeadlines:
+    """Tests for end-to-end deadlines and cancellation"""
+
+    @staticmethod
+    def _chat_response(content="hi", tool_calls=None):
+        return Mock(message=Mock(content=content, tool_calls=tool_calls, thinking=None),
+                    prompt_eval_count=0, eval_count=0)
+
+    def test_chat_returns_partial_result_when_tools_overrun(self):
+        from ollama import Message
+
+        @tool("Slow lookup")
+        def slow_lookup() -> str:
+            time.sleep(0.5)
+            return "done"
+
+        agent = Agent(name="deadline_tools", model="m", tools=[slow_lookup])
+        call = Message.ToolCall(function=Message.ToolCall.Function(name="slow_lookup", arguments={}))
+        with patch.object(agent.client, 'chat',
+                          return_value=self._chat_response("checking", [call])) as chat:
+            start = time.time()
+            result = agent.chat("look it up", deadline=0.2)
+
+        assert time.time() - start < 0.45
+        assert result["deadline_exceeded"] is True and result["content"] == "checking"
+        assert chat.call_count == 1
+
+    def test_cancel_abandons_in_flight_request(self):
+        import threading
+        from ollama_agents import Deadline
+        agent = Agent(name="deadline_cancel", model="m")
+        deadline = Deadline()
+        threading.Timer(0.05, deadline.cancel).start()
+
+        with patch.object(agent.client, 'chat',
+                          side_effect=lambda **kwargs: time.sleep(1) or self._chat_response()):
+            start = time.time()
+            result = agent.chat("hello", deadline=deadline)
+
+        assert time.time() - start < 0.5
+        assert result == {"content": "", "tool_calls": None, "raw_response": None,
+                          "used_tools": False, "deadline_exceeded": True}
+
+    def test_abandoned_stream_stops_and_closes_at_deadline(self):
+        from ollama import ChatResponse, Message
+        agent = Agent(name="deadline_stream", model="m", stream=True)
+        produced, closed = [], []
+
+        def slow_stream(**kwargs):
+            try:
+                for i in range(20):
+                    time.sleep(0.05)
+                    produced.append(i)
+                    yield ChatResponse(message=Message(role="assistant", content=str(i)), done=False)
+            finally:
+                closed.append(True)
+
+        with patch.object(agent.client, 'chat', side_effect=slow_stream):
+            result = agent.chat("hello", deadline=0.15)
+            time.sleep(0.2)
+
+        assert result["deadline_exceeded"] is True
+        assert closed == [True]
+        assert len(produced) < 8
+
+    def test_context_summary_is_bounded_by_deadline(self):
+        from ollama_agents.context_manager import TruncationStrategy
+        agent = Agent(name="deadline_summary", model="m", max_context_length=200,
+                      context_truncation_strategy=TruncationStrategy.SUMMARIZE_MIDDLE)
+        for i in range(8):
+            agent.add_message("user" if i % 2 == 0 else "assistant", f"message {i} " + "x" * 40)
+
+        with patch.object(agent.client, 'generate',
+                          side_effect=lambda **kwargs: time.sleep(1) or Mock(response="summary")) as generate, \
+                patch.object(agent.client, 'chat', return_value=self._chat_response()) as chat:
+            start = time.time()
+            result = agent.chat("hello", deadline=0.2)
+
+        assert time.time() - start < 0.5
+        assert result["deadline_exceeded"] is True
+        assert generate.call_count == 1 and chat.call_count == 0
+
+    @pytest.mark.asyncio
+    async def test_achat_deadline_cancels_request(self):
+        import asyncio
+        agent = Agent(name="deadline_async", model="m")
+        cancelled = []
+
+        async def slow_chat(*args, **kwargs):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with patch('ollama.AsyncClient.chat', side_effect=slow_chat):
+            result = await agent.achat("hello", deadline=0.05)
+
+        assert result["deadline_exceeded"] is True
+        assert cancelled == [True]
+
+    def test_orchestration_returns_partial_results(self):
+        from ollama_agents import AgentOrchestrator
+        agents = [Agent(name=f"stage{i}", model="m") for i in range(4)]
+        for agent in agents:
+            agent.chat = Mock(side_effect=lambda message, **kwargs: time.sleep(0.1) or {"content": message + "+"})
+
+        result = AgentOrchestrator(agents).sequential("q", deadline=0.15)
+
+        assert result.metadata["deadline_exceeded"] is True
+        assert 1 <= len(result.results) < 4
+        assert result.final_result == result.results[-1]["output"]
+
+    def test_handoff_passes_deadline_to_agent(self):
+        from ollama_agents import Deadline, current_deadline
+        agent = Agent(name="handoff_deadline", model="m")
+        handoff = AgentHandoff({"a": agent})
+        handoff.set_current_agent("a")
+        deadline = Deadline(10)
+        seen = []
+        with patch.object(agent, 'chat', side_effect=lambda message, deadline=None: seen.append(deadline) or {"content": ""}):
+            handoff.chat_with_current("hi", deadline=deadline)
+        assert seen == [deadline]
+        assert current_deadline() is None
+
+
+class TestStreamingToolDispatch:
+    """Tests for incremental tool-call parsing and early tool dispatch"""
+
+    @staticmethod
+    def _chunk(content="", tool_calls=None, done=False):
+        from ollama import ChatResponse, Message
+        return ChatResponse(message=Message(role="assistant", content=content, tool_calls=tool_calls), done=done)
+
+    def test_scanner_handles_split_objects_and_strings(self):
+        """Test that objects split across pieces are found once, ignoring braces in strings"""
+        from ollama_agents.turn import IncrementalJSONScanner
+        text = 'Result: {"a": "}{\\"", "b": {"c": [1, 2]}} and {oops} then {"d": 1}'
+        scanner = IncrementalJSONScanner()
+        found = []
+        for i in range(0, len(text), 3):
+            found.extend(scanner.feed(text[i:i + 3]))
+
+        assert [value for value, _, _ in found] == [{"a": '}{"', "b": {"c": [1, 2]}}, {"d": 1}]
+        assert not any(leading for _, leading, _ in found)
+
+    def test_scanner_keeps_state_between_single_characters(self):
+        """Test escapes, strings and nesting split at every character boundary"""
+        from ollama_agents.turn import IncrementalJSONScanner
+        text = '```json\n{"s": "\\\\\\"}", "n": {"m": {}}}'
+        scanner = IncrementalJSONScanner()
+        found = [match for char in text for match in scanner.feed(char)]
+
+        assert found == IncrementalJSONScanner().feed(text)
+        assert found[0][0] == {"s": '\\"}', "n": {"m": {}}} and found[0][2].endswith("```json\n")
+
+    def test_json_content_parser(self):
+        """Test the content fallback accepts leading or fenced calls only"""
+        from ollama import Message
+        from ollama_agents.turn import json_content_tool_call_parser
+
+        def parse(content):
+            calls = json_content_tool_call_parser(Message(role="assistant", content=content))
+            return [(call.function.name, call.function.arguments) for call in calls]
+
+        assert parse('{"name": "add", "arguments": {"a": 1}}') == [("add", {"a": 1})]
+        assert parse('Calling:\n```json\n{"name": "add", "arguments": {"s": "}"}}\n```') == [("add", {"s": "}"})]
+        assert parse('For example {"name": "add", "arguments": {}} would work') == []
+        assert parse('{"name": "add"}') == []
+
+    def test_tool_starts_before_stream_ends(self):
+        """Test that a native tool call runs while the rest of the response streams"""
+        import threading
+        from ollama import Message
+        started = threading.Event()
+        calls = []
+
+        def lookup(key: str) -> str:
+            calls.append(key)
+            started.set()
+            return "value"
+
+        def first_turn():
+            call = Message.ToolCall(function=Message.ToolCall.Function(name="lookup", arguments={"key": "k"}))
+            yield self._chunk(tool_calls=[call])
+            # The stream only finishes once the tool is already running
+            assert started.wait(2)
+            yield self._chunk(done=True)
+
+        agent = Agent(name="test_agent", stream=True, tools=[lookup])
+        turns = [first_turn(), iter([self._chunk("done", done=True)])]
+        with patch.object(agent.client, 'chat', side_effect=turns):
+            result = agent.chat("Look up k")
+
+        assert result["content"] == "done"
+        assert calls == ["k"]
+        assert {"role": "tool", "content": "value"} in agent.messages
+
+    @pytest.mark.asyncio
+    async def test_async_content_call_starts_before_stream_ends(self):
+        """Test early dispatch of a JSON content call in an async turn"""
+        import asyncio
+        started = asyncio.Event()
+
+        async def lookup(key: str) -> str:
+            started.set()
+            return key.upper()
+
+        async def first_turn():
+            for part in ['{"name": "look', 'up", "arguments": {"key"', ': "k"}}']:
+                yield self._chunk(part)
+            await asyncio.wait_for(started.wait(), 2)
+            yield self._chunk(done=True)
+
+        async def second_turn():
+            yield self._chunk("K", done=True)
+
+        turns = iter([first_turn(), second_turn()])
+
+        async def fake_chat(**kwargs):
+            return next(turns)
+
+        agent = Agent(name="test_agent", stream=True, tools=[lookup])
+        with patch.object(agent.async_client, 'chat', side_effect=fake_chat):
+            result = await agent.achat("Look up k")
+
+        assert result["content"] == "K"
+        assert {"role": "tool", "content": "K"} in agent.messages
+
+    @pytest.mark.asyncio
+    async def test_closing_stream_cancels_started_tools(self):
+        """Test that tools started early are cancelled when the caller stops iterating"""
+        import asyncio
+        from ollama import Message
+        events = []
+
+        async def slow_lookup() -> str:
+            events.append("started")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                events.append("cancelled")
+                raise
+            return "value"
+
+        async def stream():
+            call = Message.ToolCall(function=Message.ToolCall.Function(name="slow_lookup", arguments={}))
+            yield self._chunk("Looking", tool_calls=[call])
+            yield self._chunk(" it up", done=True)
+
+        async def fake_chat(**kwargs):
+            return stream()
+
+        agent = Agent(name="test_agent", tools=[slow_lookup])
+        with patch.object(agent.async_client, 'chat', side_effect=fake_chat):
+            deltas = agent.achat_stream("Look it up")
+            assert await deltas.__anext__() == "Looking"
+            await asyncio.sleep(0)
+            await deltas.aclose()
+            await asyncio.sleep(0)
+
+        assert events == ["started", "cancelled"]
+
+    def test_dispatcher_dedupes_and_discards(self):
+        """Test that repeated stream attempts run a call once and unused calls are dropped"""
+        from ollama import Message
+        from ollama_agents.tools import ToolRegistry
+        from ollama_agents.turn import EarlyToolDispatcher
+        calls = []
+
+        def echo(text: str) -> str:
+            calls.append(text)
+            return text
+
+        registry = ToolRegistry()
+        registry.register_tool(echo)
+        dispatcher = EarlyToolDispatcher(registry)
+        call = Message.ToolCall(function=Message.ToolCall.Function(name="echo", arguments={"text": "a"}))
+        for _ in range(2):  # e.g. a retried stream
+            dispatcher.watch()(self._chunk(tool_calls=[call]))
+
+        results = dispatcher.collect([("echo", {"text": "b"}), ("echo", {"text": "a"})])
+
+        assert dispatcher.dispatched == 1
+        assert [result.result for result in results] == ["b", "a"]
+        assert sorted(calls) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_native_calls_take_precedence_over_content(self):
+        """Test that content calls are dropped once native calls appear, as parse_tool_calls would"""
+        import asyncio
+        from ollama import Message
+        from ollama_agents.tools import ToolRegistry
+        from ollama_agents.turn import AsyncEarlyToolDispatcher
+        calls = []
+
+        def echo(text: str) -> str:
+            calls.append(text)
+            return text
+
+        registry = ToolRegistry()
+        registry.register_tool(echo)
+        dispatcher = AsyncEarlyToolDispatcher(registry)
+        content_call = '{"name": "echo", "arguments": {"text": "content"}}'
+        native_call = Message.ToolCall(function=Message.ToolCall.Function(name="echo", arguments={"text": "native"}))
+        first, second = dispatcher.watch(), dispatcher.watch()
+        first(self._chunk(content=content_call))
+        first(self._chunk(tool_calls=[native_call], done=True))
+        await asyncio.sleep(0)
+        second(self._chunk(content=content_call.replace("content", "late")))  # A slower attempt
+        await asyncio.sleep(0)
+
+        results = await dispatcher.acollect([("echo", {"text": "native"})])
+
+        assert dispatcher.dispatched == 2
+        assert [result.result for result in results] == ["native"]
+        assert calls == ["native"]
+
+    def test_disabled_without_streaming(self):
+        """Test that non-streamed requests and opted-out agents get no dispatcher"""
+        def noop() -> str:
+            return ""
+
+        agent = Agent(name="test_agent", tools=[noop])
+        assert agent.turn_engine.early_dispatcher({"stream": False}) is None
+        assert agent.turn_engine.early_dispatcher({"stream": True}) is not None
+        agent.early_tool_dispatch = False
+        assert agent.turn_engine.early_dispatcher({"stream": True}) is None
+
+
 class TestThinkingManager:
     """Tests for the ThinkingManager class"""
 
@@ -191,6 +2178,167 @@ class TestToolRegistry:
         assert result == "42: hello"
 
 
+    def test_execute_tool_calls_concurrently(self):
+        """Test that sync tool calls overlap and keep call order"""
+        import time
+        from ollama_agents.tools import ToolRegistry
+
+        def slow_echo(value: str) -> str:
+            time.sleep(0.2)
+            return value
+
+        registry = ToolRegistry()
+        registry.register_tool(slow_echo)
+
+        start = time.perf_counter()
+        results = registry.execute_tool_calls([("slow_echo", {"value": str(i)}) for i in range(4)])
+        elapsed = time.perf_counter() - start
+
+        assert [r.content for r in results] == ["0", "1", "2", "3"]
+        assert elapsed < 0.6
+
+    def test_execute_tool_calls_timeout(self):
+        """Test that a slow tool is reported as timed out"""
+        import time
+        from ollama_agents.tools import ToolRegistry
+
+        def slow() -> str:
+            time.sleep(0.5)
+            return "late"
+
+        def fast() -> str:
+            return "ok"
+
+        registry = ToolRegistry(tool_timeout=0.1)
+        registry.register_tool(slow)
+        registry.register_tool(fast)
+
+        results = registry.execute_tool_calls([("slow", {}), ("fast", {}), ("missing", {})])
+
+        assert isinstance(results[0].error, TimeoutError)
+        assert results[1].content == "ok"
+        assert results[2].content.startswith("Tool missing failed")
+
+    def test_execute_tool_calls_timeout_excludes_queueing(self):
+        """Test that a call queued behind others gets its full timeout once it runs"""
+        import time
+        from ollama_agents.tools import ToolRegistry
+
+        def work(value: str) -> str:
+            time.sleep(0.15)
+            return value
+
+        registry = ToolRegistry(max_workers=1, tool_timeout=0.25)
+        registry.register_tool(work)
+
+        results = registry.execute_tool_calls([("work", {"value": "a"}), ("work", {"value": "b"})])
+
+        assert [r.content for r in results] == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_aexecute_tool_calls_gathers(self):
+        """Test that async and sync tools run concurrently from the event loop"""
+        import asyncio
+        import time
+        from ollama_agents.tools import ToolRegistry
+
+        async def async_tool(x: int) -> int:
+            await asyncio.sleep(0.2)
+            return x * 2
+
+        def sync_tool(x: int) -> int:
+            time.sleep(0.2)
+            return x + 1
+
+        registry = ToolRegistry()
+        registry.register_tool(async_tool)
+        registry.register_tool(sync_tool)
+
+        start = time.perf_counter()
+        results = await registry.aexecute_tool_calls(
+            [("async_tool", {"x": 1}), ("sync_tool", {"x": 1}), ("async_tool", {"x": 5})]
+        )
+        elapsed = time.perf_counter() - start
+
+        assert [r.result for r in results] == [2, 2, 10]
+        assert elapsed < 0.4
+
+    @pytest.mark.asyncio
+    async def test_blocking_tool_does_not_stall_event_loop(self):
+        """Test that blocking sync tools are offloaded while the loop keeps running"""
+        import asyncio
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from ollama_agents.tools import ToolRegistry
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        threads = {}
+
+        @tool("Sleep", blocking=True)
+        def blocking_sleep() -> str:
+            threads["blocking"] = threading.current_thread()
+            time.sleep(0.2)
+            return "done"
+
+        @tool("Upper", blocking=False)
+        def upper(text: str) -> str:
+            threads["inline"] = threading.current_thread()
+            return text.upper()
+
+        registry = ToolRegistry(executor=executor)
+        registry.register_tool(blocking_sleep)
+        registry.register_tool(upper)
+
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.02)
+                ticks += 1
+
+        result, _ = await asyncio.gather(registry.aexecute_tool("blocking_sleep", {}), heartbeat())
+
+        assert result == "done"
+        assert ticks == 5
+        assert threads["blocking"] is not threading.current_thread()
+        assert await registry.aexecute_tool("upper", {"text": "hi"}) == "HI"
+        assert threads["inline"] is threading.current_thread()
+        registry.shutdown()
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_single_async_tool_from_sync_code_on_event_loop(self):
+        """Test that sync execution works on a thread with a running loop (achat -> handoff -> chat)"""
+        import asyncio
+        from ollama_agents.tools import ToolRegistry
+
+        async def fetch(url: str) -> str:
+            await asyncio.sleep(0)
+            return url
+
+        registry = ToolRegistry()
+        registry.register_tool(fetch)
+
+        results = registry.execute_tool_calls([("fetch", {"url": "x"})])
+
+        assert results[0].success and results[0].content == "x"
+
+    def test_tool_decorator_keeps_coroutine_functions(self):
+        """Test that decorated async tools are still detected as coroutines"""
+        from ollama_agents.tools import ToolRegistry
+
+        @tool("Fetch")
+        async def fetch(url: str) -> str:
+            return url
+
+        registry = ToolRegistry()
+        registry.register_tool(fetch)
+
+        assert registry.is_async_tool("fetch")
+        assert registry.is_blocking_tool("fetch")
+
 class TestAgentHandoff:
     """Tests for the AgentHandoff class"""
 